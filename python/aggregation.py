@@ -0,0 +1,226 @@
+"""
+Ingestion-time reduction of the sample stream before it is logged.
+
+The firmware sends 20 readings a second, but a DHT11 only changes every
+second or two, so most logged rows repeat the one before. A stage sits
+between the parser and the log writer and decides what is stored:
+
+    raw       every reading (the default)
+    window    one record per device and window (e.g. 1 s or 10 s) holding the
+              mean, min, max and sample count; logged under AGGREGATE_HEADER
+    deadband  only readings that moved more than a deadband from the last
+              logged one, plus one every `heartbeat_seconds` while steady
+
+Alerts, the live display and the sample bus still see every raw reading.
+RawHistory keeps the last few minutes of them in memory and writes that
+context to data/alert_raw.csv whenever an alert fires.
+
+Window records need the CSV log (sqlite_log.WINDOW_BACKENDS); the SQLite and
+binary logs have no columns for them and refuse the mode. The rollups count a
+window record as its samples, with the mean weighted by them and min/max from
+its own columns; the spread inside a window is not stored, so std and median
+are those of the sample-weighted window means.
+"""
+import collections
+from datetime import datetime, timedelta
+
+from alerts import FIRED
+from csv_writer import CsvBatchWriter
+
+# --- Modes ---
+AGGREGATE_RAW = 'raw'
+AGGREGATE_WINDOW = 'window'
+AGGREGATE_DEADBAND = 'deadband'
+AGGREGATION_MODES = (AGGREGATE_RAW, AGGREGATE_WINDOW, AGGREGATE_DEADBAND)
+
+# --- Defaults ---
+WINDOW_SECONDS = 1.0       # Length of an aggregation window; windows start at whole multiples of it
+TEMP_DEADBAND = 0.0        # °C a reading must move from the last logged one (0: log every change)
+HUM_DEADBAND = 0.0         # % humidity, likewise
+HEARTBEAT_SECONDS = 60.0   # A steady sensor is still logged this often, so silence means no data
+DEADBAND_EPSILON = 1e-9    # Values are parsed from 2-decimal text; keeps 26.3 - 26.2 from falling under 0.1
+RAW_HISTORY_SECONDS = 120.0  # Raw readings kept in memory per device for alert forensics
+RAW_AFTER_SECONDS = 30.0     # ...and still written out for this long after an alert fires
+ALERT_RAW_LOG = 'data/alert_raw.csv'
+ALERT_RAW_HEADER = ['Alert_Timestamp', 'Rule', 'Timestamp', 'Temperature_C', 'Humidity_Percent', 'Device']
+
+EPOCH = datetime(1970, 1, 1)
+
+# A Reading (ingestion.py) summarising one window: timestamp is the window start, temp/humidity the means
+WindowRecord = collections.namedtuple(
+    'WindowRecord', ['device_id', 'timestamp', 'temp', 'humidity',
+                     'temp_min', 'temp_max', 'hum_min', 'hum_max', 'count'])
+
+
+class RawStage:
+    """Logs every reading unchanged. Base of the other stages, which count what goes in and out."""
+
+    def __init__(self):
+        self.readings_in = 0
+        self.records_out = 0
+
+    def process(self, readings):
+        """Takes one batch of Readings and returns the records to log now."""
+        self.readings_in += len(readings)
+        self.records_out += len(readings)
+        return readings
+
+    def flush(self):
+        """Returns whatever is still held back, when ingestion stops."""
+        return []
+
+
+class WindowAggregator(RawStage):
+    """
+    Reduces each device's readings to one WindowRecord per `window_seconds`.
+    When the first reading of a later window arrives, from any device, every
+    open window is emitted, oldest first, so a device that goes quiet does
+    not hold back its last record and the log stays in time order. A late
+    reading for a window already emitted opens a window of its own, which
+    is emitted at the next step. flush() emits whatever is still open.
+    """
+
+    def __init__(self, window_seconds=WINDOW_SECONDS):
+        super().__init__()
+        self.window = timedelta(seconds=window_seconds)
+        # (device_id, start) -> [count, temp sum, temp min, temp max, hum sum, hum min, hum max]
+        self._open = {}
+        self._newest_start = None
+        self._last_timestamp = self._last_start = None
+
+    def _window_start(self, timestamp):
+        # Every reading of a serial chunk shares one timestamp object
+        if timestamp is not self._last_timestamp:
+            self._last_timestamp = timestamp
+            self._last_start = EPOCH + (timestamp - EPOCH) // self.window * self.window
+        return self._last_start
+
+    def _close_all(self, records):
+        # Oldest window first; devices keep the order of their first reading within a window
+        for (device_id, start), state in sorted(self._open.items(), key=lambda item: item[0][1]):
+            count, t_sum, t_min, t_max, h_sum, h_min, h_max = state
+            records.append(WindowRecord(device_id, start, t_sum / count, h_sum / count,
+                                        t_min, t_max, h_min, h_max, count))
+        self._open.clear()
+
+    def process(self, readings):
+        self.readings_in += len(readings)
+        records = []
+        for reading in readings:
+            start = self._window_start(reading.timestamp)
+            if self._newest_start is None or start > self._newest_start:
+                self._close_all(records)
+                self._newest_start = start
+            temp, humidity = reading.temp, reading.humidity
+            state = self._open.get((reading.device_id, start))
+            if state is None:
+                self._open[reading.device_id, start] = [1, temp, temp, temp, humidity, humidity, humidity]
+                continue
+            state[0] += 1
+            state[1] += temp
+            state[2] = min(state[2], temp)
+            state[3] = max(state[3], temp)
+            state[4] += humidity
+            state[5] = min(state[5], humidity)
+            state[6] = max(state[6], humidity)
+        self.records_out += len(records)
+        return records
+
+    def flush(self):
+        records = []
+        self._close_all(records)
+        self._newest_start = None
+        self.records_out += len(records)
+        return records
+
+
+class DeadbandFilter(RawStage):
+    """
+    Passes a reading on only when its temperature or humidity differs from
+    the device's last logged reading by more than the deadband, or when
+    `heartbeat_seconds` have passed since that reading.
+    """
+
+    def __init__(self, temp_deadband=TEMP_DEADBAND, hum_deadband=HUM_DEADBAND, heartbeat_seconds=HEARTBEAT_SECONDS):
+        super().__init__()
+        self.temp_deadband = temp_deadband + DEADBAND_EPSILON
+        self.hum_deadband = hum_deadband + DEADBAND_EPSILON
+        self.heartbeat = timedelta(seconds=heartbeat_seconds)
+        self._last = {}  # device_id -> the last logged Reading
+
+    def process(self, readings):
+        self.readings_in += len(readings)
+        records = []
+        for reading in readings:
+            last = self._last.get(reading.device_id)
+            if last is None or abs(reading.temp - last.temp) > self.temp_deadband \
+                    or abs(reading.humidity - last.humidity) > self.hum_deadband \
+                    or reading.timestamp - last.timestamp >= self.heartbeat:
+                records.append(reading)
+                self._last[reading.device_id] = reading
+        self.records_out += len(records)
+        return records
+
+    def flush(self):
+        # Nothing is held back; forget the last values so a restart logs its first reading
+        self._last.clear()
+        return []
+
+
+def make_stage(mode=AGGREGATE_RAW, window_seconds=WINDOW_SECONDS, temp_deadband=TEMP_DEADBAND,
+               hum_deadband=HUM_DEADBAND, heartbeat_seconds=HEARTBEAT_SECONDS):
+    """The stage for one of AGGREGATION_MODES."""
+    if mode == AGGREGATE_WINDOW:
+        return WindowAggregator(window_seconds)
+    if mode == AGGREGATE_DEADBAND:
+        return DeadbandFilter(temp_deadband, hum_deadband, heartbeat_seconds)
+    if mode == AGGREGATE_RAW:
+        return RawStage()
+    raise ValueError(f"Unknown aggregation mode '{mode}'. Use one of {AGGREGATION_MODES}.")
+
+
+class RawHistory:
+    """
+    Keeps the last `seconds` of raw readings per device. When an alert fires,
+    they are written to `path` together with the device's readings for
+    `after_seconds` more, each row tagged with the alert that caused it.
+    """
+
+    def __init__(self, seconds=RAW_HISTORY_SECONDS, after_seconds=RAW_AFTER_SECONDS, path=ALERT_RAW_LOG):
+        self.span = timedelta(seconds=seconds)
+        self.after = timedelta(seconds=after_seconds)
+        self.writer = CsvBatchWriter(path, header=ALERT_RAW_HEADER, batch_size=500).start()
+        self._buffers = collections.defaultdict(collections.deque)  # device_id -> recent Readings
+        self._capturing = {}  # device_id -> (alert timestamp, rule, capture end)
+
+    def _write(self, alert, readings):
+        alert_timestamp, rule = alert[0].strftime("%Y-%m-%d %H:%M:%S"), alert[1]
+        for reading in readings:
+            self.writer.write((alert_timestamp, rule, reading.timestamp.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+                               f"{reading.temp:.2f}", f"{reading.humidity:.2f}", reading.device_id))
+
+    def record(self, readings, events=()):
+        """Adds a batch of raw readings, and captures history for the FIRED events among `events`."""
+        if not readings:
+            return
+        for reading in readings:
+            self._buffers[reading.device_id].append(reading)
+        newest = readings[-1].timestamp
+        for device_id, buffer in self._buffers.items():
+            while buffer and newest - buffer[0].timestamp > self.span:
+                buffer.popleft()
+
+        for device_id, capture in list(self._capturing.items()):
+            if newest > capture[2]:
+                del self._capturing[device_id]
+            else:
+                self._write(capture, [r for r in readings if r.device_id == device_id])
+        for event in events:
+            if event.event == FIRED and event.device_id not in self._capturing:
+                capture = (event.timestamp, event.rule, event.timestamp + self.after)
+                # The batch that fired the alert is already in the buffer
+                self._write(capture, self._buffers[event.device_id])
+                self._capturing[event.device_id] = capture
+
+    def close(self):
+        self.writer.close()
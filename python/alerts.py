@@ -0,0 +1,266 @@
+import collections
+import csv
+import json
+import os
+import threading
+
+import numpy as np
+
+from csv_writer import CsvBatchWriter
+from metrics import Histogram
+
+ALERT_LOG = 'data/alerts.csv'
+ALERT_HEADER = ['Timestamp', 'Device', 'Rule', 'Event', 'Value', 'Threshold']
+ALERT_RULES_FILE = 'alert_rules.json'
+
+# --- Rule kinds ---
+ABOVE = 'above'   # value > threshold; clears below threshold - hysteresis
+BELOW = 'below'   # value < threshold; clears above threshold + hysteresis
+RATE = 'rate'     # |change per minute over `window` seconds| > threshold
+KINDS = (ABOVE, BELOW, RATE)
+FIELDS = ('temp', 'humidity')
+
+FIRED = 'fired'
+CLEARED = 'cleared'
+
+# `device=None` applies the rule to every device; `min_duration` is how long (seconds)
+# the condition must hold before the alert fires
+AlertRule = collections.namedtuple(
+    'AlertRule', ['name', 'field', 'kind', 'threshold', 'hysteresis', 'min_duration', 'window', 'device'],
+    defaults=(0.0, 0.0, 60.0, None))
+AlertEvent = collections.namedtuple('AlertEvent', ['timestamp', 'device_id', 'rule', 'event', 'value', 'threshold'])
+
+
+def threshold_rules(min_temp, max_temp, hysteresis=0.0):
+    """The GUI's min/max temperature band as two rules."""
+    return [AlertRule('temp_low', 'temp', BELOW, float(min_temp), hysteresis),
+            AlertRule('temp_high', 'temp', ABOVE, float(max_temp), hysteresis)]
+
+
+def load_rules(path=ALERT_RULES_FILE):
+    """
+    Reads extra rules from a JSON list of objects with AlertRule's fields, e.g.
+    {"name": "humid", "field": "humidity", "kind": "above", "threshold": 70,
+    "hysteresis": 2, "min_duration": 30, "device": "/dev/ttyUSB0"}.
+    Returns [] if the file does not exist; raises ValueError for an invalid rule.
+    """
+    if not os.path.isfile(path):
+        return []
+    with open(path) as f:
+        rules = [AlertRule(**spec) for spec in json.load(f)]
+    _CompiledRules(rules)  # Raises ValueError for an invalid rule now rather than on first use
+    return rules
+
+
+class _CompiledRules:
+    """Rule parameters as arrays, one row per rule."""
+
+    def __init__(self, rules):
+        for rule in rules:
+            if rule.field not in FIELDS:
+                raise ValueError(f"Rule '{rule.name}': unknown field '{rule.field}'. Use one of {FIELDS}.")
+            if rule.kind not in KINDS:
+                raise ValueError(f"Rule '{rule.name}': unknown kind '{rule.kind}'. Use one of {KINDS}.")
+        names = [rule.name for rule in rules]
+        if len(set(names)) != len(names):
+            raise ValueError("Alert rule names must be unique.")
+
+        self.rules = list(rules)
+        self.names = names
+        self.field = np.array([FIELDS.index(rule.field) for rule in rules], dtype=np.intp)
+        # Every test is written as "sign * value > sign * threshold", so below-rules just flip the sign
+        self.sign = np.array([-1.0 if rule.kind == BELOW else 1.0 for rule in rules])
+        self.threshold = np.array([float(rule.threshold) for rule in rules])
+        self.trip_level = self.sign * self.threshold
+        self.clear_level = self.trip_level - np.array([float(rule.hysteresis) for rule in rules])
+        self.min_duration = np.array([float(rule.min_duration) for rule in rules])
+        self.rate_rows = [i for i, rule in enumerate(rules) if rule.kind == RATE]
+        self.max_window = max((float(rules[i].window) for i in self.rate_rows), default=0.0)
+        self.devices = [rule.device for rule in rules]
+        self._applies = {}
+
+    def applies(self, device_id):
+        """Boolean mask of the rules that apply to `device_id`."""
+        mask = self._applies.get(device_id)
+        if mask is None:
+            mask = np.array([device in (None, device_id) for device in self.devices], dtype=bool)
+            self._applies[device_id] = mask
+        return mask
+
+
+class _DeviceState:
+    """Per-device alert state carried from one batch to the next."""
+
+    def __init__(self, n_rules):
+        self.condition = np.zeros(n_rules, dtype=bool)   # Tripped, with hysteresis applied
+        self.run_start = np.full(n_rules, np.nan)        # When the current tripped run began
+        self.fired = np.zeros(n_rules, dtype=bool)
+        self.value = np.full(n_rules, np.nan)            # Value that fired the alert
+        self.history = np.empty((3, 0))                  # (ts, temp, humidity) kept for rate rules
+
+    def remap(self, old_names, new_names):
+        """Keeps the state of rules that survive a recompile, by name."""
+        state = _DeviceState(len(new_names))
+        old_index = {name: i for i, name in enumerate(old_names)}
+        for i, name in enumerate(new_names):
+            j = old_index.get(name)
+            if j is not None:
+                state.condition[i] = self.condition[j]
+                state.run_start[i] = self.run_start[j]
+                state.fired[i] = self.fired[j]
+                state.value[i] = self.value[j]
+        state.history = self.history
+        return state
+
+
+def _carry_forward(mask, values, initial):
+    """For each row, the value at the last position where `mask` is set, or `initial` before the first."""
+    n = mask.shape[1]
+    last = np.maximum.accumulate(np.where(mask, np.arange(n), -1), axis=1)
+    picked = np.take_along_axis(values, np.maximum(last, 0), axis=1)
+    return np.where(last >= 0, picked, initial[:, None])
+
+
+class AlertEngine:
+    """
+    Evaluates a compiled set of alert rules over batches of Readings.
+
+    `set_rules()` validates the rules and turns them into arrays once;
+    `evaluate()` then tests every rule against a whole batch per device
+    with NumPy (hysteresis and minimum duration are carried across batches
+    as per-device state) and returns the fired/cleared AlertEvents. It is
+    meant to run on the ingestion thread, and `set_rules()` may be called
+    from another thread at any time.
+    """
+
+    def __init__(self, rules=()):
+        self._lock = threading.Lock()
+        self._compiled = _CompiledRules([])
+        self._states = {}
+        self.compiles = 0
+        self.evaluate_seconds = Histogram()
+        self.set_rules(rules)
+
+    @property
+    def rules(self):
+        return self._compiled.rules
+
+    def set_rules(self, rules):
+        """Recompiles the rule set. Raises ValueError for an invalid rule and keeps the old set."""
+        compiled = _CompiledRules(rules)
+        with self._lock:
+            old = self._compiled
+            self._compiled = compiled
+            self._states = {device: state.remap(old.names, compiled.names) for device, state in self._states.items()}
+            self.compiles += 1
+
+    def active(self):
+        """Currently fired alerts as {(device_id, rule name): value that fired it}."""
+        with self._lock:
+            names = self._compiled.names
+            return {(device, names[i]): float(state.value[i])
+                    for device, state in self._states.items() for i in np.flatnonzero(state.fired)}
+
+    def evaluate(self, readings):
+        """Runs every rule over `readings` and returns the resulting AlertEvents in time order."""
+        with self.evaluate_seconds.time():
+            return self._evaluate(readings)
+
+    def _evaluate(self, readings):
+        by_device = collections.defaultdict(list)
+        for reading in readings:
+            by_device[reading.device_id].append(reading)
+        events = []
+        with self._lock:
+            compiled = self._compiled
+            if not compiled.rules:
+                return events
+            for device_id, device_readings in by_device.items():
+                state = self._states.get(device_id)
+                if state is None:
+                    state = self._states[device_id] = _DeviceState(len(compiled.rules))
+                events.extend(self._evaluate_device(compiled, state, device_id, device_readings))
+        events.sort(key=lambda event: event.timestamp)
+        return events
+
+    def _rates(self, compiled, state, ts, fields):
+        """Change per minute of each rate rule's field, over at least the rule's window, per sample."""
+        history = np.concatenate([state.history, np.vstack([ts, fields])], axis=1)
+        offset = state.history.shape[1]
+        rates = {}
+        for row in compiled.rate_rows:
+            window = float(compiled.rules[row].window)
+            values = history[1 + compiled.field[row]]
+            # Newest earlier sample at least `window` seconds older than each new one
+            j = np.searchsorted(history[0], ts - window, side='right') - 1
+            valid = j >= 0
+            j = np.maximum(j, 0)
+            elapsed = ts - history[0, j]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rate = (values[offset:] - values[j]) / elapsed * 60.0
+            rates[row] = np.where(valid & (elapsed > 0), np.abs(rate), np.nan)
+        # Keep just enough history for the longest window
+        keep = max(0, np.searchsorted(history[0], history[0, -1] - compiled.max_window, side='right') - 1)
+        state.history = history[:, keep:]
+        return rates
+
+    def _evaluate_device(self, compiled, state, device_id, readings):
+        ts = np.array([reading.timestamp.timestamp() for reading in readings], dtype=float)
+        fields = np.array([[reading.temp for reading in readings], [reading.humidity for reading in readings]],
+                          dtype=float)
+        values = fields[compiled.field]  # (rules, samples)
+        if compiled.rate_rows:
+            for row, rate in self._rates(compiled, state, ts, fields).items():
+                values[row] = rate
+
+        signed = compiled.sign[:, None] * values
+        applies = compiled.applies(device_id)[:, None]
+        trip = (signed > compiled.trip_level[:, None]) & applies
+        clear = (signed < compiled.clear_level[:, None]) | ~applies
+        # Between the trip and clear levels (or on NaN) the previous condition holds
+        changed = trip | clear
+        condition = _carry_forward(changed, trip, state.condition)
+
+        previous = np.concatenate([state.condition[:, None], condition[:, :-1]], axis=1)
+        starts = condition & ~previous
+        run_start = _carry_forward(starts, np.broadcast_to(ts, condition.shape), state.run_start)
+        fired = condition & (ts[None, :] - run_start >= compiled.min_duration[:, None])
+
+        was_fired = np.concatenate([state.fired[:, None], fired[:, :-1]], axis=1)
+        events = []
+        for row, i in zip(*np.nonzero(fired != was_fired)):
+            value = float(values[row, i])
+            if fired[row, i]:
+                state.value[row] = value
+            events.append(AlertEvent(readings[i].timestamp, device_id, compiled.names[row],
+                                     FIRED if fired[row, i] else CLEARED, value, float(compiled.threshold[row])))
+
+        state.condition = condition[:, -1].copy()
+        state.run_start = np.where(state.condition, run_start[:, -1], np.nan)
+        state.fired = fired[:, -1].copy()
+        return events
+
+
+class AlertLog(CsvBatchWriter):
+    """Appends AlertEvents to their own CSV file from a background thread."""
+
+    def __init__(self, path=ALERT_LOG, **kwargs):
+        kwargs.setdefault('batch_size', 1)
+        super().__init__(path, header=ALERT_HEADER, **kwargs)
+
+    def write_events(self, events):
+        for event in events:
+            self.write((event.timestamp.strftime("%Y-%m-%d %H:%M:%S"), event.device_id, event.rule,
+                        event.event, f"{event.value:.2f}", f"{event.threshold:g}"))
+
+
+def read_events(path=ALERT_LOG, start_key=None, end_key=None):
+    """Logged events as rows of ALERT_HEADER, limited to timestamps between the two keys (inclusive)."""
+    if not os.path.isfile(path):
+        return []
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return [row for row in reader
+                if len(row) == len(ALERT_HEADER)
+                and (start_key is None or row[0] >= start_key) and (end_key is None or row[0] <= end_key)]
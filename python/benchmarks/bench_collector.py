@@ -0,0 +1,96 @@
+"""
+Collector load test on localhost: a collector.py process writing a fresh
+CSV log, and simulated gateways (gateway.py) in this process, each with its
+own connection, sending synthetic 20 Hz sensors.
+
+Reports the acknowledged readings/sec and acknowledgement latency for each
+number of gateways, and checks that the log holds exactly the readings that
+were acknowledged.
+
+Run from the python/ directory:
+    python benchmarks/bench_collector.py [--gateways 10 100 1000] [--rate 20] [--seconds 10] [--udp]
+"""
+import argparse
+import asyncio
+import glob
+import os
+import re
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PYTHON_DIR)
+
+from gateway import GatewayClient, simulate_sensors
+from metrics import Histogram
+
+
+def start_collector(directory, udp):
+    """A collector process logging into `directory`. Returns (process, port)."""
+    command = [sys.executable, os.path.join(PYTHON_DIR, 'collector.py'), '--port', '0', '--no-metrics']
+    if not udp:
+        command.append('--no-udp')
+    process = subprocess.Popen(command, cwd=directory, stdout=subprocess.PIPE, text=True,
+                               env=dict(os.environ, PYTHONPATH=PYTHON_DIR))
+    for line in process.stdout:
+        match = re.search(r'TCP port (\d+)', line)
+        if match:
+            return process, int(match.group(1))
+    raise RuntimeError("The collector did not start")
+
+
+async def push(port, gateways, rate, seconds, udp):
+    ack_seconds = Histogram()
+    clients = [GatewayClient(f"bench-{i:05d}", '127.0.0.1', port, udp, ack_seconds=ack_seconds)
+               for i in range(gateways)]
+    senders = [asyncio.ensure_future(client.run()) for client in clients]
+    started = time.monotonic()
+    await asyncio.gather(*(simulate_sensors(client, 1, rate, seconds, seed=i) for i, client in enumerate(clients)))
+    flushed = all(await asyncio.gather(*(client.flush(30.0) for client in clients)))
+    elapsed = time.monotonic() - started
+    for sender in senders:
+        sender.cancel()
+    return clients, ack_seconds, elapsed, flushed
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--gateways', type=int, nargs='+', default=[10, 100, 1000])
+    ap.add_argument('--rate', type=float, default=20.0, help="Readings/sec of each gateway's sensor")
+    ap.add_argument('--seconds', type=float, default=10.0)
+    ap.add_argument('--udp', action='store_true', help="Send datagrams instead of TCP")
+    args = ap.parse_args()
+
+    # Every gateway holds a socket here and in the collector
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    print(f"{os.cpu_count()} cores, open file limit {hard}, {'UDP' if args.udp else 'TCP'}\n")
+    print(f"{'gateways':>8} {'offered/s':>10} {'acked/s':>9} {'ack p50':>8} {'ack p99':>8} {'dropped':>8}  log")
+
+    for gateways in args.gateways:
+        with tempfile.TemporaryDirectory() as scratch:
+            collector, port = start_collector(scratch, args.udp)
+            try:
+                clients, ack_seconds, elapsed, flushed = asyncio.run(
+                    push(port, gateways, args.rate, args.seconds, args.udp))
+            finally:
+                collector.send_signal(signal.SIGINT)
+                collector.wait(30)
+            acked = sum(client.readings_acked for client in clients)
+            dropped = sum(client.readings_dropped for client in clients)
+            rows = 0
+            for path in glob.glob(os.path.join(scratch, 'data', '*.csv')):
+                with open(path) as file:
+                    rows += sum(1 for _ in file) - 1
+            verdict = "matches" if rows == acked and flushed else f"DIFFERS: {rows} rows, {acked} acknowledged"
+            print(f"{gateways:>8} {gateways * args.rate:>10.0f} {acked / elapsed:>9.0f} "
+                  f"{ack_seconds.quantile(0.5) * 1000:>6.0f}ms {ack_seconds.quantile(0.99) * 1000:>6.0f}ms "
+                  f"{dropped:>8}  {verdict}")
+
+
+if __name__ == '__main__':
+    main()
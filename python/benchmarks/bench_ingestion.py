@@ -0,0 +1,157 @@
+"""
+End-to-end ingestion benchmark: simulated serial devices -> SerialIngestionEngine
+-> SensorApp.process_sensor_data -> UI dispatcher and partitioned CSV writer.
+
+Runs the GUI's serial path headlessly (no Tk window) against pty devices
+from simulator.py and reports sustained samples/sec, read-to-disk latency
+percentiles (from the line being sent to its row reaching the file) and
+drop counts.
+
+Run from the python/ directory (Linux/macOS):
+    python benchmarks/bench_ingestion.py --rate 20 200 2000 --devices 2 --seconds 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aggregation import AGGREGATE_RAW
+from alerts import AlertEngine, AlertLog, threshold_rules
+from ingestion import SerialIngestionEngine
+from main_gui import ALERT_HYSTERESIS, CSV_BATCH_SIZE, CSV_FLUSH_INTERVAL, CSV_QUEUE_SIZE, UI_QUEUE_SIZE, UI_TICK_MS, SensorApp
+from partitions import PartitionedCsvWriter, PartitionedLog
+from simulator import PtyDevice, replay_trace, synthetic_trace
+from ui_dispatcher import UiDispatcher
+
+
+class HeadlessRoot:
+    """Stands in for Tk: the dispatcher's after() callback is run by a plain thread."""
+
+    def __init__(self):
+        self.callback = None
+
+    def after(self, ms, callback):
+        self.callback = callback
+        return 1
+
+    def after_cancel(self, after_id):
+        self.callback = None
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(rate, devices, seconds, replay, failure_rate, out_dir):
+    traces = [replay_trace(replay, loop=True, failure_rate=failure_rate, seed=i) if replay
+              else synthetic_trace(seed=i, failure_rate=failure_rate) for i in range(devices)]
+    sims = [PtyDevice(trace, rate, record=True) for trace in traces]
+    by_port = {sim.port: sim for sim in sims}
+    landed = {sim.port: 0 for sim in sims}
+    latencies = []
+
+    def on_disk(path, rows, offsets, end_offset):
+        now = time.monotonic()
+        for row in rows:
+            sim = by_port[row[3]]
+            k = landed[row[3]]
+            if k < len(sim.send_times):
+                latencies.append(now - sim.send_times[k])
+            landed[row[3]] = k + 1
+
+    # The GUI's own serial path, without building the Tk window
+    app = SensorApp.__new__(SensorApp)
+    app.log = PartitionedLog(os.path.join(out_dir, 'data.csv'))
+    app.log_readings = True
+    app.alerts = AlertEngine(threshold_rules(0, 40, ALERT_HYSTERESIS))
+    app.alert_log = AlertLog(os.path.join(out_dir, 'alerts.csv')).start()
+    app.setup_aggregation(AGGREGATE_RAW)  # Every reading reaches the file, so rows can be matched to lines sent
+    app.csv_writer = PartitionedCsvWriter(app.log, compress=False, listeners=[on_disk], max_queue=CSV_QUEUE_SIZE,
+                                          batch_size=CSV_BATCH_SIZE, flush_interval=CSV_FLUSH_INTERVAL).start()
+    root = HeadlessRoot()
+    app.ui = UiDispatcher(root, lambda items, latest: None,
+                          max_items=UI_QUEUE_SIZE, tick_ms=UI_TICK_MS).start()
+    app.engine = SerialIngestionEngine([sim.port for sim in sims], on_readings=app.process_sensor_data,
+                                       settle_time=0.0)
+
+    ticking = threading.Event()
+    ticking.set()
+
+    def tick_loop():
+        while ticking.is_set():
+            time.sleep(UI_TICK_MS / 1000)
+            if root.callback:
+                root.callback()
+
+    threads = [threading.Thread(target=app.serial_worker, daemon=True), threading.Thread(target=tick_loop, daemon=True)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)  # Let the engine open the ports before the devices start talking
+
+    started = time.monotonic()
+    for sim in sims:
+        sim.start()
+    time.sleep(seconds)
+    for sim in sims:
+        sim.stop()
+    elapsed = time.monotonic() - started
+
+    # Let everything already sent reach the disk
+    deadline = time.monotonic() + 5.0
+    sent = sum(sim.readings_sent for sim in sims)
+    while time.monotonic() < deadline and sum(landed.values()) + app.csv_writer.rows_dropped < sent:
+        time.sleep(0.05)
+    app.engine.stop()
+    threads[0].join(2.0)
+    app.csv_writer.close()
+    app.alert_log.close()
+    ticking.clear()
+    for sim in sims:
+        sim.close()
+
+    written = sum(landed.values())
+    failed_reads = sum(state.parser.failed_reads for state in app.engine.ports)
+    return {
+        'rate': rate * devices,
+        'sent': sent,
+        'written': written,
+        'per_sec': written / elapsed,
+        'p50': percentile(latencies, 0.50) * 1000,
+        'p95': percentile(latencies, 0.95) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+        'max': max(latencies, default=float('nan')) * 1000,
+        'writer_dropped': app.csv_writer.rows_dropped,
+        'ui_dropped': app.ui.dropped,
+        'lost': sent - written - app.csv_writer.rows_dropped,
+        'failed_reads': failed_reads,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--rate', type=float, nargs='+', default=[20.0, 200.0, 2000.0], help="Lines/sec per device")
+    ap.add_argument('--devices', type=int, default=1)
+    ap.add_argument('--seconds', type=float, default=10.0)
+    ap.add_argument('--replay', metavar='CSV', help="Replay this log instead of a synthetic trace")
+    ap.add_argument('--failure-rate', type=float, default=0.02)
+    args = ap.parse_args()
+
+    print(f"{'offered/s':>10} {'sent':>8} {'on disk':>8} {'samples/s':>10} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8} {'wr drop':>8} {'ui drop':>8} {'lost':>6} {'failed':>7}")
+    for rate in args.rate:
+        with tempfile.TemporaryDirectory() as out_dir:
+            r = run(rate, args.devices, args.seconds, args.replay, args.failure_rate, out_dir)
+        print(f"{r['rate']:>10,.0f} {r['sent']:>8} {r['written']:>8} {r['per_sec']:>10,.0f} {r['p50']:>8.1f} "
+              f"{r['p95']:>8.1f} {r['p99']:>8.1f} {r['max']:>8.1f} {r['writer_dropped']:>8} {r['ui_dropped']:>8} "
+              f"{r['lost']:>6} {r['failed_reads']:>7}")
+
+
+if __name__ == '__main__':
+    main()
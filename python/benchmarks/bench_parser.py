@@ -0,0 +1,106 @@
+"""
+Microbenchmark: per-line readline/decode/re.search parsing vs. chunked LineParser,
+and the StreamDecoder on the same readings as text and as binary frames.
+
+Run from the python/ directory:
+    python benchmarks/bench_parser.py [--lines 200000] [--chunk 4096]
+"""
+import argparse
+import io
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sensor_parser import LineParser
+from wire_protocol import FRAME_FAILED_READ, StreamDecoder, encode_frame
+
+
+def make_stream(n_lines, failure_rate=0.05, seed=42, binary=False):
+    """Builds a byte stream in the exact format sent by src/main.cpp (text, or binary frames)."""
+    rng = random.Random(seed)
+    out = []
+    for sequence in range(n_lines):
+        if rng.random() < failure_rate:
+            if binary:
+                out.append(encode_frame(1, sequence, frame_type=FRAME_FAILED_READ))
+            else:
+                out.append(b"Failed to read from DHT sensor!\r\n")
+        else:
+            temp, humidity = round(rng.uniform(20, 30), 2), round(rng.uniform(40, 80), 2)
+            if binary:
+                out.append(encode_frame(1, sequence, temp, humidity))
+            else:
+                out.append(f"Temperature: {temp:.2f}°C  |  Humidity: {humidity:.2f}%\r\n".encode('utf-8'))
+    return b"".join(out)
+
+
+def legacy_parse_data(line):
+    """The parse_data() that main_gui.py used before LineParser."""
+    try:
+        temp_match = re.search(r"Temperature:\s*([\d\.]+)", line)
+        hum_match = re.search(r"Humidity:\s*([\d\.]+)", line)
+        if temp_match and hum_match:
+            return float(temp_match.group(1)), float(hum_match.group(1))
+    except (AttributeError, ValueError):
+        return None, None
+    return None, None
+
+
+def bench_legacy(stream):
+    reader = io.BytesIO(stream)
+    readings = []
+    start = time.perf_counter()
+    while True:
+        raw = reader.readline()
+        if not raw:
+            break
+        line = raw.decode('utf-8').strip()
+        if line:
+            temp, humidity = legacy_parse_data(line)
+            if temp is not None:
+                readings.append((temp, humidity))
+    return time.perf_counter() - start, readings
+
+
+def bench_chunked(stream, chunk_size, parser_class=LineParser):
+    parser = parser_class()
+    readings = []
+    start = time.perf_counter()
+    for offset in range(0, len(stream), chunk_size):
+        readings.extend(parser.feed(stream[offset:offset + chunk_size]))
+    return time.perf_counter() - start, readings, parser
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--lines', type=int, default=200000)
+    ap.add_argument('--chunk', type=int, default=4096, help="Bytes per simulated in_waiting read")
+    args = ap.parse_args()
+
+    stream = make_stream(args.lines)
+    legacy_time, legacy_readings = bench_legacy(stream)
+    chunked_time, chunked_readings, parser = bench_chunked(stream, args.chunk)
+
+    decoder_time, decoder_readings, _ = bench_chunked(stream, args.chunk, StreamDecoder)
+    frames = make_stream(args.lines, binary=True)
+    binary_time, binary_readings, _ = bench_chunked(frames, args.chunk, StreamDecoder)
+
+    if not legacy_readings == chunked_readings == decoder_readings == binary_readings:
+        print("❌ Parsers disagree on the parsed readings!")
+        sys.exit(1)
+
+    print(f"Lines: {args.lines}  readings: {len(chunked_readings)}  failed sensor reads: {parser.failed_reads}")
+    print(f"Legacy readline + re.search : {args.lines / legacy_time:12,.0f} lines/sec")
+    print(f"Chunked LineParser ({args.chunk} B) : {args.lines / chunked_time:12,.0f} lines/sec")
+    print(f"Speed-up: {legacy_time / chunked_time:.1f}x")
+    print(f"StreamDecoder, text         : {args.lines / decoder_time:12,.0f} lines/sec")
+    print(f"StreamDecoder, binary frames: {args.lines / binary_time:12,.0f} frames/sec "
+          f"({len(frames) / args.lines:.0f} vs {len(stream) / args.lines:.0f} bytes per reading)")
+
+
+if __name__ == '__main__':
+    main()
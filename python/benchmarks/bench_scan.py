@@ -0,0 +1,107 @@
+"""
+Report statistics over a large CSV log: one pd.read_csv + describe() versus
+the chunked multi-core scan of chunked_scan.py at 1, 2, 4, ... jobs.
+
+Each variant runs in a fresh interpreter so its peak memory (of the largest
+process: pandas' one, or the biggest scan worker) is measured on its own.
+The statistics of every scan are checked against pandas.
+
+Run from the python/ directory:
+    python benchmarks/bench_scan.py [--rows 5000000] [--csv path/to/existing.csv] [--chunk-mb 16]
+"""
+import argparse
+import csv
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PANDAS_SCRIPT = """
+import sys, pandas as pd
+data = pd.read_csv(sys.argv[1])
+for column in ('Temperature_C', 'Humidity_Percent'):
+    stats = data[column].describe()
+    print(column, int(stats['count']), *(f"{stats[name]:.2f}" for name in ('mean', 'std', 'min', 'max')),
+          f"{data[column].median():.2f}")
+"""
+
+SCAN_SCRIPT = """
+import sys
+from chunked_scan import scan_stats
+summary = scan_stats([sys.argv[1]], jobs=int(sys.argv[2]), chunk_bytes=int(sys.argv[3]))
+for column, state in (('Temperature_C', summary.temp), ('Humidity_Percent', summary.hum)):
+    print(column, state.count, *(f"{value:.2f}" for value in (state.mean, state.std, state.min, state.max)),
+          f"{state.median:.2f}")
+"""
+
+
+def make_log(path, rows):
+    """A synthetic 20 Hz log with the columns main_gui.py writes."""
+    rng = random.Random(1)
+    start = datetime(2025, 7, 1)
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Timestamp', 'Temperature_C', 'Humidity_Percent', 'Device'])
+        for i in range(rows):
+            moment = start + timedelta(milliseconds=50 * i)
+            writer.writerow([moment.strftime("%Y-%m-%d %H:%M:%S"), f"{rng.gauss(22, 3):.2f}",
+                             f"{rng.uniform(30, 70):.2f}", '/dev/ttyUSB0'])
+
+
+def run(script, *args):
+    """
+    Runs `script` in a fresh interpreter. Returns (seconds, peak RSS in MB of
+    its largest process, the script or one of its workers, output).
+    """
+    # getrusage(RUSAGE_CHILDREN) keeps the maximum over every child ever waited for, so each run
+    # gets its own parent process
+    wrapper = ("import resource, subprocess, sys, time\n"
+               "started = time.perf_counter()\n"
+               "out = subprocess.run([sys.executable, '-c', sys.argv[1]] + sys.argv[2:], capture_output=True,"
+               " text=True, check=True).stdout\n"
+               "print(time.perf_counter() - started, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)\n"
+               "print(out, end='')\n")
+    env = dict(os.environ, PYTHONPATH=PYTHON_DIR)
+    result = subprocess.run([sys.executable, '-c', wrapper, script] + [str(arg) for arg in args],
+                            cwd=PYTHON_DIR, env=env, capture_output=True, text=True, check=True)
+    timing, output = result.stdout.split('\n', 1)
+    seconds, peak_kb = timing.split()
+    return float(seconds), int(peak_kb) / 1024, output
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--rows', type=int, default=5000000, help="Rows in the synthetic log")
+    ap.add_argument('--csv', help="Benchmark an existing CSV log instead")
+    ap.add_argument('--chunk-mb', type=float, default=16)
+    ap.add_argument('--max-jobs', type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        path = args.csv
+        if path is None:
+            path = os.path.join(scratch, 'data.csv')
+            print(f"Writing a {args.rows:,}-row log...")
+            make_log(path, args.rows)
+        print(f"Log: {os.path.getsize(path) / 2 ** 20:.0f} MiB, {os.cpu_count()} cores\n")
+
+        seconds, peak, expected = run(PANDAS_SCRIPT, path)
+        print(f"{'variant':>22} {'seconds':>8} {'peak MB':>8}  result")
+        print(f"{'pd.read_csv+describe':>22} {seconds:>8.2f} {peak:>8.0f}  reference")
+
+        jobs = 1
+        while jobs <= args.max_jobs:
+            seconds, peak, output = run(SCAN_SCRIPT, path, jobs, int(args.chunk_mb * 2 ** 20))
+            verdict = "matches" if output == expected else "DIFFERS"
+            print(f"{f'scan, {jobs} job(s)':>22} {seconds:>8.2f} {peak:>8.0f}  {verdict}")
+            if output != expected:
+                print(f"  pandas:\n{expected}  scan:\n{output}")
+            jobs *= 2
+
+
+if __name__ == '__main__':
+    main()
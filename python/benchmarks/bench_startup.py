@@ -0,0 +1,116 @@
+"""
+Startup benchmark: import cost of the GUI and of the pieces it defers.
+
+Each measurement runs in a fresh interpreter (imports are cached after the
+first one), using `python -X importtime`. With a display available it also
+times how long SensorApp takes to show its window and to finish loading the
+graph in the background.
+
+Run from the python/ directory:
+    python benchmarks/bench_startup.py [--runs 5] [--top 12]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_PACKAGES = ('numpy', 'pandas', 'matplotlib', 'fpdf')
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+# (label, statement) pairs timed on their own
+TARGETS = [
+    ("GUI module", "import main_gui"),
+    ("graph (deferred)", "import main_gui; main_gui.load_plotting()"),
+    ("report (worker only)", "import generate_report"),
+    ("numpy", "import numpy"),
+]
+
+WINDOW_SCRIPT = """
+import time
+started = time.perf_counter()
+import tkinter as tk
+import main_gui
+root = tk.Tk()
+app = main_gui.SensorApp(root)
+root.update()
+shown = time.perf_counter() - started
+while not app.plot_ready:
+    root.update()
+    time.sleep(0.005)
+ready = time.perf_counter() - started
+app.shutdown()
+print(shown, ready)
+"""
+
+
+def run_python(args, cwd=PYTHON_DIR):
+    env = dict(os.environ, PYTHONPATH=PYTHON_DIR, PYTHONDONTWRITEBYTECODE='1')
+    return subprocess.run([sys.executable] + args, cwd=cwd, env=env, capture_output=True, text=True, check=True)
+
+
+def import_profile(statement):
+    """
+    Returns (seconds spent in `statement`, heavy packages it loaded,
+    {module: cumulative µs} for the modules imported directly by the
+    statement's own top-level modules).
+    """
+    script = (f"import sys, time\nstarted = time.perf_counter()\n{statement}\n"
+              f"print(time.perf_counter() - started)\n"
+              f"print(','.join(p for p in {HEAVY_PACKAGES!r} if p in sys.modules))")
+    result = run_python(['-X', 'importtime', '-c', script])
+    elapsed, loaded = result.stdout.splitlines()[-2:]
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and len(match.group(3)) == 3:  # Depth 1 (importtime indents two spaces per level)
+            modules[match.group(4)] = int(match.group(2))
+    return float(elapsed), [p for p in loaded.split(',') if p], modules
+
+
+def bench_imports(runs, top):
+    print(f"{'target':>22} {'median ms':>10} {'min ms':>8}  heavy packages loaded")
+    profiles = {}
+    for label, statement in TARGETS:
+        totals = []
+        for _ in range(runs):
+            elapsed, loaded, modules = import_profile(statement)
+            totals.append(elapsed * 1000)
+        profiles[label] = modules
+        print(f"{label:>22} {statistics.median(totals):>10.1f} {min(totals):>8.1f}  {', '.join(loaded) or '-'}")
+
+    print(f"\nSlowest imports of {TARGETS[0][1]!r} (cumulative ms, last run):")
+    for name, cumulative in sorted(profiles[TARGETS[0][0]].items(), key=lambda item: -item[1])[:top]:
+        print(f"{cumulative / 1000:>10.1f}  {name}")
+
+
+def bench_window(runs):
+    if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+        print("\nNo display: skipping the time-to-window measurement.")
+        return
+    shown, ready = [], []
+    # A scratch directory, so the app's data/ and reports/ folders are not touched
+    with tempfile.TemporaryDirectory() as scratch:
+        for _ in range(runs):
+            result = run_python(['-c', WINDOW_SCRIPT], cwd=scratch)
+            first, second = map(float, result.stdout.split()[-2:])
+            shown.append(first * 1000)
+            ready.append(second * 1000)
+    print(f"\nWindow shown after {statistics.median(shown):.0f} ms, "
+          f"graph ready after {statistics.median(ready):.0f} ms (median of {runs})")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Measure GUI startup and import cost.")
+    ap.add_argument('--runs', type=int, default=5, help="Fresh interpreters per measurement")
+    ap.add_argument('--top', type=int, default=12, help="Slowest GUI imports to list")
+    args = ap.parse_args()
+    bench_imports(args.runs, args.top)
+    bench_window(args.runs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""
+Statistics over large CSV logs, computed on all cores.
+
+Each file is split into byte ranges that start and end on line boundaries.
+Worker processes parse and filter one range at a time with pandas and
+reduce it to a mergeable BucketState (count, mean, M2, min, max and the
+histogram sketch behind the exact median), so memory stays bounded by
+the chunk size however large the log is. The partial states are then
+merged into the same statistics the report shows. RollupStore uses the same
+scan, with per-minute states, to catch up on large backlogs.
+
+    python chunked_scan.py data/data.csv [--start "2025-07-24 00:00:00"] [--end ...] [--jobs 8] [--check]
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from rollups import LEVELS, SKETCH_SCALE, BucketState, MetricState
+
+SCAN_CHUNK_BYTES = 16 * 1024 * 1024  # Bytes parsed by a worker at a time
+SCAN_JOBS = os.cpu_count() or 1
+TAIL_SEARCH_BYTES = 1024 * 1024      # How far back from the end to look for the last complete line
+COLUMNS = ['Timestamp', 'Temperature_C', 'Humidity_Percent', 'Device',
+           'Temperature_Min', 'Temperature_Max', 'Humidity_Min', 'Humidity_Max', 'Samples']
+WINDOW_COLUMNS = COLUMNS[4:8]
+MINUTE_PREFIX = dict(LEVELS)['minute']
+# Values that are not numbers make their column text; _clean() then drops those rows. Every column of a
+# window record (aggregation.py) is named; shorter rows (readings, legacy logs without a Device column)
+# leave the rest empty, and no column is taken as an index.
+READ_OPTIONS = dict(names=COLUMNS, index_col=False, dtype={'Timestamp': str, 'Device': str},
+                    on_bad_lines='skip')
+
+
+def complete_end(path, begin=0):
+    """Byte offset just past the last complete line of `path` (a row still being written is left out)."""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as file:
+        file.seek(max(begin, size - TAIL_SEARCH_BYTES))
+        tail = file.read()
+    newline = tail.rfind(b'\n')
+    return begin if newline < 0 else size - len(tail) + newline + 1
+
+
+def line_chunks(path, chunk_bytes=SCAN_CHUNK_BYTES, begin=None, end=None):
+    """
+    Splits [begin, end) of an uncompressed CSV file into (begin, end) byte
+    ranges of about `chunk_bytes` that each hold whole lines. `begin`
+    defaults to the first row after the header, `end` to the end of the
+    last complete line.
+    """
+    with open(path, 'rb') as file:
+        if begin is None:
+            file.readline()
+            begin = file.tell()
+        end = complete_end(path, begin) if end is None else end
+        chunks, position = [], begin
+        while position < end:
+            file.seek(min(position + chunk_bytes, end))
+            if file.tell() < end:
+                file.readline()  # Move on to the start of the next line
+            stop = min(file.tell(), end)
+            chunks.append((position, stop))
+            position = stop
+    return chunks
+
+
+def metric_state(values, samples=None, minimums=None, maximums=None):
+    """
+    A MetricState for a float array, with the same results as adding the
+    values one by one. With `samples`, the values are window means that are
+    weighted like MetricState.add_window(), with their own min/max arrays.
+    """
+    state = MetricState()
+    if not len(values):
+        return state
+    weights = np.ones(len(values), dtype=np.int64) if samples is None else samples
+    state.count = int(weights.sum())
+    state.mean = float((values * weights).sum() / state.count)
+    state.m2 = float((weights * (values - state.mean) ** 2).sum())
+    state.min = float((values if minimums is None else minimums).min())
+    state.max = float((values if maximums is None else maximums).max())
+    keys, inverse = np.unique(np.rint(values * SKETCH_SCALE).astype(np.int64), return_inverse=True)
+    counts = np.bincount(inverse, weights=weights).astype(np.int64)
+    state.hist = Counter(dict(zip(keys.tolist(), counts.tolist())))
+    return state
+
+
+def bucket_state(frame):
+    """A BucketState for a frame from _clean(): readings, window records or both."""
+    state = BucketState()
+    if not len(frame):
+        return state
+    windows = frame['Samples'].notna()
+    for rows, weighted in ((frame.loc[~windows], False), (frame.loc[windows], True)):
+        if not len(rows):
+            continue
+        part = BucketState()
+        part.first, part.last = rows['Timestamp'].min(), rows['Timestamp'].max()
+        for metric, column, low, high in (('temp', 'Temperature_C', 'Temperature_Min', 'Temperature_Max'),
+                                          ('hum', 'Humidity_Percent', 'Humidity_Min', 'Humidity_Max')):
+            if weighted:
+                setattr(part, metric, metric_state(rows[column].to_numpy(), rows['Samples'].to_numpy(np.int64),
+                                                   rows[low].to_numpy(), rows[high].to_numpy()))
+            else:
+                setattr(part, metric, metric_state(rows[column].to_numpy()))
+        state.merge(part)
+    return state
+
+
+def _clean(frame, start, end):
+    """
+    Rows in [start, end] with numeric values, like BucketState.add_row()
+    (malformed rows are skipped). Window records keep a numeric Samples
+    column; for readings it is empty.
+    """
+    windows = frame['Samples'].notna()
+    for column in ['Temperature_C', 'Humidity_Percent', 'Samples'] + WINDOW_COLUMNS:
+        frame[column] = pd.to_numeric(frame[column], errors='coerce')
+    valid = frame[['Timestamp', 'Temperature_C', 'Humidity_Percent']].notna().all(axis=1)
+    complete = frame[['Samples'] + WINDOW_COLUMNS].notna().all(axis=1)
+    complete &= (frame['Samples'] >= 1) & (frame['Samples'] == frame['Samples'].round())
+    frame = frame.loc[valid & (~windows | complete)]
+    if start is not None:
+        frame = frame.loc[frame['Timestamp'] >= start]
+    if end is not None:
+        frame = frame.loc[frame['Timestamp'] <= end]
+    return frame
+
+
+def _read_frames(path, begin, end, chunk_bytes):
+    """Frames of at most about `chunk_bytes` of `path`: one byte range, or a whole .gz file in pieces."""
+    options = dict(header=None, **READ_OPTIONS)
+    if path.endswith('.gz'):
+        # Compressed partitions cannot be split; stream them a chunk of rows at a time
+        rows = max(1, chunk_bytes // 40)
+        with pd.read_csv(path, compression='gzip', skiprows=1, chunksize=rows, **options) as reader:
+            yield from reader
+        return
+    with open(path, 'rb') as file:
+        file.seek(begin)
+        data = file.read(end - begin)
+    yield pd.read_csv(io.BytesIO(data), **options)
+
+
+def scan_chunk(task):
+    """
+    Worker: summarises one chunk. Returns a BucketState, or with `by_minute`
+    a {"YYYY-MM-DD HH:MM": BucketState} dict.
+    """
+    path, begin, end, start, stop, by_minute, chunk_bytes = task
+    result = {} if by_minute else BucketState()
+    for frame in _read_frames(path, begin, end, chunk_bytes):
+        frame = _clean(frame, start, stop)
+        if not by_minute:
+            result.merge(bucket_state(frame))
+            continue
+        for minute, group in frame.groupby(frame['Timestamp'].str.slice(0, MINUTE_PREFIX), sort=False):
+            state = bucket_state(group)
+            if minute in result:
+                result[minute].merge(state)
+            else:
+                result[minute] = state
+    return result
+
+
+def _tasks(paths, start, end, by_minute, chunk_bytes, begin=None, stop=None):
+    tasks = []
+    for path in paths:
+        if path.endswith('.gz'):
+            tasks.append((path, None, None, start, end, by_minute, chunk_bytes))
+            continue
+        for chunk_begin, chunk_end in line_chunks(path, chunk_bytes, begin, stop):
+            tasks.append((path, chunk_begin, chunk_end, start, end, by_minute, chunk_bytes))
+    return tasks
+
+
+def _map(tasks, jobs):
+    """Runs scan_chunk over the tasks, in worker processes when there is more than one of each."""
+    if jobs <= 1 or len(tasks) <= 1 or multiprocessing.current_process().daemon:
+        for task in tasks:
+            yield scan_chunk(task)
+        return
+    # Spawned workers, safe to start from the GUI and the writer threads
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(jobs, len(tasks)), mp_context=context) as pool:
+        yield from pool.map(scan_chunk, tasks)
+
+
+def scan_stats(paths, start=None, end=None, jobs=SCAN_JOBS, chunk_bytes=SCAN_CHUNK_BYTES):
+    """
+    Summarises the rows with start <= timestamp <= end in the given CSV
+    files (plain or .gz). Returns a BucketState, as RollupStore.stats() does.
+    """
+    result = BucketState()
+    for state in _map(_tasks(paths, start, end, False, chunk_bytes), jobs):
+        result.merge(state)
+    return result
+
+
+def scan_minutes(path, begin, jobs=SCAN_JOBS, chunk_bytes=SCAN_CHUNK_BYTES):
+    """
+    Per-minute BucketStates of the complete rows of an uncompressed CSV file
+    from byte offset `begin`. Returns (states, end offset of the rows read).
+    """
+    end = complete_end(path, begin)
+    minutes = {}
+    for states in _map(_tasks([path], None, None, True, chunk_bytes, begin=begin, stop=end), jobs):
+        for minute, state in states.items():
+            if minute in minutes:
+                minutes[minute].merge(state)
+            else:
+                minutes[minute] = state
+    return minutes, end
+
+
+def main():
+    from partitions import PartitionedLog
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('csv', nargs='?', default='data/data.csv', help="Log path; its partitions are found next to it")
+    ap.add_argument('--start', help='First second, "YYYY-MM-DD HH:MM:SS"')
+    ap.add_argument('--end', help='Last second, "YYYY-MM-DD HH:MM:SS"')
+    ap.add_argument('--jobs', type=int, default=SCAN_JOBS, help="Worker processes (default: all cores)")
+    ap.add_argument('--chunk-mb', type=float, default=SCAN_CHUNK_BYTES / 2 ** 20, help="Chunk size in MiB")
+    ap.add_argument('--check', action='store_true', help="Compare with pandas on the whole range (loads it all; logs of readings only)")
+    args = ap.parse_args()
+
+    log = PartitionedLog(args.csv)
+    paths = [partition.path for partition in log.overlapping(args.start, args.end)]
+    if not paths:
+        print(f"❌ Error: no log partitions found for {args.csv}")
+        return
+    started = time.perf_counter()
+    summary = scan_stats(paths, args.start, args.end, args.jobs, int(args.chunk_mb * 2 ** 20))
+    elapsed = time.perf_counter() - started
+    print(f"✅ Scanned {summary.count} rows from {len(paths)} file(s) in {elapsed:.2f} s with {args.jobs} job(s)")
+    print(f"   {summary.first} to {summary.last}")
+    print(f"{'Statistic':>10} {'Temperature (°C)':>17} {'Humidity (%)':>13}")
+    for name, attribute, digits in (('Count', 'count', 0), ('Mean', 'mean', 2), ('Median', 'median', 2),
+                                    ('Std Dev', 'std', 2), ('Min', 'min', 2), ('Max', 'max', 2)):
+        print(f"{name:>10} {getattr(summary.temp, attribute):>17.{digits}f} "
+              f"{getattr(summary.hum, attribute):>13.{digits}f}")
+
+    if args.check:
+        data = pd.concat([_clean(pd.read_csv(path, header=None, skiprows=1, low_memory=False, **READ_OPTIONS), args.start, args.end)
+                          for path in paths], ignore_index=True)
+        mismatches = 0
+        for column, state in (('Temperature_C', summary.temp), ('Humidity_Percent', summary.hum)):
+            expected = data[column].describe()
+            for name, value in (('count', state.count), ('mean', state.mean), ('std', state.std),
+                                ('min', state.min), ('max', state.max)):
+                if f"{value:.2f}" != f"{expected[name]:.2f}":
+                    mismatches += 1
+                    print(f"❌ {column} {name}: scan {value:.6f}, pandas {expected[name]:.6f}")
+            if f"{state.median:.2f}" != f"{data[column].median():.2f}":
+                mismatches += 1
+                print(f"❌ {column} median: scan {state.median:.6f}, pandas {data[column].median():.6f}")
+        print("✅ Matches pandas describe()/median()/std()." if not mismatches else f"❌ {mismatches} mismatches.")
+
+
+if __name__ == '__main__':
+    main()
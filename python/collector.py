@@ -0,0 +1,410 @@
+"""
+Network collector: accepts sample streams from gateway hosts (gateway.py)
+over TCP and UDP and writes them into the same log that generate_report.py
+and the history view read, so sensors no longer have to be plugged into
+the machine running main_gui.py.
+
+    python collector.py [--host 0.0.0.0] [--port 9470] [--udp-port 9470] [--backend csv]
+
+Gateways send batches of readings as length-prefixed messages (see
+gateway_protocol.py). Each batch is acknowledged once it has been accepted
+for the log (into the reorder buffer below); while the writer queue is
+full, the collector stops reading from the connection, so TCP flow control
+holds the gateway back instead of rows being dropped. UDP batches that
+arrive while the queue is full are dropped unacknowledged and re-sent by
+the gateway. Re-sent batches that were already accepted are recognised by
+their gateway session and sequence number and only acknowledged again.
+
+Devices are logged as "<gateway>:<device>". Timestamps are the gateway's.
+Each device's own readings are kept in order: one earlier than the device's
+last reading, or later than the collector's clock, is moved to that bound.
+Readings of different gateways are put in time order by a reorder buffer
+that holds each one for REORDER_SECONDS before it is logged. A reading
+older than that when it arrives (a gateway replaying what it buffered
+while the collector was unreachable) keeps its timestamp and is logged
+behind newer rows, and counted in collector_late_readings_total. In the
+CSV log the rollups and report statistics still place it by its timestamp;
+the SQLite and binary logs store it at the newest row's time, as they do
+any out-of-order row.
+
+Only one process may write the log: run the collector instead of
+sensor_daemon.py (a sensor on the collector's own host can be forwarded
+with gateway.py too). Try it on localhost with simulated gateways:
+
+    python collector.py &
+    python gateway.py --simulate 100 --rate 20
+"""
+import argparse
+import asyncio
+import heapq
+import itertools
+import signal
+import socket
+import time
+from datetime import datetime
+
+from aggregation import AGGREGATE_WINDOW, AGGREGATION_MODES, make_stage
+from alerts import ALERT_LOG, ALERT_RULES_FILE, AlertEngine, AlertLog, load_rules
+from csv_writer import AGGREGATE_HEADER, CSV_HEADER
+from gateway_protocol import (BATCH, DEVICE, HELLO, SCALE, ProtocolError, decode_batch, decode_device,
+                              decode_hello, encode_ack, read_message, split_messages)
+from ingestion import Reading
+from metrics import Histogram, Metrics, MetricsServer, register_pipeline
+from sensor_daemon import (AGGREGATION_MODE, AGGREGATION_WINDOW, DEADBAND_HEARTBEAT, DEADBAND_HUM,
+                           DEADBAND_TEMP, STORAGE_BACKEND, open_log_writer)
+from sqlite_log import STORAGE_BACKENDS, WINDOW_BACKENDS
+
+# --- Configuration ---
+COLLECTOR_HOST = '127.0.0.1'  # '0.0.0.0' to accept gateways from the network
+COLLECTOR_PORT = 9470         # TCP, and UDP unless --udp-port says otherwise
+METRICS_PORT = 9466           # Prometheus metrics (the GUI uses 9464, the daemon 9465)
+STATS_INTERVAL = 60.0         # Seconds between one-line summaries on stdout
+WRITER_QUEUE_SIZE = 100000    # Rows waiting for the log writer before connections are paused
+WRITER_BATCH_SIZE = 1000      # Many gateways write far more rows than one serial port
+BACKPRESSURE_POLL = 0.01      # Seconds between checks for room in a full writer queue
+SESSION_IDLE_SECONDS = 3600.0 # Gateway sessions silent for this long are forgotten
+REORDER_SECONDS = 2.0         # Readings are held this long so those of all gateways are logged in time order
+RELEASE_INTERVAL = 0.2        # Seconds between releases from the reorder buffer when no batch arrives
+
+
+class _Session:
+    """The batches accepted from one gateway session: all up to `floor`, and those in `above`."""
+
+    def __init__(self):
+        self.floor = 0
+        self.above = set()
+        self.last_seen = time.monotonic()
+
+    def seen(self, sequence):
+        return sequence <= self.floor or sequence in self.above
+
+    def accept(self, sequence):
+        self.last_seen = time.monotonic()
+        self.above.add(sequence)
+        while self.floor + 1 in self.above:
+            self.floor += 1
+            self.above.remove(self.floor)
+
+
+class _DatagramHandler(asyncio.DatagramProtocol):
+    def __init__(self, collector):
+        self.collector = collector
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.collector.on_datagram(data, addr, self.transport)
+
+
+class Collector:
+    """Receives gateway batches and writes them through the alerts, the aggregation stage and the log writer."""
+
+    def __init__(self, backend=STORAGE_BACKEND, alert_rules=(), aggregation=AGGREGATION_MODE,
+                 window_seconds=AGGREGATION_WINDOW, deadband=(DEADBAND_TEMP, DEADBAND_HUM),
+                 heartbeat_seconds=DEADBAND_HEARTBEAT):
+        header = AGGREGATE_HEADER if aggregation == AGGREGATE_WINDOW else CSV_HEADER
+        self.log, self.writer = open_log_writer(backend, header, WRITER_QUEUE_SIZE, WRITER_BATCH_SIZE)
+        self.alerts = AlertEngine(alert_rules)
+        self.alert_log = AlertLog(ALERT_LOG).start()
+        self.aggregator = make_stage(aggregation, window_seconds, *deadband, heartbeat_seconds)
+        self.sessions = {}  # (gateway name, session) -> _Session
+
+        self.connections = 0
+        self.connections_total = 0
+        self.batches = 0
+        self.readings = 0
+        self.duplicates = 0
+        self.protocol_errors = 0
+        self.udp_dropped = 0
+        self.late_readings = 0
+        self.backpressure_seconds = Histogram()  # Time a batch waited for room in the writer queue
+        self._device_micros = {}  # Device -> timestamp of its last reading
+        self._reorder = []        # Heap of (µs, arrival number, Reading) not yet logged
+        self._arrivals = itertools.count()
+        self._released_micros = 0  # Everything up to here has been logged
+        self._servers = []
+        self._streams = set()  # StreamWriters of the open connections
+
+    # --- Storage ---
+
+    def _has_room(self, rows):
+        # Rows in the reorder buffer count too, so releasing them can never overflow the writer queue
+        return self.writer.queue_depth + len(self._reorder) + rows <= WRITER_QUEUE_SIZE
+
+    def _session(self, name, session):
+        key = (name, session)
+        state = self.sessions.get(key)
+        if state is None:
+            state = self.sessions[key] = _Session()
+        return state
+
+    @staticmethod
+    def _records(records, devices):
+        """Decoded batch records as (µs, device name, scaled temperature, scaled humidity) tuples."""
+        named = []
+        for micros, temp, humidity, index in records:
+            device = devices.get(index)
+            if device is None:
+                raise ProtocolError(f"Batch uses undeclared device index {index}")
+            named.append((micros, device, temp, humidity))
+        return named
+
+    def store(self, records):
+        """
+        Accepts one batch from _records() (on the event loop thread): the
+        alerts see it at once, the log once it leaves the reorder buffer.
+        """
+        now = time.time_ns() // 1000
+        readings = []
+        timestamp = moment = None
+        for micros, device, temp, humidity in records:
+            micros = min(max(micros, self._device_micros.get(device, 0)), now)
+            self._device_micros[device] = micros
+            if micros != moment:
+                moment, timestamp = micros, datetime.fromtimestamp(micros / 1e6)
+            if micros < self._released_micros:
+                self.late_readings += 1
+            reading = Reading(device, timestamp, temp / SCALE, humidity / SCALE)
+            readings.append(reading)
+            heapq.heappush(self._reorder, (micros, next(self._arrivals), reading))
+        self.batches += 1
+        self.readings += len(readings)
+        events = self.alerts.evaluate(readings)
+        for event in events:
+            print(f"🚨 {event.timestamp:%Y-%m-%d %H:%M:%S} [{event.device_id}] {event.rule} {event.event} "
+                  f"({event.value:.2f}, threshold {event.threshold:g})")
+        self.alert_log.write_events(events)
+        self.release(now)
+
+    def release(self, now=None):
+        """
+        Logs, in time order, the readings older than REORDER_SECONDS before
+        `now` (µs since the epoch; None: everything in the buffer).
+        """
+        horizon = None if now is None else now - int(REORDER_SECONDS * 1e6)
+        readings = []
+        while self._reorder and (horizon is None or self._reorder[0][0] <= horizon):
+            micros, _, reading = heapq.heappop(self._reorder)
+            self._released_micros = max(self._released_micros, micros)
+            readings.append(reading)
+        if horizon is not None:
+            self._released_micros = max(self._released_micros, horizon)
+        if readings:
+            self.writer.write_readings(self.aggregator.process(readings))
+
+    # --- TCP ---
+
+    async def _handle(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Acks are tiny
+        self.connections += 1
+        self.connections_total += 1
+        self._streams.add(writer)
+        try:
+            session_id, name = decode_hello(await read_message(reader))
+            session = self._session(name, session_id)
+            devices = {}
+            while True:
+                body = await read_message(reader)
+                if body[0] == DEVICE:
+                    index, device = decode_device(body)
+                    devices[index] = f"{name}:{device}"
+                elif body[0] == BATCH:
+                    sequence, records = decode_batch(body)
+                    if session.seen(sequence):
+                        self.duplicates += 1
+                    else:
+                        named = self._records(records, devices)
+                        if not self._has_room(len(named)):
+                            # Stop reading this connection until the writer catches up
+                            started = time.perf_counter()
+                            while not self._has_room(len(named)):
+                                await asyncio.sleep(BACKPRESSURE_POLL)
+                            self.backpressure_seconds.observe(time.perf_counter() - started)
+                        self.store(named)
+                        session.accept(sequence)
+                    writer.write(encode_ack(sequence))
+                    await writer.drain()
+                else:
+                    raise ProtocolError(f"Unexpected message type {body[0]}")
+        except asyncio.IncompleteReadError:
+            pass  # The gateway closed the connection
+        except (ProtocolError, UnicodeDecodeError) as e:
+            self.protocol_errors += 1
+            print(f"⚠️ Closing connection from {peer}: {e}")
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            self._streams.discard(writer)
+            writer.close()
+
+    # --- UDP ---
+
+    def on_datagram(self, data, addr, transport):
+        """One datagram: a HELLO, the DEVICEs it uses and one or more BATCHes."""
+        try:
+            bodies = split_messages(data)
+            if not bodies or bodies[0][0] != HELLO:
+                raise ProtocolError("Datagram does not start with a HELLO")
+            session_id, name = decode_hello(bodies[0])
+            session = self._session(name, session_id)
+            devices = {}
+            for body in bodies[1:]:
+                if body[0] == DEVICE:
+                    index, device = decode_device(body)
+                    devices[index] = f"{name}:{device}"
+                    continue
+                if body[0] != BATCH:
+                    raise ProtocolError(f"Unexpected message type {body[0]}")
+                sequence, records = decode_batch(body)
+                if session.seen(sequence):
+                    self.duplicates += 1
+                else:
+                    named = self._records(records, devices)
+                    if not self._has_room(len(named)):
+                        self.udp_dropped += 1  # Not acknowledged, so the gateway sends it again
+                        continue
+                    self.store(named)
+                    session.accept(sequence)
+                transport.sendto(encode_ack(sequence), addr)
+        except (ProtocolError, UnicodeDecodeError) as e:
+            self.protocol_errors += 1
+            print(f"⚠️ Bad datagram from {addr}: {e}")
+
+    # --- Service ---
+
+    async def serve(self, host=COLLECTOR_HOST, port=COLLECTOR_PORT, udp_port=None):
+        """Starts listening for gateways; returns once the sockets are bound (`udp_port=0`: the TCP port)."""
+        loop = asyncio.get_running_loop()
+        server = await asyncio.start_server(self._handle, host, port, backlog=1024)
+        self._servers.append(server)
+        self.port = server.sockets[0].getsockname()[1]
+        self.udp_port = None
+        if udp_port is not None:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: _DatagramHandler(self), local_addr=(host, udp_port or self.port))
+            self._servers.append(transport)
+            self.udp_port = transport.get_extra_info('sockname')[1]
+
+    def report(self):
+        line = (f"📈 {self.connections} gateways connected ({self.connections_total} total), "
+                f"{self.readings} readings in {self.batches} batches, {self.duplicates} duplicate batches, "
+                f"{self.writer.rows_written} rows written")
+        if self.late_readings:
+            line += f", {self.late_readings} late readings"
+        if self.udp_dropped or self.protocol_errors:
+            line += f", {self.udp_dropped} UDP batches dropped, {self.protocol_errors} protocol errors"
+        if self.backpressure_seconds.count:
+            line += f", {self.backpressure_seconds.count} batches waited for the writer"
+        print(line)
+
+    async def run(self, stop):
+        """
+        Releases the reorder buffer, reports every STATS_INTERVAL and forgets
+        idle sessions until `stop` (an asyncio.Event) is set, then stops
+        listening.
+        """
+        last_report = time.monotonic()
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), RELEASE_INTERVAL)
+            except asyncio.TimeoutError:
+                self.release(time.time_ns() // 1000)
+            if time.monotonic() - last_report >= STATS_INTERVAL:
+                last_report = time.monotonic()
+                self.report()
+                idle = last_report - SESSION_IDLE_SECONDS
+                for key in [key for key, state in self.sessions.items() if state.last_seen < idle]:
+                    del self.sessions[key]
+        for server in self._servers:
+            server.close()
+        # Closing the connections ends their handlers; gateways re-send what was not acknowledged
+        for writer in list(self._streams):
+            writer.close()
+        deadline = time.monotonic() + 2.0
+        while self.connections and time.monotonic() < deadline:
+            await asyncio.sleep(BACKPRESSURE_POLL)
+
+    def close(self):
+        """Logs what the reorder buffer and the aggregation stage still hold and closes the writers."""
+        self.release()
+        self.writer.write_readings(self.aggregator.flush())
+        self.writer.close()
+        self.alert_log.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--host', default=COLLECTOR_HOST, help="Address to listen on")
+    ap.add_argument('--port', type=int, default=COLLECTOR_PORT, help="TCP port (0 picks a free one)")
+    ap.add_argument('--udp-port', type=int, help="UDP port (default: the TCP port)")
+    ap.add_argument('--no-udp', action='store_true', help="Accept TCP gateways only")
+    ap.add_argument('--backend', choices=STORAGE_BACKENDS, default=STORAGE_BACKEND, help="Log storage to write")
+    ap.add_argument('--rules', default=ALERT_RULES_FILE, help="Alert rules (JSON)")
+    ap.add_argument('--aggregate', choices=AGGREGATION_MODES, default=AGGREGATION_MODE,
+                    help="Log every reading, one record per window, or only changed readings")
+    ap.add_argument('--window', type=float, default=AGGREGATION_WINDOW, help="Seconds per window record")
+    ap.add_argument('--metrics-port', type=int, default=METRICS_PORT,
+                    help="Port of the local Prometheus metrics endpoint (0 picks a free port)")
+    ap.add_argument('--no-metrics', action='store_true', help="Do not serve metrics over HTTP")
+    args = ap.parse_args()
+    if args.aggregate == AGGREGATE_WINDOW and args.backend not in WINDOW_BACKENDS:
+        ap.error(f"--aggregate window needs --backend {'/'.join(WINDOW_BACKENDS)}")
+
+    try:
+        rules = load_rules(args.rules)
+    except (OSError, ValueError, TypeError) as e:
+        print(f"❌ Error: could not load alert rules from {args.rules}: {e}")
+        return
+    collector = Collector(args.backend, rules, args.aggregate, args.window)
+
+    metrics = Metrics()
+    register_pipeline(metrics, None, writer=lambda: collector.writer, alerts=lambda: collector.alerts,
+                      aggregator=lambda: collector.aggregator)
+    metrics.gauge('collector_connections', "Gateways connected over TCP", lambda: collector.connections)
+    metrics.counter('collector_batches_total', "Batches accepted from gateways", lambda: collector.batches)
+    metrics.counter('collector_readings_total', "Readings accepted from gateways", lambda: collector.readings)
+    metrics.counter('collector_duplicate_batches_total', "Re-sent batches that had already been accepted",
+                    lambda: collector.duplicates)
+    metrics.counter('collector_late_readings_total', "Readings older than the reorder buffer when they arrived",
+                    lambda: collector.late_readings)
+    metrics.counter('collector_protocol_errors_total', "Malformed messages", lambda: collector.protocol_errors)
+    metrics.counter('collector_udp_dropped_total', "UDP batches dropped while the writer queue was full",
+                    lambda: collector.udp_dropped)
+    metrics.histogram('collector_backpressure_seconds', "Time a batch waited for room in the writer queue",
+                      lambda: collector.backpressure_seconds)
+    metrics_server = None
+    if not args.no_metrics:
+        try:
+            metrics_server = MetricsServer(metrics, port=args.metrics_port).start()
+        except OSError as e:
+            print(f"Warning: metrics endpoint not started on port {args.metrics_port}: {e}")
+
+    async def serve():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        await collector.serve(args.host, args.port, None if args.no_udp else (args.udp_port or 0))
+        udp = f" and UDP port {collector.udp_port}" if collector.udp_port else ""
+        # flush=True: scripts starting the collector wait for this line
+        print(f"✅ Collecting from gateways on {args.host} TCP port {collector.port}{udp}", flush=True)
+        if metrics_server:
+            print(f"📊 Metrics on http://{metrics_server.host}:{metrics_server.port}/metrics")
+        await collector.run(stop)
+
+    try:
+        asyncio.run(serve())
+    finally:
+        collector.close()
+        collector.report()
+        if metrics_server:
+            metrics_server.stop()
+    print("✅ Collector stopped.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+import csv
+import io
+import os
+import queue
+import threading
+import time
+
+from metrics import Histogram
+
+# --- fsync policies ---
+FSYNC_NONE = 'none'          # Leave durability to the OS page cache
+FSYNC_PER_BATCH = 'batch'    # fsync after every batch that is written
+FSYNC_PER_INTERVAL = 'interval'  # fsync at most once every `fsync_interval` seconds
+FSYNC_POLICIES = (FSYNC_NONE, FSYNC_PER_BATCH, FSYNC_PER_INTERVAL)
+
+CSV_HEADER = ['Timestamp', 'Temperature_C', 'Humidity_Percent', 'Device']
+# Logs of window records (aggregation.py) also keep each window's extremes and sample count
+AGGREGATE_HEADER = CSV_HEADER + ['Temperature_Min', 'Temperature_Max', 'Humidity_Min', 'Humidity_Max', 'Samples']
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class _Control:
+    """A flush or stop request sent through the row queue."""
+    def __init__(self, stop=False):
+        self.stop = stop
+        self.done = threading.Event()
+
+
+class CsvBatchWriter:
+    """
+    Appends rows to a CSV file from a dedicated background thread.
+
+    Producers call `write()`, which only puts the row on a bounded queue and
+    never touches the disk. The writer thread keeps the file open and writes
+    rows in batches, either when `batch_size` rows are waiting or when
+    `flush_interval` seconds have passed since the last write.
+
+    When appending to an existing file whose header has fewer columns (logs
+    written before the Device column existed), rows are trimmed to match it.
+
+    Each listener is called on the writer thread as
+    `listener(rows, offsets, end_offset)` after a batch has reached the file,
+    where `offsets` holds the byte offset at which each row starts and
+    `end_offset` is the file size after the batch. This is how sidecar
+    indexes are kept current.
+    """
+
+    def __init__(self, path, header=CSV_HEADER, max_queue=10000, batch_size=50,
+                 flush_interval=1.0, fsync_policy=FSYNC_NONE, fsync_interval=5.0, listeners=()):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync_policy}'. Use one of {FSYNC_POLICIES}.")
+        self.path = path
+        self.header = header
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.listeners = list(listeners)
+
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.batches_written = 0
+        self.batch_seconds = Histogram()  # Write (and fsync/commit) time of each non-empty batch
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._file = None
+        self._line_buffer = io.StringIO()
+        self._line_writer = csv.writer(self._line_buffer)
+        self._columns = len(header)
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
+        self._thread = None
+        self._closed = False
+        self._stopping = threading.Event()  # Set by close() when the stop request could not be queued
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="CsvBatchWriter", daemon=True)
+            self._thread.start()
+        return self
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def write(self, row):
+        """Queues a row for writing. Never blocks; returns False if the row was dropped."""
+        if self._closed:
+            self.rows_dropped += 1
+            return False
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.rows_dropped += 1
+            return False
+
+    def write_readings(self, readings):
+        """
+        Queues ingestion Readings (or aggregation.WindowRecords, which add the
+        AGGREGATE_HEADER columns) as CSV rows. Returns False if any of them
+        was dropped.
+        """
+        queued = True
+        for reading in readings:
+            row = (reading.timestamp.strftime(TIMESTAMP_FORMAT), f"{reading.temp:.2f}",
+                   f"{reading.humidity:.2f}", reading.device_id)
+            if len(reading) > len(CSV_HEADER):
+                row += (f"{reading.temp_min:.2f}", f"{reading.temp_max:.2f}",
+                        f"{reading.hum_min:.2f}", f"{reading.hum_max:.2f}", reading.count)
+            queued &= self.write(row)
+        return queued
+
+    def flush(self, timeout=5.0):
+        """Blocks until every row queued before this call has been written to the file."""
+        if self._thread is None or not self._thread.is_alive():
+            return False
+        request = _Control()
+        try:
+            self._queue.put(request, timeout=timeout)
+        except queue.Full:
+            return False
+        return request.done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Writes out all pending rows, syncs the file and stops the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None and self._thread.is_alive():
+            try:
+                self._queue.put(_Control(stop=True), timeout=timeout)
+            except queue.Full:
+                # Nothing new can be queued now, so the writer stops once it has drained the backlog
+                self._stopping.set()
+            self._thread.join(timeout)
+
+    # --- Writer thread ---
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.isfile(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, 'r', newline='') as existing:
+                self._columns = len(next(csv.reader(existing), self.header))
+        # Binary append mode, so the byte offset of every row is known exactly
+        self._file = open(self.path, 'ab')
+        if self._file.tell() == 0:
+            self._columns = len(self.header)
+            self._file.write(self._encode(self.header))
+
+    def _encode(self, row):
+        self._line_buffer.seek(0)
+        self._line_buffer.truncate()
+        self._line_writer.writerow(row)
+        return self._line_buffer.getvalue().encode('utf-8')
+
+    def _write_batch(self, batch, force_sync=False):
+        if batch:
+            if self._file is None:
+                self._open()
+            rows = list(batch)
+            batch.clear()
+            offset = self._file.tell()
+            offsets, lines = [], []
+            for row in rows:
+                line = self._encode(row[:self._columns])
+                offsets.append(offset)
+                lines.append(line)
+                offset += len(line)
+            self._file.write(b''.join(lines))
+            self._file.flush()
+            self.rows_written += len(rows)
+            self.batches_written += 1
+            self._unsynced = True
+            self._notify(rows, offsets, offset)
+        self._sync_file(force_sync)
+
+    def _sync_file(self, force_sync=False):
+        """Applies the fsync policy to whatever has been written since the last sync."""
+        if self._file is None or not self._unsynced:
+            return
+        self._file.flush()
+        if self.fsync_policy == FSYNC_NONE:
+            self._unsynced = False
+            return
+
+        now = time.monotonic()
+        if force_sync or self.fsync_policy == FSYNC_PER_BATCH \
+                or (self.fsync_policy == FSYNC_PER_INTERVAL and now - self._last_fsync >= self.fsync_interval):
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+            self._unsynced = False
+
+    def _notify(self, rows, offsets, end_offset):
+        for listener in self.listeners:
+            try:
+                listener(rows, offsets, end_offset)
+            except Exception as e:
+                print(f"Error in CSV writer listener: {e}")
+
+    def _safe_write_batch(self, batch, force_sync=False):
+        started = time.perf_counter() if batch else None
+        pending, written = len(batch), self.rows_written
+        try:
+            self._write_batch(batch, force_sync)
+        except (IOError, OSError) as e:
+            print(f"Error writing to CSV: {e}")
+            batch.clear()
+            self.rows_dropped += max(0, pending - (self.rows_written - written))
+        if started is not None:
+            self.batch_seconds.observe(time.perf_counter() - started)
+
+    def _get(self, timeout):
+        """The next queued row or flush/stop request, or None after `timeout` seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _run(self):
+        batch = []
+        last_write = time.monotonic()
+        try:
+            while True:
+                timeout = max(0.0, self.flush_interval - (time.monotonic() - last_write))
+                item = self._get(timeout)
+
+                if isinstance(item, _Control):
+                    self._safe_write_batch(batch, force_sync=True)
+                    last_write = time.monotonic()
+                    item.done.set()
+                    if item.stop:
+                        break
+                    continue
+
+                if item is not None:
+                    batch.append(item)
+                if self._stopping.is_set() and self._queue.empty():
+                    self._safe_write_batch(batch, force_sync=True)
+                    break
+                if len(batch) >= self.batch_size or time.monotonic() - last_write >= self.flush_interval:
+                    self._safe_write_batch(batch)
+                    last_write = time.monotonic()
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
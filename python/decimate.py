@@ -0,0 +1,96 @@
+import numpy as np
+
+LTTB = 'lttb'
+MINMAX = 'minmax'
+MODES = (LTTB, MINMAX)
+
+
+def pixel_width(width_in, dpi):
+    """Number of horizontal pixels a figure of `width_in` inches renders to at `dpi`."""
+    return max(2, int(round(width_in * dpi)))
+
+
+def minmax_indices(y, n_buckets):
+    """
+    Splits the series into `n_buckets` equal runs of points and keeps the
+    minimum and maximum of each, which is exactly what a line drawn one
+    bucket per pixel column can show.
+    """
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+    size = -(-n // n_buckets)
+    n_buckets = -(-n // size)
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = y
+    rows = padded.reshape(n_buckets, size)
+    base = np.arange(n_buckets) * size
+    lows = base + np.nanargmin(rows, axis=1)
+    highs = base + np.nanargmax(rows, axis=1)
+    return np.unique(np.concatenate([lows, highs, [0, n - 1]]))
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: keeps the first and last points and, from
+    each of the `n_out - 2` buckets in between, the point forming the largest
+    triangle with the previously kept point and the next bucket's average.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Averages of every bucket, computed at once; the last "next bucket" is the final point
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        px, py = x[prev], y[prev]
+        areas = np.abs((px - avg_x[i + 1]) * (y[lo:hi] - py) - (px - x[lo:hi]) * (avg_y[i + 1] - py))
+        prev = lo + int(np.argmax(areas))
+        selected[i + 1] = prev
+    return selected
+
+
+def decimate(x, y, n_out, mode=LTTB, keep=None):
+    """
+    Returns sorted indices of the points to plot, at most about `n_out` of
+    them plus any forced ones. The global minimum and maximum are always
+    kept, and so is every point where the boolean mask `keep` is set (e.g.
+    alert excursions); if there are more of those than `n_out`, they are
+    themselves reduced with min/max buckets.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= n_out or n == 0:
+        return np.arange(n)
+    if mode not in MODES:
+        raise ValueError(f"Unknown decimation mode '{mode}'. Use one of {MODES}.")
+
+    if mode == MINMAX:
+        chosen = minmax_indices(y, max(1, n_out // 2))
+    else:
+        chosen = lttb_indices(x, y, n_out)
+
+    extra = [np.array([np.argmin(y), np.argmax(y)])]
+    if keep is not None:
+        forced = np.flatnonzero(np.asarray(keep))
+        if len(forced) > n_out:
+            forced = forced[minmax_indices(y[forced], max(1, n_out // 2))]
+        extra.append(forced)
+    return np.unique(np.concatenate([chosen] + extra))
+
+
+def as_float_x(timestamps):
+    """Converts a datetime column to float nanoseconds so it can be used in triangle areas."""
+    return np.asarray(timestamps, dtype='datetime64[ns]').astype(np.int64).astype(np.float64)
@@ -0,0 +1,382 @@
+"""
+Gateway: reads the sensors on this host's serial ports and streams their
+readings to a collector (collector.py) on another machine.
+
+    python gateway.py /dev/ttyUSB0 [/dev/ttyUSB1 ...] --collector 192.168.1.10:9470 [--name lab-pi] [--udp]
+
+Readings are sent in batches (every BATCH_SIZE readings or BATCH_INTERVAL
+seconds) of compact binary records, see gateway_protocol.py. At most
+MAX_IN_FLIGHT batches wait for their acknowledgement; further readings are
+buffered (up to GATEWAY_BUFFER, then the oldest are dropped) while the
+collector is slow or unreachable, and unacknowledged batches are sent again
+after a reconnect (TCP) or after RESEND_SECONDS (UDP).
+
+Simulated gateways push synthetic load from this one process, each over its
+own connection, to test a collector on localhost:
+
+    python gateway.py --simulate 1000 --devices 1 --rate 20 --seconds 60
+"""
+import argparse
+import asyncio
+import collections
+import random
+import socket
+import threading
+import time
+from datetime import datetime
+
+from gateway_protocol import (MAX_DATAGRAM_BYTES, ProtocolError, decode_ack, encode_batch, encode_device,
+                              encode_hello, read_message, split_messages)
+from ingestion import Reading, SerialIngestionEngine
+from metrics import Histogram
+from simulator import synthetic_trace
+from wire_protocol import BAUD_RATES, WIRE_FORMATS, WIRE_TEXT
+
+# --- Configuration ---
+COLLECTOR = '127.0.0.1:9470'
+WIRE_FORMAT = WIRE_TEXT     # 'text' (firmware env:uno) or 'binary' (env:uno_binary); sets the baud rate
+BATCH_SIZE = 500            # Readings per batch...
+BATCH_INTERVAL = 0.2        # ...or whatever has arrived after this many seconds
+MAX_IN_FLIGHT = 8           # Batches sent but not yet acknowledged
+GATEWAY_BUFFER = 200000     # Readings kept while the collector is unreachable (about 3 h of one 20 Hz sensor)
+UDP_BATCH_SIZE = 80         # Keeps a batch in one datagram of MAX_DATAGRAM_BYTES
+RESEND_SECONDS = 1.0        # UDP: a batch without an acknowledgement is sent again after this long
+MIN_BACKOFF = 0.5           # Seconds before reconnecting, doubled after each failure...
+MAX_BACKOFF = 30.0          # ...up to this
+STATS_INTERVAL = 10.0       # Seconds between one-line summaries on stdout
+SIM_TICK = 0.05             # Simulated sensors deliver their readings in chunks this far apart, like a serial port
+
+
+class _AckReceiver(asyncio.DatagramProtocol):
+    def __init__(self, client):
+        self.client = client
+
+    def datagram_received(self, data, addr):
+        try:
+            for body in split_messages(data):
+                self.client._acknowledge(decode_ack(body))
+        except ProtocolError as e:
+            self.client.last_error = str(e)
+
+    def error_received(self, exc):
+        self.client.last_error = str(exc)  # E.g. the collector is not running
+
+
+class GatewayClient:
+    """
+    Streams readings to a collector in acknowledged batches. `submit()`
+    readings on the event loop running `run()` (`submit_threadsafe()` from
+    other threads, such as the serial ingestion thread).
+    """
+
+    def __init__(self, name, host, port, udp=False, batch_size=BATCH_SIZE, batch_interval=BATCH_INTERVAL,
+                 max_in_flight=MAX_IN_FLIGHT, max_buffer=GATEWAY_BUFFER, ack_seconds=None):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.udp = udp
+        self.batch_size = min(batch_size, UDP_BATCH_SIZE) if udp else batch_size
+        self.batch_interval = batch_interval
+        self.max_in_flight = max_in_flight
+        self.max_buffer = max_buffer
+        self.session = random.getrandbits(64)  # Tells the collector a restarted gateway from a re-sent batch
+
+        self.buffer = collections.deque()  # Readings not yet in a batch
+        self.unacked = collections.OrderedDict()  # sequence -> [message, time last sent, readings]
+        self.connected = False
+        self.last_error = None
+        self.readings_submitted = 0
+        self.readings_acked = 0
+        self.readings_dropped = 0
+        self.batches_sent = 0
+        self.batches_resent = 0
+        self.reconnects = 0
+        self.ack_seconds = ack_seconds if ack_seconds is not None else Histogram()  # Send to acknowledgement
+
+        self._hello = encode_hello(self.session, name)
+        self._devices = {}       # device name -> index
+        self._declarations = {}  # device index -> DEVICE message
+        self._next_sequence = 1
+        self._loop = None
+        self._wakeup = None
+
+    @property
+    def in_flight(self):
+        return len(self.unacked)
+
+    def submit(self, readings):
+        """Queues a list of Readings for sending (on the event loop thread)."""
+        self.readings_submitted += len(readings)
+        self.buffer.extend(readings)
+        overflow = len(self.buffer) - self.max_buffer
+        if overflow > 0:
+            for _ in range(overflow):
+                self.buffer.popleft()
+            self.readings_dropped += overflow
+        if len(self.buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def submit_threadsafe(self, readings):
+        self._loop.call_soon_threadsafe(self.submit, readings)
+
+    async def flush(self, timeout=10.0):
+        """Waits until every submitted reading has been acknowledged. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while self.buffer or self.unacked:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    # --- Batches ---
+
+    def _take_batch(self):
+        """Encodes the next batch from the buffer and returns the bytes to send."""
+        readings = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+        records, new_devices, used = [], [], set()
+        stamp = micros = None
+        for reading in readings:
+            index = self._devices.get(reading.device_id)
+            if index is None:
+                index = self._devices[reading.device_id] = len(self._devices)
+                self._declarations[index] = encode_device(index, reading.device_id)
+                new_devices.append(self._declarations[index])
+            used.add(index)
+            # Every reading of a serial chunk shares one timestamp object
+            if reading.timestamp is not stamp:
+                stamp, micros = reading.timestamp, round(reading.timestamp.timestamp() * 1e6)
+            records.append((micros, reading.temp, reading.humidity, index))
+
+        sequence = self._next_sequence
+        self._next_sequence += 1
+        message = encode_batch(sequence, records)
+        if self.udp:
+            # Datagrams stand alone: each one says who sent it and names its devices
+            message = self._hello + b''.join(self._declarations[index] for index in sorted(used)) + message
+            if len(message) > MAX_DATAGRAM_BYTES:
+                self.last_error = f"Datagram of {len(message)} bytes may be fragmented"
+        self.unacked[sequence] = [message, self._loop.time(), len(readings)]
+        self.batches_sent += 1
+        return message if self.udp else b''.join(new_devices) + message
+
+    def _acknowledge(self, sequence):
+        entry = self.unacked.pop(sequence, None)
+        if entry is None:
+            return  # Acknowledged again after a re-send
+        self.readings_acked += entry[2]
+        self.ack_seconds.observe(self._loop.time() - entry[1])
+        self._wakeup.set()
+
+    def _batch_due(self, last_send):
+        """Seconds to wait before the next batch may be sent, or 0 if it is due now."""
+        if len(self.unacked) >= self.max_in_flight:
+            return self.batch_interval
+        if len(self.buffer) >= self.batch_size:
+            return 0
+        if not self.buffer:
+            return self.batch_interval
+        return max(0.0, self.batch_interval - (self._loop.time() - last_send))
+
+    async def _wait(self, seconds):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    # --- TCP ---
+
+    async def _send_batches(self, writer):
+        last_send = self._loop.time()
+        while True:
+            self._wakeup.clear()
+            wait = self._batch_due(last_send)
+            if wait:
+                await self._wait(wait)
+                continue
+            writer.write(self._take_batch())
+            await writer.drain()  # Blocks while the collector is not reading from this connection
+            last_send = self._loop.time()
+
+    async def _read_acks(self, reader):
+        while True:
+            self._acknowledge(decode_ack(await read_message(reader)))
+
+    async def _connect_tcp(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # A new connection starts from scratch: introduce the gateway and its devices, then re-send
+        writer.write(self._hello + b''.join(self._declarations.values()))
+        for entry in self.unacked.values():
+            writer.write(entry[0])
+            entry[1] = self._loop.time()
+            self.batches_resent += 1
+        await writer.drain()
+        return reader, writer
+
+    async def _run_tcp(self):
+        backoff = MIN_BACKOFF
+        while True:
+            try:
+                reader, writer = await self._connect_tcp()
+            except OSError as e:
+                self.last_error = str(e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+            backoff = MIN_BACKOFF
+            self.connected = True
+            tasks = [asyncio.ensure_future(self._send_batches(writer)), asyncio.ensure_future(self._read_acks(reader))]
+            try:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+            except (OSError, asyncio.IncompleteReadError, ProtocolError) as e:
+                self.last_error = str(e) or "Connection closed by the collector"
+            finally:
+                self.connected = False
+                for task in tasks:
+                    task.cancel()
+                writer.close()
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+
+    # --- UDP ---
+
+    async def _run_udp(self):
+        transport, _ = await self._loop.create_datagram_endpoint(lambda: _AckReceiver(self),
+                                                                 remote_addr=(self.host, self.port))
+        self.connected = True
+        last_send = self._loop.time()
+        try:
+            while True:
+                self._wakeup.clear()
+                now = self._loop.time()
+                for entry in self.unacked.values():
+                    if now - entry[1] >= RESEND_SECONDS:
+                        transport.sendto(entry[0])
+                        entry[1] = now
+                        self.batches_resent += 1
+                wait = self._batch_due(last_send)
+                if wait:
+                    await self._wait(min(wait, RESEND_SECONDS))
+                    continue
+                transport.sendto(self._take_batch())
+                last_send = self._loop.time()
+        finally:
+            self.connected = False
+            transport.close()
+
+    async def run(self):
+        """Sends batches until cancelled, reconnecting after errors."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        if self.udp:
+            await self._run_udp()
+        else:
+            await self._run_tcp()
+
+
+async def simulate_sensors(client, devices=1, rate=20.0, seconds=None, seed=None):
+    """Feeds `client` synthetic readings from `devices` sensors at `rate` readings/sec each."""
+    traces = [synthetic_trace(seed=None if seed is None else seed + i, failure_rate=0.0) for i in range(devices)]
+    names = [f"sim{i}" for i in range(devices)]
+    started, produced = time.monotonic(), 0
+    # Start the gateways' ticks at random points so thousands of them do not send in lockstep
+    await asyncio.sleep(random.uniform(0, SIM_TICK))
+    while seconds is None or time.monotonic() - started < seconds:
+        due = int((time.monotonic() - started) * rate) - produced
+        if due > 0:
+            now = datetime.now()
+            client.submit([Reading(name, now, *next(trace)) for name, trace in zip(names, traces) for _ in range(due)])
+            produced += due
+        await asyncio.sleep(SIM_TICK)
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def summarize(clients, elapsed):
+    submitted = sum(client.readings_submitted for client in clients)
+    acked = sum(client.readings_acked for client in clients)
+    dropped = sum(client.readings_dropped for client in clients)
+    connected = sum(client.connected for client in clients)
+    line = (f"📈 {connected}/{len(clients)} connected, {acked}/{submitted} readings acknowledged "
+            f"({acked / elapsed:.0f}/s), {sum(client.in_flight for client in clients)} batches in flight, "
+            f"{sum(len(client.buffer) for client in clients)} buffered, {dropped} dropped, "
+            f"{sum(client.reconnects for client in clients)} reconnects")
+    ack_seconds = clients[0].ack_seconds
+    if ack_seconds.count:
+        line += f", ack p50 {ack_seconds.quantile(0.5) * 1000:.0f} ms p99 {ack_seconds.quantile(0.99) * 1000:.0f} ms"
+    return line
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('ports', nargs='*', help="Serial ports to read")
+    ap.add_argument('--collector', default=COLLECTOR, help="Collector address, host:port")
+    ap.add_argument('--name', default=socket.gethostname(), help="Gateway name; devices are logged as NAME:PORT")
+    ap.add_argument('--wire-format', choices=WIRE_FORMATS, default=WIRE_FORMAT,
+                    help="Format the firmware sends; selects its baud rate")
+    ap.add_argument('--baud', type=int, help="Serial baud rate, if not the wire format's default")
+    ap.add_argument('--udp', action='store_true', help="Send datagrams instead of using a TCP connection")
+    ap.add_argument('--simulate', type=int, metavar='N', help="Run N simulated gateways instead of reading ports")
+    ap.add_argument('--devices', type=int, default=1, help="Simulated sensors per gateway")
+    ap.add_argument('--rate', type=float, default=20.0, help="Readings/sec of each simulated sensor")
+    ap.add_argument('--seconds', type=float, help="Stop the simulation after this long")
+    args = ap.parse_args()
+    if not args.ports and not args.simulate:
+        ap.error("give serial ports to read, or --simulate N")
+
+    host, port = parse_address(args.collector)
+    ack_seconds = Histogram()
+    if args.simulate:
+        clients = [GatewayClient(f"{args.name}-{i:04d}", host, port, args.udp, ack_seconds=ack_seconds)
+                   for i in range(args.simulate)]
+    else:
+        clients = [GatewayClient(args.name, host, port, args.udp, ack_seconds=ack_seconds)]
+
+    async def run():
+        senders = [asyncio.ensure_future(client.run()) for client in clients]
+        await asyncio.sleep(0)  # Lets the clients pick up the event loop
+        engine = None
+        if args.simulate:
+            sources = [asyncio.ensure_future(simulate_sensors(client, args.devices, args.rate, args.seconds, seed=i))
+                       for i, client in enumerate(clients)]
+        else:
+            engine = SerialIngestionEngine(args.ports, on_readings=clients[0].submit_threadsafe,
+                                           on_status=lambda device_id, text: print(f"[{device_id}] {text}"),
+                                           baud_rate=args.baud or BAUD_RATES[args.wire_format])
+            threading.Thread(target=engine.run, name="SerialIngestionEngine", daemon=True).start()
+            sources = [asyncio.ensure_future(asyncio.Event().wait())]  # Until Ctrl+C
+
+        started = time.monotonic()
+        try:
+            while not all(source.done() for source in sources):
+                await asyncio.wait(sources, timeout=STATS_INTERVAL)
+                print(summarize(clients, time.monotonic() - started))
+        finally:
+            if engine:
+                engine.stop()
+            for source in sources:
+                source.cancel()
+            elapsed = max(time.monotonic() - started, 1e-9)
+            flushed = all(await asyncio.gather(*(client.flush() for client in clients)))
+            for sender in senders:
+                sender.cancel()
+            print(summarize(clients, elapsed))
+            if not flushed:
+                errors = collections.Counter(client.last_error for client in clients if client.last_error)
+                print(f"❌ Not every reading was acknowledged; last errors: {dict(errors.most_common(3))}")
+
+    print(f"✅ Forwarding to {host}:{port} over {'UDP' if args.udp else 'TCP'} "
+          f"from {len(clients)} gateway(s)")
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Messages between gateways (gateway.py), which read sensors on their own
+serial ports, and the collector (collector.py), which logs for all of them.
+
+Over TCP every message is a 4-byte little-endian body length followed by
+the body; a UDP datagram holds one or more such messages, starting with a
+HELLO. The first byte of a body is its type:
+
+    HELLO   gateway -> collector, first on every connection
+            version u8, session u64, gateway name (UTF-8, rest of the body)
+    DEVICE  gateway -> collector, before the first batch that uses the device
+            index u16, device name (UTF-8, rest of the body)
+    BATCH   gateway -> collector
+            sequence u32, count u16, then `count` 14-byte records:
+            time i64 (µs since the Unix epoch), temperature i16 (0.01 °C),
+            humidity u16 (0.01 %), device index u16
+    ACK     collector -> gateway
+            sequence u32: that batch has been accepted for the log
+
+The session is chosen by the gateway when it starts, so the collector can
+recognise a batch that was re-sent after a lost acknowledgement.
+"""
+import struct
+
+VERSION = 1
+HELLO = 1
+DEVICE = 2
+BATCH = 3
+ACK = 4
+
+LENGTH = struct.Struct('<I')
+HELLO_FIELDS = struct.Struct('<BBQ')     # type, version, session
+DEVICE_FIELDS = struct.Struct('<BH')     # type, device index
+BATCH_FIELDS = struct.Struct('<BIH')     # type, sequence, record count
+ACK_FIELDS = struct.Struct('<BI')        # type, sequence
+RECORD = struct.Struct('<qhHH')          # time (µs), temperature, humidity, device index
+SCALE = 100
+MAX_MESSAGE_BYTES = 1024 * 1024
+MAX_BATCH_RECORDS = 0xFFFF
+MAX_DATAGRAM_BYTES = 1400                # Stays under a typical Ethernet MTU
+
+
+class ProtocolError(ValueError):
+    """A message that is malformed or not allowed at this point of the stream."""
+
+
+def frame(body):
+    """`body` with its length prefix."""
+    return LENGTH.pack(len(body)) + body
+
+
+def encode_hello(session, name):
+    return frame(HELLO_FIELDS.pack(HELLO, VERSION, session) + name.encode('utf-8'))
+
+
+def encode_device(index, name):
+    return frame(DEVICE_FIELDS.pack(DEVICE, index) + name.encode('utf-8'))
+
+
+def encode_batch(sequence, records):
+    """`records` are (µs since the epoch, temperature, humidity, device index) tuples."""
+    if len(records) > MAX_BATCH_RECORDS:
+        raise ValueError(f"A batch holds at most {MAX_BATCH_RECORDS} records, got {len(records)}")
+    body = [BATCH_FIELDS.pack(BATCH, sequence, len(records))]
+    body.extend(RECORD.pack(micros, round(temp * SCALE), round(humidity * SCALE), index)
+                for micros, temp, humidity, index in records)
+    return frame(b''.join(body))
+
+
+def encode_ack(sequence):
+    return frame(ACK_FIELDS.pack(ACK, sequence))
+
+
+def decode_hello(body):
+    """(session, gateway name) of a HELLO body."""
+    if len(body) < HELLO_FIELDS.size or body[0] != HELLO:
+        raise ProtocolError("Expected a HELLO message")
+    _, version, session = HELLO_FIELDS.unpack_from(body)
+    if version != VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}")
+    return session, body[HELLO_FIELDS.size:].decode('utf-8', 'replace')
+
+
+def decode_device(body):
+    """(index, device name) of a DEVICE body."""
+    if len(body) < DEVICE_FIELDS.size:
+        raise ProtocolError("Truncated DEVICE message")
+    _, index = DEVICE_FIELDS.unpack_from(body)
+    return index, body[DEVICE_FIELDS.size:].decode('utf-8', 'replace')
+
+
+def decode_batch(body):
+    """(sequence, records) of a BATCH body; records as in encode_batch, with scaled integer values."""
+    if len(body) < BATCH_FIELDS.size:
+        raise ProtocolError("Truncated BATCH message")
+    _, sequence, count = BATCH_FIELDS.unpack_from(body)
+    if len(body) != BATCH_FIELDS.size + count * RECORD.size:
+        raise ProtocolError(f"BATCH of {count} records has {len(body)} bytes")
+    return sequence, RECORD.iter_unpack(memoryview(body)[BATCH_FIELDS.size:])
+
+
+def decode_ack(body):
+    if len(body) != ACK_FIELDS.size or body[0] != ACK:
+        raise ProtocolError("Expected an ACK message")
+    return ACK_FIELDS.unpack(body)[1]
+
+
+def split_messages(data):
+    """The message bodies in `data`, e.g. one UDP datagram."""
+    bodies, position = [], 0
+    while position < len(data):
+        if len(data) - position < LENGTH.size:
+            raise ProtocolError("Truncated length prefix")
+        (length,) = LENGTH.unpack_from(data, position)
+        position += LENGTH.size
+        if length == 0 or position + length > len(data):
+            raise ProtocolError("Truncated message")
+        bodies.append(data[position:position + length])
+        position += length
+    return bodies
+
+
+async def read_message(reader):
+    """The next message body from an asyncio StreamReader (IncompleteReadError at end of stream)."""
+    (length,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+    if length == 0 or length > MAX_MESSAGE_BYTES:
+        raise ProtocolError(f"Message length {length} out of range")
+    return await reader.readexactly(length)
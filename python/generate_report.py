@@ -1,14 +1,36 @@
 import pandas as pd
-import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+import numpy as np
+from matplotlib.figure import Figure
 from fpdf import FPDF
 from fpdf.enums import XPos, YPos
-from datetime import datetime
+from datetime import datetime, timedelta
+import io
 import os
+import threading
+
+from alerts import ALERT_LOG, FIRED, read_events
+from decimate import LTTB, as_float_x, decimate, pixel_width
+from partitions import PartitionedLog
+from report_cache import ReportCache
+from rollups import TIMESTAMP_FORMAT, BucketState
+from sample_log import SAMPLE_LOG, SampleLog
+from sqlite_log import BINARY_BACKEND, SQLITE_BACKEND, SQLITE_DB, SqliteLog
 
 # --- Configuration ---
 CSV_FILE = 'data/data.csv'
+STORAGE_BACKEND = 'csv'  # 'csv' (daily CSV partitions), 'sqlite' (data/data.db) or 'binary' (data/samples.bin)
 REPORTS_DIR = 'reports/'
-GRAPH_IMG_PATH = os.path.join(REPORTS_DIR, 'temp_sensor_graph.png')
+REPORT_COLUMNS = ['Timestamp', 'Temperature_C', 'Humidity_Percent']
+MAX_PLOT_ROWS = 200000  # Above this many raw rows, the graph is drawn from rollup bucket means
+GRAPH_SIZE_IN = (10, 6)
+GRAPH_DPI = 100  # The graph is placed 190 mm wide in the PDF, so ~1000 px is all the detail it can show
+DECIMATION_MODE = LTTB  # 'lttb' or 'minmax'
+GRAPH_FORMAT = 'png'  # 'png' (raster) or 'svg' (vector, sharp at any zoom level)
+GRAPH_FORMATS = ('png', 'svg')
+ALERT_TABLE_ROWS = 50  # Alert events listed in the report; the rest are only counted
+REPORT_CACHE = True  # Reuse the statistics and graphs of earlier reports (see report_cache.py)
+SVG_METADATA = {'Creator': None, 'Date': None, 'Format': None, 'Type': None}  # FPDF ignores <metadata> with a warning
 
 # Ensure the reports directory exists
 os.makedirs(REPORTS_DIR, exist_ok=True)
@@ -30,60 +52,342 @@ class PDF(FPDF):
         self.set_font('Helvetica', 'I', 8)
         self.cell(0, 10, f'Page {self.page_no()}', align='C')
 
-def generate_report(start_date=None, end_date=None):
+def load_graph_data(log, rollups, start_key=None, end_key=None):
+    """
+    Returns the Timestamp/Temperature_C/Humidity_Percent frame to plot. Short
+    ranges are read raw from the log (a PartitionedLog, SqliteLog, SampleLog
+    or TimeIndex); long ranges use the finest rollup level whose bucket means
+    fit within MAX_PLOT_ROWS points.
+    """
+    if log.estimate_rows(start_key, end_key) <= MAX_PLOT_ROWS:
+        return load_raw_data(log, start_key, end_key)
+
+    level = rollups.finest_level(MAX_PLOT_ROWS, start_key, end_key)
+    return load_bucket_data(rollups, level, start_key, end_key)
+
+def load_raw_data(log, start_key=None, end_key=None):
+    """Every row with start_key <= timestamp <= end_key as a Timestamp/Temperature_C/Humidity_Percent frame."""
+    if hasattr(log, 'read_frame'):
+        # The SQLite and binary logs return typed columns directly, without a CSV round trip
+        return log.read_frame(start_key, end_key)
+    # Rows of window records (aggregation.py) are wider than the header line; their extra columns are ignored
+    data = pd.read_csv(io.BytesIO(log.read_range(start_key, end_key)), usecols=REPORT_COLUMNS, index_col=False)
+    data['Timestamp'] = pd.to_datetime(data['Timestamp'])
+    if start_key is not None:
+        data = data.loc[data['Timestamp'] >= pd.Timestamp(start_key)]
+    if end_key is not None:
+        data = data.loc[data['Timestamp'] <= pd.Timestamp(end_key)]
+    return data
+
+def load_bucket_data(rollups, level, start_key=None, end_key=None):
+    """Rollup buckets of one level as a frame of means plus min/max columns."""
+    columns = ['Timestamp', 'Temperature_C', 'Temperature_Min', 'Temperature_Max',
+               'Humidity_Percent', 'Humidity_Min', 'Humidity_Max']
+    data = pd.DataFrame(rollups.series(level, start_key, end_key), columns=columns)
+    data['Timestamp'] = pd.to_datetime(data['Timestamp'])
+    return data
+
+def decimate_graph_data(data, mode=DECIMATION_MODE, alert_range=None):
+    """
+    Reduces each series to about one point per pixel column of the graph.
+    The extremes and every temperature reading outside `alert_range`
+    (a (min, max) tuple) are always kept.
+    """
+    n_out = pixel_width(GRAPH_SIZE_IN[0], GRAPH_DPI)
+    if len(data) <= n_out:
+        return data, data
+    x = as_float_x(data['Timestamp'])
+    temps = data['Temperature_C'].to_numpy()
+    keep = None
+    if alert_range is not None:
+        keep = (temps < alert_range[0]) | (temps > alert_range[1])
+    temp_idx = decimate(x, temps, n_out, mode, keep=keep)
+    hum_idx = decimate(x, data['Humidity_Percent'].to_numpy(), n_out, mode)
+    return data.iloc[temp_idx], data.iloc[hum_idx]
+
+class GraphTemplate:
+    """
+    The report figure, built once and re-filled with new data for every report.
+
+    Creating the figure, axes, titles, grids and line artists costs more than
+    drawing a decimated graph, so each thread keeps one template (see
+    `graph_template()`). It uses the object-oriented Figure API rather than
+    pyplot, so no global figure state is shared between threads, and it
+    renders straight into an in-memory buffer.
+    """
+
+    def __init__(self):
+        self.fig = Figure(figsize=GRAPH_SIZE_IN, dpi=GRAPH_DPI)
+        self.ax_temp, self.ax_hum = self.fig.subplots(nrows=2, ncols=1, sharex=True)
+        self.ax_hum.xaxis_date()
+        self.temp_line, = self.ax_temp.plot([], [], color='tab:red', label='Temperature')
+        self.hum_line, = self.ax_hum.plot([], [], color='tab:blue', label='Humidity')
+        self.ax_temp.set_ylabel('Temperature (°C)'); self.ax_temp.set_title('Temperature History')
+        self.ax_hum.set_ylabel('Humidity (%)'); self.ax_hum.set_xlabel('Timestamp'); self.ax_hum.set_title('Humidity History')
+        for ax in (self.ax_temp, self.ax_hum):
+            ax.grid(True, ls='--', alpha=0.6)
+        self.ax_hum.tick_params(axis='x', labelrotation=30)
+        # Fixed margins instead of tight_layout(), which would need an extra draw per report
+        self.fig.subplots_adjust(left=0.08, right=0.98, top=0.95, bottom=0.15, hspace=0.25)
+        self.extras = []  # Per-report artists (bands, legends) removed before the next report
+
+    def render(self, temp_data, hum_data, bands=None, band_label=None, fmt=GRAPH_FORMAT):
+        """Draws the series (and optional min/max `bands`) and returns the image as a BytesIO."""
+        for artist in self.extras:
+            artist.remove()
+        self.extras = []
+
+        series = ((self.ax_temp, self.temp_line, temp_data, 'Temperature_C', 'Temperature', 'tab:red'),
+                  (self.ax_hum, self.hum_line, hum_data, 'Humidity_Percent', 'Humidity', 'tab:blue'))
+        for ax, line, data, column, name, color in series:
+            line.set_data(data['Timestamp'].to_numpy(), data[column].to_numpy())
+            ax.relim()
+            if bands is not None:
+                lows, highs = bands[f'{name}_Min'].to_numpy(), bands[f'{name}_Max'].to_numpy()
+                x = bands['Timestamp'].to_numpy()
+                self.extras.append(ax.fill_between(x, lows, highs, color=color, alpha=0.2, lw=0,
+                                                   label=f'Min/Max per {band_label}'))
+                # relim() does not look at fill_between collections
+                x_num = mdates.date2num(x)
+                ax.update_datalim(np.column_stack([np.concatenate([x_num, x_num]), np.concatenate([lows, highs])]))
+                self.extras.append(ax.legend(loc='upper right', fontsize=8))
+            ax.autoscale_view()
+        for label in self.ax_hum.get_xticklabels():
+            label.set_horizontalalignment('right')
+
+        buffer = io.BytesIO()
+        self.fig.savefig(buffer, format=fmt, metadata=SVG_METADATA if fmt == 'svg' else None)
+        buffer.seek(0)
+        return buffer
+
+_templates = threading.local()
+
+def graph_template():
+    """This thread's GraphTemplate, created on first use."""
+    template = getattr(_templates, 'graph', None)
+    if template is None:
+        template = _templates.graph = GraphTemplate()
+    return template
+
+def previous_second(key):
+    return (datetime.strptime(key, TIMESTAMP_FORMAT) - timedelta(seconds=1)).strftime(TIMESTAMP_FORMAT)
+
+def data_version(summary):
+    """
+    What the rollups hold for a range, as part of its cache key: it changes
+    when rows land in the range after it was cached.
+    """
+    return (summary.count, summary.first, summary.last,
+            summary.temp.min, summary.temp.max, summary.hum.min, summary.hum.max)
+
+def live_summary(rollups, start_key, end_key, last_key, prefix=None):
+    """
+    Statistics for a range that reaches the newest second of the log.
+
+    Rows older than `last_key` can no longer change, so a `prefix` entry
+    from an earlier report already summarises [start_key, prefix_end) and
+    only later rows are summarised now. Returns (summary, settled), where
+    `settled` covers the range up to `last_key` for the next prefix.
+    """
+    prefix_end = prefix['prefix_end'] if prefix else start_key
+    settled = BucketState()
+    if prefix:
+        settled.merge(prefix['summary'])
+    settled.merge(rollups.stats(prefix_end, previous_second(last_key)))
+    tail_start = last_key if prefix_end is None else max(prefix_end, last_key)
+    summary = BucketState().merge(settled).merge(rollups.stats(tail_start, end_key))
+    return summary, settled
+
+def live_graph_data(log, rollups, start_key, end_key, last_key, prefix=None):
+    """
+    Graph data for a range that reaches the newest second of the log: the
+    cached raw rows of `prefix` plus the rows logged since. Returns
+    (data, settled rows before `last_key`, or None when the range is
+    plotted from rollup buckets).
+    """
+    if log.estimate_rows(start_key, end_key) > MAX_PLOT_ROWS:
+        return load_graph_data(log, rollups, start_key, end_key), None
+    cached = prefix['frame'] if prefix else None
+    if cached is not None:
+        data = pd.concat([cached, load_raw_data(log, prefix['prefix_end'], end_key)], ignore_index=True)
+    else:
+        data = load_raw_data(log, start_key, end_key)
+    return data, data.loc[data['Timestamp'] < pd.Timestamp(last_key)]
+
+def render_graph(data, rollups, start_key, end_key, decimation, alert_range, show_bands, graph_format):
+    """Decimates and draws `data`, with optional min/max bands, and returns the image bytes."""
+    if graph_format not in GRAPH_FORMATS:
+        raise ValueError(f"Unknown graph format '{graph_format}'. Use one of {GRAPH_FORMATS}.")
+    temp_data, hum_data = decimate_graph_data(data, decimation, alert_range)
+    print(f"✅ Graph data reduced from {len(data)} to {len(temp_data)}/{len(hum_data)} points.")
+
+    bands = band_level = None
+    if show_bands:
+        band_level = rollups.finest_level(pixel_width(GRAPH_SIZE_IN[0], GRAPH_DPI), start_key, end_key)
+        bands = load_bucket_data(rollups, band_level, start_key, end_key)
+    graph_image = graph_template().render(temp_data, hum_data, bands, band_level, graph_format)
+    print(f"✅ Graph rendered in memory ({graph_format}, {len(graph_image.getbuffer())} bytes).")
+    return graph_image.getvalue()
+
+def default_report_path():
+    """A timestamped report path that does not overwrite an existing report."""
+    base = os.path.join(REPORTS_DIR, f"Sensor_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    path, n = base + '.pdf', 1
+    while os.path.exists(path):
+        n += 1
+        path = f"{base}_{n}.pdf"
+    return path
+
+def add_alert_events(pdf, events):
+    """Adds a per-rule summary and a table of the first ALERT_TABLE_ROWS events."""
+    pdf.set_font('Helvetica', 'B', 12)
+    pdf.cell(0, 10, 'Alert Events', 0, 1)
+    pdf.set_font('Helvetica', '', 10)
+    if not events:
+        pdf.cell(0, 8, 'No alerts were raised in this period.', 0, 1)
+        return
+
+    fired = {}
+    for timestamp, device, rule, event, value, threshold in events:
+        if event == FIRED:
+            fired[(rule, device)] = fired.get((rule, device), 0) + 1
+    for (rule, device), count in sorted(fired.items()):
+        pdf.cell(0, 6, f"{rule} on {device}: fired {count} time{'s' if count != 1 else ''}", 0, 1)
+    pdf.ln(3)
+
+    widths = (40, 45, 35, 25, 22.5, 22.5)
+    for width, title in zip(widths, ('Timestamp', 'Device', 'Rule', 'Event', 'Value', 'Threshold')):
+        pdf.cell(width, 8, title, 1, 0, 'C')
+    pdf.ln()
+    for row in events[:ALERT_TABLE_ROWS]:
+        for width, text in zip(widths, row):
+            pdf.cell(width, 7, text, 1, 0)
+        pdf.ln()
+    if len(events) > ALERT_TABLE_ROWS:
+        pdf.cell(0, 8, f"... and {len(events) - ALERT_TABLE_ROWS} more events in {ALERT_LOG}", 0, 1)
+
+def generate_report(start_date=None, end_date=None, decimation=DECIMATION_MODE, alert_range=None, show_bands=False,
+                    output_path=None, progress=None, graph_format=GRAPH_FORMAT, backend=STORAGE_BACKEND,
+                    use_cache=REPORT_CACHE):
     """
     Generates a PDF report for a specific date range with detailed statistics.
+
+    The graph is decimated with `decimation` ('lttb' or 'minmax') to the
+    figure's pixel width, keeping temperature excursions outside
+    `alert_range`. `show_bands` overlays min/max bands from rollup buckets.
+    The graph is embedded as a PNG, or as vector graphics with
+    `graph_format='svg'`; either way it never touches the disk. `backend`
+    selects the CSV partitions, the SQLite log or the binary sample log as
+    the data source.
+
+    With `use_cache`, a range that ends before the newest row is served
+    from the report cache once it has been computed, and a range reaching
+    into live data reuses the cached statistics and rows up to the newest
+    second of the previous report on the same start.
+
+    `progress(phase, fraction)` is called between phases; it may raise
+    report_jobs.ReportCancelled to stop. Returns the path of the written PDF.
     """
+    def report_progress(phase, fraction):
+        if progress is not None:
+            progress(phase, fraction)
+
     print("🚀 Starting customized report generation...")
+    report_progress("Reading data", 0.0)
 
-    # 1. Read and Filter Data
+    # 1. Locate the Requested Range
     try:
-        data = pd.read_csv(CSV_FILE)
-        if data.empty:
-            raise ValueError("The data file is empty. No report can be generated.")
-        
-        data['Timestamp'] = pd.to_datetime(data['Timestamp'])
-
+        start_key = end_key = None
         if start_date and end_date:
             # Ensure user input is timezone-naive before comparison
             start_date = pd.to_datetime(start_date).tz_localize(None)
             end_date = pd.to_datetime(end_date).tz_localize(None)
-            mask = (data['Timestamp'] >= start_date) & (data['Timestamp'] <= end_date)
-            data = data.loc[mask]
-        
-        if data.empty:
+            start_key = start_date.strftime('%Y-%m-%d %H:%M:%S')
+            end_key = end_date.strftime('%Y-%m-%d %H:%M:%S')
+
+        data_path = {SQLITE_BACKEND: SQLITE_DB, BINARY_BACKEND: SAMPLE_LOG}.get(backend, CSV_FILE)
+        if backend == BINARY_BACKEND:
+            if not os.path.isfile(SAMPLE_LOG):
+                raise FileNotFoundError(SAMPLE_LOG)
+            log = SampleLog(SAMPLE_LOG)
+        elif backend == SQLITE_BACKEND:
+            if not os.path.isfile(SQLITE_DB):
+                raise FileNotFoundError(SQLITE_DB)
+            log = SqliteLog(SQLITE_DB)
+        else:
+            # Only the daily partitions overlapping the range are opened
+            log = PartitionedLog(CSV_FILE).load()
+            if not log.partitions():
+                raise FileNotFoundError(CSV_FILE)
+        if log.row_count == 0:
+            raise ValueError("The data file is empty. No report can be generated.")
+
+        # Statistics come from per-day/hour/minute rollups; raw rows are read only at the edges
+        rollups = log.sync_rollups()
+        first_key, last_key = log.bounds()
+
+        # A range ending before the newest row is closed, but rows can still land in it (late
+        # window records, clamped collector rows, devices logging out of order), so cache entries
+        # are also keyed on what the rollups hold for the range
+        cache = ReportCache() if use_cache else None
+        source = (backend, data_path, first_key)
+        closed = end_key is not None and end_key < last_key
+        cached = prefix = None
+        if closed:
+            summary = rollups.stats(start_key, end_key)
+            content_key = ReportCache.key(source, data_version(summary), start_key, end_key, decimation,
+                                          alert_range, show_bands, graph_format, GRAPH_SIZE_IN, GRAPH_DPI,
+                                          MAX_PLOT_ROWS)
+            cached = cache.get(content_key) if cache else None
+        else:
+            prefix_key = ReportCache.key(source, start_key, MAX_PLOT_ROWS)
+            prefix = cache.get(prefix_key) if cache else None
+            if prefix is not None and (prefix['prefix_end'] > last_key or data_version(prefix['summary']) !=
+                                       data_version(rollups.stats(start_key, previous_second(prefix['prefix_end'])))):
+                prefix = None  # The log was rewritten, or rows have landed in the cached part since
+            summary, settled = live_summary(rollups, start_key, end_key, last_key, prefix)
+        if summary.count == 0:
             raise ValueError("No data found in the selected date range.")
 
     except FileNotFoundError:
-        raise FileNotFoundError(f"The data file '{CSV_FILE}' was not found.")
+        raise FileNotFoundError(f"The data file '{data_path}' was not found.")
     except Exception as e:
         print(f"❌ Error reading or filtering data: {e}")
         raise e
 
     print("✅ Data filtered successfully.")
+    report_progress("Calculating statistics", 0.3)
 
     # 2. Calculate Detailed Statistics
-    temp_stats = data['Temperature_C'].describe()
-    hum_stats = data['Humidity_Percent'].describe()
-    temp_median = data['Temperature_C'].median()
-    hum_median = data['Humidity_Percent'].median()
-    temp_std = data['Temperature_C'].std()
-    hum_std = data['Humidity_Percent'].std()
-
-    start_time_str = data['Timestamp'].min().strftime('%Y-%m-%d %H:%M:%S')
-    end_time_str = data['Timestamp'].max().strftime('%Y-%m-%d %H:%M:%S')
+    temp_stats, hum_stats = summary.temp, summary.hum
+    start_time_str = summary.first
+    end_time_str = summary.last
     
     print("✅ Detailed statistics calculated.")
 
-    # 3. Generate and Save Graph
-    fig, (ax1, ax2) = plt.subplots(nrows=2, ncols=1, sharex=True, figsize=(10, 6))
-    ax1.plot(data['Timestamp'], data['Temperature_C'], color='tab:red', label='Temperature')
-    ax1.set_ylabel('Temperature (°C)'); ax1.set_title('Temperature History'); ax1.grid(True, ls='--', alpha=0.6)
-    ax2.plot(data['Timestamp'], data['Humidity_Percent'], color='tab:blue', label='Humidity')
-    ax2.set_ylabel('Humidity (%)'); ax2.set_xlabel('Timestamp'); ax2.set_title('Humidity History'); ax2.grid(True, ls='--', alpha=0.6)
-    plt.xticks(rotation=30, ha='right'); fig.tight_layout()
-    plt.savefig(GRAPH_IMG_PATH); plt.close()
-    print(f"✅ Graph saved to {GRAPH_IMG_PATH}")
+    # 3. Generate Graph
+    if cached is not None:
+        graph_bytes = cached['graph']
+        print("♻️ Statistics and graph served from the report cache.")
+    else:
+        report_progress("Loading graph data", 0.4)
+        if closed:
+            data = load_graph_data(log, rollups, start_key, end_key)
+        else:
+            data, settled_rows = live_graph_data(log, rollups, start_key, end_key, last_key, prefix)
+            if prefix:
+                rows = len(prefix['frame']) if prefix['frame'] is not None else 0
+                print(f"♻️ Reused the cached statistics and {rows} rows up to {prefix['prefix_end']}.")
+        report_progress("Drawing graph", 0.6)
+        graph_bytes = render_graph(data, rollups, start_key, end_key, decimation, alert_range, show_bands,
+                                   graph_format)
+        if cache is not None:
+            if closed:
+                cache.put(content_key, {'summary': summary, 'graph': graph_bytes})
+            elif prefix is None or prefix['prefix_end'] != last_key:
+                cache.put(prefix_key, {'prefix_end': last_key, 'summary': settled, 'frame': settled_rows})
+    graph_image = io.BytesIO(graph_bytes)
+    report_progress("Writing PDF", 0.8)
 
     # 4. Create PDF
     pdf = PDF()
@@ -108,12 +412,12 @@ def generate_report(start_date=None, end_date=None):
     pdf.cell(47.5, 8, 'Description', 1, 1, 'C')
     # Data Rows
     stats_data = [
-        ("Count", f"{temp_stats['count']:.0f}", f"{hum_stats['count']:.0f}", "Number of readings"),
-        ("Mean", f"{temp_stats['mean']:.2f}", f"{hum_stats['mean']:.2f}", "Average value"),
-        ("Median", f"{temp_median:.2f}", f"{hum_median:.2f}", "Midpoint value"),
-        ("Std Dev", f"{temp_std:.2f}", f"{hum_std:.2f}", "Data spread"),
-        ("Min", f"{temp_stats['min']:.2f}", f"{hum_stats['min']:.2f}", "Lowest value"),
-        ("Max", f"{temp_stats['max']:.2f}", f"{hum_stats['max']:.2f}", "Highest value"),
+        ("Count", f"{temp_stats.count:.0f}", f"{hum_stats.count:.0f}", "Number of readings"),
+        ("Mean", f"{temp_stats.mean:.2f}", f"{hum_stats.mean:.2f}", "Average value"),
+        ("Median", f"{temp_stats.median:.2f}", f"{hum_stats.median:.2f}", "Midpoint value"),
+        ("Std Dev", f"{temp_stats.std:.2f}", f"{hum_stats.std:.2f}", "Data spread"),
+        ("Min", f"{temp_stats.min:.2f}", f"{hum_stats.min:.2f}", "Lowest value"),
+        ("Max", f"{temp_stats.max:.2f}", f"{hum_stats.max:.2f}", "Highest value"),
     ]
     for row in stats_data:
         pdf.cell(47.5, 8, row[0], 1, 0)
@@ -125,16 +429,18 @@ def generate_report(start_date=None, end_date=None):
     # Add Graph
     pdf.set_font('Helvetica', 'B', 12)
     pdf.cell(0, 10, 'Historical Data Graph', 0, 1)
-    pdf.image(GRAPH_IMG_PATH, x=None, y=None, w=190)
+    pdf.image(graph_image, x=None, y=None, w=190)
+    pdf.ln(5)
+
+    # Alert Events Section (fired/cleared events logged by the alert engine)
+    add_alert_events(pdf, read_events(ALERT_LOG, start_key, end_key))
     
-    report_filename = f"Sensor_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    report_path = os.path.join(REPORTS_DIR, report_filename)
+    report_path = output_path or default_report_path()
     pdf.output(report_path)
     
     print(f"✅ PDF report successfully generated: {report_path}")
-
-    os.remove(GRAPH_IMG_PATH)
-    print("✅ Temporary graph file removed.")
+    report_progress("Done", 1.0)
+    return report_path
 
 if __name__ == '__main__':
     # Example of running this script directly
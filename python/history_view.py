@@ -0,0 +1,160 @@
+import collections
+import tkinter as tk
+from tkinter import ttk, messagebox
+from datetime import datetime
+
+HISTORY_COLUMNS = ('Timestamp', 'Temperature_C', 'Humidity_Percent', 'Device')
+VISIBLE_ROWS = 25     # Rows shown in the table at once
+PREFETCH_ROWS = 100   # Extra rows read above and below the visible window
+TAIL_ROWS = 500       # Live rows kept in memory for follow mode
+JUMP_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d')
+
+
+class VirtualHistoryView(ttk.Frame):
+    """
+    Log history table that only ever holds the visible rows.
+
+    The Treeview shows a fixed window of `VISIBLE_ROWS` rows. Its scrollbar
+    maps onto the whole log, and scrolling reads the rows it needs (plus a
+    small prefetch on either side) straight from the CSV through the
+    TimeIndex offset entries (`time_index` can also be a PartitionedLog,
+    which numbers rows across its partitions, or a SqliteLog, which pages
+    with indexed queries). In follow mode the table shows the newest
+    readings from a bounded in-memory tail instead, so live data appears
+    before the CSV writer has flushed it.
+    """
+
+    def __init__(self, master, time_index, flush=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.time_index = time_index
+        self.flush = flush
+        self.top = 0
+        self.cache_start = 0
+        self.cache = []
+        self.live_tail = collections.deque(maxlen=TAIL_ROWS)
+
+        # --- Toolbar: jump-to-timestamp and follow mode ---
+        toolbar = ttk.Frame(self)
+        toolbar.pack(side=tk.TOP, fill=tk.X, pady=(0, 5))
+        ttk.Label(toolbar, text="Jump to (YYYY-MM-DD HH:MM:SS):").pack(side=tk.LEFT)
+        self.jump_var = tk.StringVar()
+        jump_entry = ttk.Entry(toolbar, textvariable=self.jump_var, width=22)
+        jump_entry.pack(side=tk.LEFT, padx=5)
+        jump_entry.bind('<Return>', lambda event: self.jump_to_timestamp())
+        ttk.Button(toolbar, text="Go", command=self.jump_to_timestamp).pack(side=tk.LEFT)
+        self.follow_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(toolbar, text="Follow live data", variable=self.follow_var,
+                        command=self.on_follow_toggled).pack(side=tk.RIGHT)
+        self.position_var = tk.StringVar()
+        ttk.Label(toolbar, textvariable=self.position_var).pack(side=tk.RIGHT, padx=10)
+
+        # --- Table with a scrollbar that spans the whole log ---
+        self.tree = ttk.Treeview(self, columns=HISTORY_COLUMNS, show='headings', height=VISIBLE_ROWS)
+        for col in HISTORY_COLUMNS:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=150)
+        for _ in range(VISIBLE_ROWS):
+            self.tree.insert("", "end", values=())
+        self.row_items = self.tree.get_children()
+
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.on_scrollbar)
+        self.scrollbar.pack(side='right', fill='y')
+        self.tree.pack(fill='both', expand=True)
+
+        self.tree.bind('<MouseWheel>', self.on_mouse_wheel)
+        self.tree.bind('<Button-4>', lambda event: self.scroll_to(self.top - 3))
+        self.tree.bind('<Button-5>', lambda event: self.scroll_to(self.top + 3))
+        for key, delta in (('<Up>', -1), ('<Down>', 1), ('<Prior>', -VISIBLE_ROWS), ('<Next>', VISIBLE_ROWS)):
+            self.tree.bind(key, lambda event, d=delta: (self.scroll_to(self.top + d), 'break')[1])
+
+    # --- Data access ---
+
+    @property
+    def total_rows(self):
+        return self.time_index.row_count
+
+    def refresh(self):
+        """Re-reads the visible window, e.g. after the log has grown."""
+        if self.flush:
+            self.flush()
+        self.time_index.ensure_loaded()
+        self.cache = []
+        if self.follow_var.get():
+            self.render_tail()
+        else:
+            self.scroll_to(self.top)
+
+    def rows_for_window(self, top):
+        end = top + VISIBLE_ROWS
+        if not (self.cache_start <= top and end <= self.cache_start + len(self.cache)):
+            self.cache_start = max(0, top - PREFETCH_ROWS)
+            self.cache = self.time_index.read_rows(self.cache_start, VISIBLE_ROWS + 2 * PREFETCH_ROWS)
+        return self.cache[top - self.cache_start:end - self.cache_start]
+
+    # --- Rendering ---
+
+    def render(self, rows, first_row, total):
+        for item, row in zip(self.row_items, rows + [()] * (VISIBLE_ROWS - len(rows))):
+            self.tree.item(item, values=row)
+        if total:
+            self.scrollbar.set(first_row / total, min(1.0, (first_row + len(rows)) / total))
+            self.position_var.set(f"Rows {first_row + 1}-{first_row + len(rows)} of {total}")
+        else:
+            self.scrollbar.set(0.0, 1.0)
+            self.position_var.set("No rows")
+
+    def scroll_to(self, top):
+        if self.follow_var.get():
+            self.follow_var.set(False)
+        total = self.total_rows
+        self.top = max(0, min(top, total - VISIBLE_ROWS))
+        self.render(self.rows_for_window(self.top), self.top, total)
+
+    def render_tail(self):
+        rows = list(self.live_tail)[-VISIBLE_ROWS:]
+        if not rows:
+            # Nothing has arrived live yet: show the end of the log on disk
+            rows = self.time_index.read_rows(max(0, self.total_rows - VISIBLE_ROWS), VISIBLE_ROWS)
+        total = max(self.total_rows, len(rows))
+        self.render(rows, total - len(rows), total)
+
+    # --- Event handlers ---
+
+    def on_scrollbar(self, action, *args):
+        if action == 'moveto':
+            self.scroll_to(int(float(args[0]) * self.total_rows))
+        elif action == 'scroll':
+            amount, unit = int(args[0]), args[1]
+            step = VISIBLE_ROWS if unit == 'pages' else 1
+            self.scroll_to(self.top + amount * step)
+
+    def on_mouse_wheel(self, event):
+        self.scroll_to(self.top - int(event.delta / 120) * 3)
+
+    def on_follow_toggled(self):
+        if self.follow_var.get():
+            self.render_tail()
+        else:
+            self.refresh()
+
+    def jump_to_timestamp(self):
+        target = None
+        for fmt in JUMP_FORMATS:
+            try:
+                target = datetime.strptime(self.jump_var.get().strip(), fmt).strftime('%Y-%m-%d %H:%M:%S')
+                break
+            except ValueError:
+                continue
+        if target is None:
+            messagebox.showerror("Invalid Timestamp", "Please enter a date as YYYY-MM-DD HH:MM:SS.", parent=self)
+            return
+        if self.flush:
+            self.flush()
+        self.cache = []
+        self.scroll_to(self.time_index.find_row(target))
+
+    def add_live_rows(self, rows):
+        """Feeds newly logged rows; only redraws when follow mode is on."""
+        self.live_tail.extend(rows)
+        if self.follow_var.get():
+            self.render_tail()
@@ -0,0 +1,197 @@
+import collections
+import selectors
+import threading
+import time
+from datetime import datetime
+
+import serial
+
+from metrics import Histogram
+from wire_protocol import StreamDecoder
+
+# A single parsed sample, tagged with the port it came from
+Reading = collections.namedtuple('Reading', ['device_id', 'timestamp', 'temp', 'humidity'])
+
+# --- Per-port connection states ---
+DISCONNECTED = 'disconnected'
+SETTLING = 'settling'      # Port is open, waiting for the Arduino to finish its reset
+CONNECTED = 'connected'
+
+
+class PortState:
+    """Connection, backoff and stream-decoder state for one serial port."""
+
+    def __init__(self, port):
+        self.port = port
+        self.ser = None
+        self.state = DISCONNECTED
+        self.parser = StreamDecoder()  # Text lines or binary frames, whichever the firmware sends
+        self.next_attempt = 0.0
+        self.settle_until = 0.0
+        self.backoff = 0.0
+        self.reconnects = 0
+        self.bytes_read = 0
+
+    @property
+    def device_id(self):
+        return self.port
+
+
+class SerialIngestionEngine:
+    """
+    Reads any number of serial ports from a single loop.
+
+    Every port is opened non-blocking and polled through a selector (or by
+    checking `in_waiting` on platforms where serial handles are not
+    selectable), so a port that stops responding never delays the others.
+    Reconnects use a per-port exponential backoff instead of sleeping.
+
+    Each read drains everything waiting on a port as one chunk and hands the
+    parsed samples to `on_readings` as a single list.
+    """
+
+    def __init__(self, ports, on_readings, on_status=None, baud_rate=9600,
+                 settle_time=2.0, min_backoff=1.0, max_backoff=30.0, poll_interval=0.05):
+        self.ports = [PortState(port) for port in ports]
+        self.on_readings = on_readings
+        self.on_status = on_status
+        self.baud_rate = baud_rate
+        self.settle_time = settle_time
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+
+        self.chunk_seconds = Histogram()  # Parsing a chunk and running `on_readings` on it
+
+        self._running = threading.Event()
+        self._running.set()
+        self._selector = None
+
+    @property
+    def is_running(self):
+        return self._running.is_set()
+
+    def stop(self):
+        """Asks the loop to exit; ports are closed by the loop itself."""
+        self._running.clear()
+
+    def run(self):
+        """Runs the ingestion loop on the calling thread until `stop()` is called."""
+        self._selector = selectors.DefaultSelector()
+        try:
+            while self._running.is_set():
+                now = time.monotonic()
+                for state in self.ports:
+                    if state.state == DISCONNECTED and now >= state.next_attempt:
+                        self._connect(state)
+                    elif state.state == SETTLING and now >= state.settle_until:
+                        self._mark_connected(state)
+                self._poll(self._next_timeout())
+        finally:
+            for state in self.ports:
+                self._close(state)
+            self._selector.close()
+            self._selector = None
+
+    # --- Connection handling ---
+
+    def _status(self, state, text):
+        if self.on_status:
+            self.on_status(state.device_id, text)
+
+    def _connect(self, state):
+        self._status(state, f"Status: Connecting to {state.port}...")
+        try:
+            state.ser = serial.Serial(state.port, self.baud_rate, timeout=0)
+        except (serial.SerialException, OSError):
+            state.ser = None
+            self._schedule_reconnect(state)
+            self._status(state, f"Status: Connection to {state.port} failed! Retrying in {state.backoff:.0f}s...")
+            return
+        state.state = SETTLING
+        state.settle_until = time.monotonic() + self.settle_time
+        state.parser.reset()
+
+    def _mark_connected(self, state):
+        state.state = CONNECTED
+        state.backoff = 0.0
+        if self._selectable(state):
+            self._selector.register(state.ser, selectors.EVENT_READ, state)
+        self._status(state, "Status: Connected and Monitoring...")
+
+    def _schedule_reconnect(self, state):
+        state.state = DISCONNECTED
+        state.backoff = min(self.max_backoff, max(self.min_backoff, state.backoff * 2))
+        state.next_attempt = time.monotonic() + state.backoff
+
+    def _close(self, state):
+        if state.ser is None:
+            return
+        try:
+            self._selector.unregister(state.ser)
+        except (KeyError, ValueError):
+            pass
+        try:
+            state.ser.close()
+        except (serial.SerialException, OSError):
+            pass
+        state.ser = None
+        print(f"Serial port {state.port} closed.")
+
+    def _connection_lost(self, state):
+        self._close(state)
+        state.reconnects += 1
+        self._schedule_reconnect(state)
+        self._status(state, f"Status: Connection to {state.port} lost! Reconnecting...")
+        print(f"Serial connection lost during read on {state.port}.")
+
+    # --- Reading ---
+
+    @staticmethod
+    def _selectable(state):
+        try:
+            state.ser.fileno()
+            return True
+        except (AttributeError, OSError, ValueError):
+            return False
+
+    def _next_timeout(self):
+        """Sleeps no longer than the nearest reconnect or settle deadline."""
+        now = time.monotonic()
+        timeout = self.poll_interval if any(
+            s.state == CONNECTED and not self._selectable(s) for s in self.ports) else 1.0
+        for state in self.ports:
+            if state.state == DISCONNECTED:
+                timeout = min(timeout, state.next_attempt - now)
+            elif state.state == SETTLING:
+                timeout = min(timeout, state.settle_until - now)
+        return max(0.0, timeout)
+
+    def _poll(self, timeout):
+        if self._selector.get_map():
+            for key, _ in self._selector.select(timeout):
+                self._read(key.data)
+        else:
+            time.sleep(timeout)
+        for state in self.ports:
+            if state.state == CONNECTED and not self._selectable(state):
+                self._read(state)
+
+    def _read(self, state):
+        try:
+            chunk = state.ser.read(max(1, state.ser.in_waiting))
+        except (serial.SerialException, OSError):
+            self._connection_lost(state)
+            return
+        if not chunk:
+            return
+        state.bytes_read += len(chunk)
+
+        with self.chunk_seconds.time():
+            batch = state.parser.feed(chunk)
+            if batch:
+                timestamp = datetime.now()
+                try:
+                    self.on_readings([Reading(state.device_id, timestamp, temp, humidity) for temp, humidity in batch])
+                except Exception as e:
+                    print(f"An unexpected error occurred while reading {state.port}: {e}")
@@ -1,109 +1,198 @@
+"""
+Live plot of the most recent sensor readings.
+
+    python live_monitor.py [PORT]     # read the Arduino on PORT (default /dev/ttyUSB1) and log it
+    python live_monitor.py --follow   # attach to the log another process (e.g. main_gui.py) is writing
+    python live_monitor.py --bus      # attach to the shared-memory sample bus of sensor_daemon.py
+
+Add --binary to log to (or follow) the binary sample log data/samples.bin
+instead of the CSV partitions; following it reads the newest records
+straight from the memory-mapped file.
+
+The plot is drawn from a fixed-size ring buffer of recent samples, fed
+straight from the serial reads or, with --follow, by tailing the log from
+the last byte read, so each frame costs the same however long the log is.
+With --bus the newest samples are read from memory, without touching disk.
+"""
+import argparse
+import collections
 import serial
 import csv
 import time
-import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 from matplotlib.ticker import MultipleLocator
 from datetime import datetime
-import re
 import os
 
+from partitions import LogTail, PartitionedLog
+from sample_bus import SampleBus
+from wire_protocol import BAUD_RATES, WIRE_FORMATS, WIRE_TEXT, StreamDecoder
+
 # --- Configuration ---
 SERIAL_PORT = '/dev/ttyUSB1'
-BAUD_RATE = 9600
+WIRE_FORMAT = WIRE_TEXT  # 'text' (firmware env:uno) or 'binary' (env:uno_binary); sets the baud rate
 # Save the CSV file inside the 'data' subfolder
 CSV_FILE = 'data/data.csv' 
+MAX_POINTS = 30 # Samples kept in the ring buffer and shown on the plot
+
+ap = argparse.ArgumentParser(description="Live plot of the most recent sensor readings.")
+ap.add_argument('port', nargs='?', default=SERIAL_PORT, help="Serial port, e.g. a pty from simulator.py")
+ap.add_argument('--follow', action='store_true', help="Tail the log written by another process instead")
+ap.add_argument('--bus', action='store_true', help="Read the sample bus published by sensor_daemon.py instead")
+ap.add_argument('--wire-format', choices=WIRE_FORMATS, default=WIRE_FORMAT,
+                help="Format the firmware sends; selects its baud rate")
+ap.add_argument('--baud', type=int, help="Serial baud rate, if not the wire format's default")
+ap.add_argument('--binary', action='store_true', help="Use the binary sample log (see sample_log.py) instead of CSV")
+args = ap.parse_args()
 
 # --- Setup Data Directory ---
 # Ensure the 'data' directory exists
 os.makedirs(os.path.dirname(CSV_FILE), exist_ok=True)
 
+# --- Recent Samples ---
+# (timestamp, temperature, humidity) of the newest readings; older ones fall off the front
+recent = collections.deque(maxlen=MAX_POINTS)
+
 # --- Setup Serial Connection ---
-try:
-    ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=2)
-    time.sleep(2) # Wait for Arduino to reset
-    print("✅ Connected to Arduino on", SERIAL_PORT)
-except serial.SerialException as e:
-    print(f"❌ Error: Could not open serial port {SERIAL_PORT}. Please check the connection and port name.")
-    print(e)
-    exit()
-
-# --- Setup CSV File ---
-# Open in 'a' (append) mode and check if the file is empty to write the header
-try:
-    # Check if file exists and is not empty
-    is_file_empty = os.path.getsize(CSV_FILE) == 0
-except FileNotFoundError:
-    is_file_empty = True
-
-if is_file_empty:
-    with open(CSV_FILE, 'w', newline='') as file:
+ser = None
+if not (args.follow or args.bus):
+    try:
+        ser = serial.Serial(args.port, args.baud or BAUD_RATES[args.wire_format], timeout=2)
+        time.sleep(2) # Wait for Arduino to reset
+        print("✅ Connected to Arduino on", args.port)
+    except serial.SerialException as e:
+        print(f"❌ Error: Could not open serial port {args.port}. Please check the connection and port name.")
+        print(e)
+        exit()
+
+# --- Setup CSV Partitions ---
+# Rows go into one file per day (data/data_YYYYMMDD_HHMMSS.csv); finished days are gzipped
+log = PartitionedLog(CSV_FILE)
+current_path = None
+
+# --- Or the Binary Sample Log ---
+sample_log = sample_writer = None
+if args.binary:
+    from sample_log import SAMPLE_LOG, SampleLog, SampleLogWriter, datetime_ns
+    sample_log = SampleLog(SAMPLE_LOG)
+    if ser is not None:
+        sample_writer = SampleLogWriter(sample_log).start()
+
+def log_rows(timestamp, readings):
+    """Appends readings to the partition for `timestamp`, starting a new one when the day changes."""
+    global current_path
+    path = log.writable_path(timestamp)
+    if current_path is not None and path != current_path:
+        log.compress_in_background([current_path])
+    is_file_empty = not os.path.isfile(path) or os.path.getsize(path) == 0
+    with open(path, 'a', newline='') as file:
         writer = csv.writer(file)
-        # Write header for separate temperature and humidity columns
-        writer.writerow(['Timestamp', 'Temperature_C', 'Humidity_Percent'])
-    print(f"✅ Created and initialized {CSV_FILE}")
-
-print(f"✅ Logging data to {CSV_FILE}")
+        if is_file_empty:
+            # Write header for separate temperature and humidity columns
+            writer.writerow(['Timestamp', 'Temperature_C', 'Humidity_Percent'])
+            print(f"✅ Created and initialized {path}")
+        writer.writerows([timestamp, temp, humidity] for temp, humidity in readings)
+    current_path = path
+
+tail = None
+bus = None
+if args.bus:
+    try:
+        bus = SampleBus.attach()
+    except FileNotFoundError:
+        print("❌ Error: No sample bus found. Start sensor_daemon.py first.")
+        exit()
+    print(f"✅ Attached to sample bus '{bus.name}' ({bus.capacity} samples)")
+elif args.follow and sample_log is not None:
+    print(f"✅ Following {SAMPLE_LOG}")
+elif args.follow:
+    tail = LogTail(log)
+    print(f"✅ Following the log in {os.path.dirname(CSV_FILE)}/")
+elif sample_writer is not None:
+    print(f"✅ Logging data to {SAMPLE_LOG}")
+else:
+    print(f"✅ Logging data to {os.path.dirname(CSV_FILE)}/ (one file per day)")
 
 
 # --- Live Visualization ---
-def parse_data(line):
-    """Parses Temperature and Humidity from the serial line using regex."""
-    try:
-        temp_match = re.search(r"Temperature: ([\d\.]+)", line)
-        hum_match = re.search(r"Humidity: ([\d\.]+)", line)
-        
-        temp = float(temp_match.group(1)) if temp_match else None
-        humidity = float(hum_match.group(1)) if hum_match else None
-        
-        return temp, humidity
-    except (AttributeError, ValueError):
-        return None, None
+# Splits whatever is waiting in the serial buffer into lines (or binary frames) and parses them in one pass
+parser = StreamDecoder()
 
-def animate(i):
-    """Reads serial, logs data, and updates the plot."""
-    # 1. Read from Arduino
+def read_serial():
+    """Reads, logs and buffers everything the Arduino has sent since the last frame."""
     if ser.in_waiting > 0:
         try:
-            line = ser.readline().decode('utf-8').strip()
-            print(f"Received: {line}")
-
-            # 2. Parse Data
-            temp, humidity = parse_data(line)
-
-            if temp is not None and humidity is not None:
-                # 3. Log to CSV
-                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                with open(CSV_FILE, 'a', newline='') as file:
-                    writer = csv.writer(file)
-                    writer.writerow([timestamp, temp, humidity])
+            chunk = ser.read(ser.in_waiting)
+
+            # Parse Data
+            readings = parser.feed(chunk)
+            print(f"Received {len(readings)} readings ({parser.failed_reads} failed sensor reads so far)")
+
+            if readings:
+                now = datetime.now()
+                recent.extend((now, temp, humidity) for temp, humidity in readings)
+                # Log to CSV (or the sample log, without formatting anything)
+                if sample_writer is not None:
+                    timestamp = datetime_ns(now)
+                    for temp, humidity in readings:
+                        sample_writer.write((timestamp, temp, humidity, args.port))
+                else:
+                    log_rows(now.strftime("%Y-%m-%d %H:%M:%S"), readings)
         except Exception as e:
             print(f"Error reading or logging serial data: {e}")
-    
-    # 4. Update Plot
-    try:
-        data = pd.read_csv(CSV_FILE)
-        if data.empty:
-            return # Don't plot if the file is empty
 
-        data['Timestamp'] = pd.to_datetime(data['Timestamp'])
-        
-        # Limit to the last 30 data points for a clean view
-        data = data.tail(30)
+def read_tail():
+    """Buffers the rows appended to the log since the last frame."""
+    for row in tail.poll():
+        try:
+            recent.append((datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S"), float(row[1]), float(row[2])))
+        except (ValueError, IndexError):
+            continue
+
+def read_sample_log():
+    """Replaces the ring buffer with the newest records of the mapped sample log."""
+    records = sample_log.tail(MAX_POINTS)
+    recent.clear()
+    recent.extend(zip(records['ts'].view('datetime64[ns]').astype('datetime64[us]').tolist(),
+                      records['temp'].tolist(), records['humidity'].tolist()))
+
+def read_bus():
+    """Replaces the ring buffer with the newest samples on the bus."""
+    samples = bus.latest(MAX_POINTS)
+    recent.clear()
+    recent.extend((reading.timestamp, reading.temp, reading.humidity) for reading in bus.to_readings(samples))
+
+def animate(i):
+    """Reads new samples into the ring buffer and updates the plot."""
+    # 1. Read only what arrived since the last frame
+    if bus is not None:
+        read_bus()
+    elif args.follow and sample_log is not None:
+        read_sample_log()
+    elif tail is not None:
+        read_tail()
+    else:
+        read_serial()
+
+    # 2. Update Plot
+    try:
+        if not recent:
+            return # Nothing to plot yet
+        timestamps, temps, hums = zip(*recent)
 
         ax1.clear()
         ax2.clear()
 
         # Plot Temperature on the first subplot (ax1)
-        ax1.plot(data['Timestamp'], data['Temperature_C'], color='tab:red', marker='o', linestyle='-')
+        ax1.plot(timestamps, temps, color='tab:red', marker='o', linestyle='-')
         ax1.set_ylabel('Temperature (°C)')
         ax1.set_title('Temperature Data')
         
         # --- Set Y-axis ticks for Temperature ---
-        if not data.empty:
-            min_temp = data['Temperature_C'].min()
-            max_temp = data['Temperature_C'].max()
+        if temps:
+            min_temp = min(temps)
+            max_temp = max(temps)
             # Set Y-limits with some padding
             ax1.set_ylim(min_temp - 4, max_temp + 4)
             # Set ticks to be every 3 degrees
@@ -111,7 +200,7 @@ def animate(i):
             ax1.grid(axis='y', linestyle='--', alpha=0.7)
 
         # Plot Humidity on the second subplot (ax2)
-        ax2.plot(data['Timestamp'], data['Humidity_Percent'], color='tab:blue', marker='x', linestyle='--')
+        ax2.plot(timestamps, hums, color='tab:blue', marker='x', linestyle='--')
         ax2.set_ylabel('Humidity (%)')
         ax2.set_xlabel('Time')
         ax2.set_title('Humidity Data')
@@ -123,9 +212,6 @@ def animate(i):
         fig.suptitle('Live Sensor Monitor', fontsize=16)
         fig.tight_layout(rect=[0, 0.03, 1, 0.95])
 
-    except pd.errors.EmptyDataError:
-        # This is expected on the first run, just ignore it.
-        pass
     except Exception as e:
         print(f"Plotting Error: {e}")
 
@@ -140,5 +226,10 @@ ani = FuncAnimation(fig, animate, interval=1000, cache_frame_data=False)
 plt.show()
 
 # This code runs after the plot window is closed
-ser.close()
-print("✅ Serial port closed.")
+if ser is not None:
+    ser.close()
+    print("✅ Serial port closed.")
+if sample_writer is not None:
+    sample_writer.close()
+if bus is not None:
+    bus.close()
@@ -2,39 +2,96 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import serial
 import serial.tools.list_ports
-import csv
-import time
-import re
 import os
-from datetime import datetime
+import time
 import threading
 import collections
-import pandas as pd
-
-# Matplotlib imports for embedding the graph
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.dates as mdates
+import importlib
+import importlib.util
+from concurrent.futures import CancelledError
+
+from aggregation import AGGREGATE_RAW, AGGREGATE_WINDOW, RawHistory, make_stage
+from alerts import ALERT_LOG, ALERT_RULES_FILE, AlertEngine, AlertLog, load_rules, threshold_rules
+from csv_writer import AGGREGATE_HEADER, CSV_HEADER, FSYNC_PER_INTERVAL
+from ingestion import SerialIngestionEngine
+from partitions import PARTITION_DAY, PartitionedCsvWriter, PartitionedLog
+from history_view import VirtualHistoryView
+from metrics import Histogram, Metrics, MetricsServer, register_pipeline, register_reports, summarize
+from sqlite_log import BINARY_BACKEND, SQLITE_BACKEND, SQLITE_DB, WINDOW_BACKENDS, SqliteBatchWriter, SqliteLog
+from sample_bus import BusFollower, SampleBus
+from ui_dispatcher import UiDispatcher
+from wire_protocol import BAUD_RATES, WIRE_TEXT
+
+# Matplotlib modules for embedding the graph. They take about half of the startup time, so they are
+# imported on a background thread while the window is already up (see load_plotting()).
+PLOTTING_MODULES = ('matplotlib.figure', 'matplotlib.backends.backend_tkagg', 'matplotlib.dates')
 
 # --- Dummy function for report generation if the other file is missing ---
 # This is to make the script runnable on its own.
-# Replace this with your actual import if you have the file.
+# Reports are built in worker processes, so the GUI itself never imports generate_report (pandas, fpdf).
 try:
-    from generate_report import generate_report
+    from report_jobs import ReportCancelled, ReportJobManager
+    if importlib.util.find_spec('generate_report') is None:
+        raise ImportError("No module named 'generate_report'")
 except ImportError:
     print("Warning: 'generate_report.py' not found. Using a dummy function.")
-    def generate_report(start_date, end_date):
+    ReportJobManager = None
+    class ReportCancelled(Exception):
+        pass
+    def generate_report(start_date, end_date, **options):
         print(f"Dummy report generated from {start_date} to {end_date}")
         # In a real scenario, you would show a messagebox or handle this.
         # For this example, we'll just print to the console.
         messagebox.showinfo("Report Dummy", f"This is a placeholder for the report from\n{start_date} to {end_date}")
 
 
+def load_plotting():
+    """Imports the plotting stack. Runs on a background thread at startup unless DEFERRED_STARTUP is off."""
+    for name in PLOTTING_MODULES:
+        importlib.import_module(name)
+
+
 # --- Configuration ---
-BAUD_RATE = 9600
+WIRE_FORMAT = WIRE_TEXT  # 'text' (firmware env:uno) or 'binary' (env:uno_binary, see wire_protocol.py)
+BAUD_RATE = BAUD_RATES[WIRE_FORMAT]  # 9600 for text, 115200 for binary frames
 DATA_DIR = 'data'
 CSV_FILE = os.path.join(DATA_DIR, 'data.csv')
 MAX_DATA_POINTS = 30 # Number of points to show on the live graph
+REPORT_WORKERS = 2   # Worker processes for report generation
+REPORT_POLL_MS = 100 # How often report progress is checked
+GRAPH_REFRESH_MS = 1000 # Live graph redraw interval, independent of the sensor sample rate
+GRAPH_HEADROOM = 0.25   # Extra room added around the data when the axes are rescaled
+GRAPH_RESCALE_FRAMES = 5  # The time axis is extended far enough ahead to blit at least this many frames
+UI_TICK_MS = 50         # Labels, history and alerts are updated at most this often, however fast data arrives
+UI_QUEUE_SIZE = 1000    # Reading batches waiting for the GUI before new ones are dropped from the display
+BUS_PORT_LABEL = "Sensor daemon"  # Port list entry for samples published by sensor_daemon.py
+ALERT_HYSTERESIS = 0.5  # °C back inside the min/max band before a temperature alert clears
+METRICS_PORT = 9464     # Prometheus metrics on http://127.0.0.1:9464/metrics (None to disable)
+STATS_REFRESH_MS = 1000 # Pipeline stats panel refresh interval
+DEFERRED_STARTUP = True # Show the window first; load the graph and list the ports in the background
+PLOT_POLL_MS = 50       # How often startup checks whether the plotting stack has been imported
+SERIAL_STOP_TIMEOUT = 5.0  # Seconds Stop/exit wait for the serial thread to log its last window records
+
+# --- CSV writer settings ---
+CSV_QUEUE_SIZE = 10000      # Rows buffered in memory before new rows are dropped
+CSV_BATCH_SIZE = 50         # Write once this many rows are waiting...
+CSV_FLUSH_INTERVAL = 1.0    # ...or this many seconds have passed
+CSV_FSYNC_POLICY = FSYNC_PER_INTERVAL  # 'none', 'batch' or 'interval'
+CSV_FSYNC_INTERVAL = 5.0    # Seconds between fsyncs for the 'interval' policy
+PARTITION_PERIOD = PARTITION_DAY  # New log file every day ('day'), or only by size (None)
+PARTITION_MAX_BYTES = 64 * 1024 * 1024  # ...and whenever the current file reaches this size
+STORAGE_BACKEND = 'csv'     # 'csv' (daily CSV partitions), 'sqlite' (data/data.db, see sqlite_log.py)
+                            # or 'binary' (data/samples.bin, see sample_log.py)
+
+# --- Ingestion-time aggregation (see aggregation.py) ---
+AGGREGATION_MODE = 'raw'    # 'raw' logs every reading, 'window' one mean/min/max/count record per window,
+                            # 'deadband' only readings that changed; alerts and the display always see every reading
+AGGREGATION_WINDOW = 1.0    # Seconds per window record
+DEADBAND_TEMP = 0.1         # °C change before a reading is logged in 'deadband' mode
+DEADBAND_HUM = 1.0          # % humidity change, likewise
+DEADBAND_HEARTBEAT = 60.0   # Seconds after which a steady reading is logged anyway
+RAW_HISTORY_SECONDS = 120.0 # Raw readings kept in memory while aggregating, written to data/alert_raw.csv
+                            # when an alert fires (0 to disable)
 
 class SensorApp:
     def __init__(self, root):
@@ -43,13 +100,17 @@ class SensorApp:
         self.root.geometry("900x650")
 
         self.is_monitoring = False
-        self.alert_active = False
+        self.alert_active = []  # Names of the rules currently in alert
         self.serial_thread = None
-        self.ser = None
+        self.engine = None
+        self.log_readings = True  # False while following the daemon, which logs the samples itself
+        self.report_jobs = ReportJobManager(max_workers=REPORT_WORKERS) if ReportJobManager else None
 
         # --- For dynamic log history ---
         self.history_window = None
-        self.history_tree = None
+        self.history_view = None
+        self.stats_window = None
+        self.stats_tree = None
 
         # Data storage for the graph
         self.timestamps = collections.deque(maxlen=MAX_DATA_POINTS)
@@ -60,6 +121,49 @@ class SensorApp:
         if not os.path.exists(DATA_DIR):
             os.makedirs(DATA_DIR)
 
+        # --- Background CSV writer (keeps disk I/O off the serial thread) ---
+        # Rows go into daily log partitions; the writer keeps each partition's time index and the
+        # statistics rollups current, and closed partitions are gzipped in the background.
+        # With the SQLite backend, each batch is one transaction in data/data.db instead; with the
+        # binary backend, it is appended to data/samples.bin as fixed-width records.
+        if AGGREGATION_MODE == AGGREGATE_WINDOW and STORAGE_BACKEND not in WINDOW_BACKENDS:
+            raise ValueError(f"AGGREGATION_MODE '{AGGREGATE_WINDOW}' needs STORAGE_BACKEND "
+                             f"{'/'.join(repr(backend) for backend in WINDOW_BACKENDS)}, not '{STORAGE_BACKEND}'.")
+        if STORAGE_BACKEND == BINARY_BACKEND:
+            from sample_log import SAMPLE_LOG, SampleLog, SampleLogWriter  # numpy: only when it is used
+            self.log = SampleLog(SAMPLE_LOG)
+            self.csv_writer = SampleLogWriter(
+                self.log, max_queue=CSV_QUEUE_SIZE, batch_size=CSV_BATCH_SIZE,
+                flush_interval=CSV_FLUSH_INTERVAL, fsync_policy=CSV_FSYNC_POLICY,
+                fsync_interval=CSV_FSYNC_INTERVAL).start()
+        elif STORAGE_BACKEND == SQLITE_BACKEND:
+            self.log = SqliteLog(SQLITE_DB)
+            self.csv_writer = SqliteBatchWriter(
+                self.log, max_queue=CSV_QUEUE_SIZE, batch_size=CSV_BATCH_SIZE,
+                flush_interval=CSV_FLUSH_INTERVAL, fsync_policy=CSV_FSYNC_POLICY,
+                fsync_interval=CSV_FSYNC_INTERVAL).start()
+        else:
+            self.log = PartitionedLog(CSV_FILE, max_bytes=PARTITION_MAX_BYTES)
+            self.csv_writer = PartitionedCsvWriter(
+                self.log, period=PARTITION_PERIOD, max_queue=CSV_QUEUE_SIZE, batch_size=CSV_BATCH_SIZE,
+                header=AGGREGATE_HEADER if AGGREGATION_MODE == AGGREGATE_WINDOW else CSV_HEADER,
+                flush_interval=CSV_FLUSH_INTERVAL, fsync_policy=CSV_FSYNC_POLICY,
+                fsync_interval=CSV_FSYNC_INTERVAL).start()
+            self.log.compress_in_background()
+
+        # --- Aggregation stage between the parser and the log writer ---
+        self.setup_aggregation()
+
+        # --- Alert rules: compiled when a threshold changes, evaluated per batch on the serial thread ---
+        # Fired/cleared events go to their own log (data/alerts.csv) so reports can list them
+        self.alerts = AlertEngine()
+        self.alert_log = AlertLog(ALERT_LOG).start()
+        try:
+            self.extra_alert_rules = load_rules(ALERT_RULES_FILE)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Warning: could not load alert rules from {ALERT_RULES_FILE}: {e}")
+            self.extra_alert_rules = []
+
         # --- Style ---
         style = ttk.Style()
         style.theme_use('clam')
@@ -80,9 +184,9 @@ class SensorApp:
         conn_lf = ttk.Labelframe(top_frame, text="Connection", padding=10)
         conn_lf.pack(side=tk.LEFT, padx=10, fill=tk.Y)
 
-        ttk.Label(conn_lf, text="COM Port:").grid(row=0, column=0, padx=5, pady=5, sticky='w')
-        self.port_var = tk.StringVar()
-        self.port_selector = ttk.Combobox(conn_lf, textvariable=self.port_var, state='readonly', width=15)
+        ttk.Label(conn_lf, text="COM Ports:").grid(row=0, column=0, padx=5, pady=5, sticky='nw')
+        # Multi-select: every selected port is read by the same ingestion loop
+        self.port_selector = tk.Listbox(conn_lf, selectmode=tk.EXTENDED, exportselection=False, height=3, width=15)
         self.port_selector.grid(row=0, column=1, padx=5, pady=5, sticky='ew')
         
         self.refresh_button = ttk.Button(conn_lf, text="Refresh", command=self.update_ports_list)
@@ -129,49 +233,137 @@ class SensorApp:
         self.history_button = ttk.Button(button_lf, text="View Log History", command=self.show_log_history)
         self.history_button.pack(fill=tk.X, expand=True, padx=5, pady=2)
 
-        # Graph Frame
-        graph_frame = ttk.Frame(root, padding=10)
-        graph_frame.pack(expand=True, fill=tk.BOTH)
-
-        self.fig = Figure(figsize=(5, 4), dpi=100, facecolor='#F0F0F0')
-        self.ax_temp = self.fig.add_subplot(211)
-        self.ax_hum = self.fig.add_subplot(212, sharex=self.ax_temp)
-        
-        self.canvas = FigureCanvasTkAgg(self.fig, master=graph_frame)
-        self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.stats_button = ttk.Button(button_lf, text="Pipeline Stats", command=self.show_stats_panel)
+        self.stats_button.pack(fill=tk.X, expand=True, padx=5, pady=2)
+
+        # Graph Frame (the figure replaces the placeholder once matplotlib is loaded, see create_live_plot())
+        self.graph_frame = ttk.Frame(root, padding=10)
+        self.graph_frame.pack(expand=True, fill=tk.BOTH)
+
+        self.frame_var = tk.StringVar(value="Graph: -- ms/frame")
+        ttk.Label(self.graph_frame, textvariable=self.frame_var, anchor='e', font=('Helvetica', 9)).pack(side=tk.BOTTOM, fill=tk.X)
+        self.ui_queue_var = tk.StringVar(value="UI queue: 0")
+        ttk.Label(self.graph_frame, textvariable=self.ui_queue_var, anchor='e', font=('Helvetica', 9)).pack(side=tk.BOTTOM, fill=tk.X)
+        self.graph_placeholder = ttk.Label(self.graph_frame, text="Loading graph...", anchor='center')
+        self.graph_placeholder.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.plot_ready = False
+        self.graph_background = None
+        self.frame_times = collections.deque(maxlen=50)
+        self.frame_seconds = Histogram()
+        self.full_redraws = 0
         
         self.status_var = tk.StringVar(value="Status: Select a port and press Start.")
         self.status_bar = ttk.Label(root, textvariable=self.status_var, style='Status.TLabel', relief=tk.SUNKEN, anchor='w')
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
 
-        self.update_ports_list()
+        # Serial-thread updates reach the widgets through one periodic tick instead of an after() call each
+        self.ui = UiDispatcher(root, self.apply_ui_updates, max_items=UI_QUEUE_SIZE, tick_ms=UI_TICK_MS).start()
+
+        self.compile_alert_rules()
+        self.min_temp_var.trace_add('write', self.compile_alert_rules)
+        self.max_temp_var.trace_add('write', self.compile_alert_rules)
+
+        # --- Pipeline metrics: read by the stats panel and by a Prometheus endpoint on localhost ---
+        # Components count into their own attributes; the registry only reads them when asked
+        self.metrics = Metrics()
+        register_pipeline(self.metrics, lambda: self.engine, writer=lambda: self.csv_writer,
+                          dispatcher=lambda: self.ui, alerts=lambda: self.alerts,
+                          aggregator=lambda: self.aggregator)
+        self.metrics.histogram('sensor_graph_frame_seconds', "Time to draw one live graph frame",
+                               lambda: self.frame_seconds)
+        if self.report_jobs:
+            register_reports(self.metrics, self.report_jobs)
+        self.metrics_server = None
+        if METRICS_PORT is not None:
+            try:
+                self.metrics_server = MetricsServer(self.metrics, port=METRICS_PORT).start()
+            except OSError as e:
+                print(f"Warning: metrics endpoint not started on port {METRICS_PORT}: {e}")
+
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        if DEFERRED_STARTUP:
+            # The window is drawn as soon as __init__ returns; the slow parts finish behind it
+            self.update_ports_list()
+            self.plot_loader = threading.Thread(target=load_plotting, name="PlotLoader", daemon=True)
+            self.plot_loader.start()
+            self.root.after(PLOT_POLL_MS, self.poll_plot_loader)
+        else:
+            self.apply_ports_list(self.find_ports())
+            load_plotting()
+            self.create_live_plot()
 
-    def update_ports_list(self):
+    def poll_plot_loader(self):
+        if self.plot_loader.is_alive():
+            self.root.after(PLOT_POLL_MS, self.poll_plot_loader)
+            return
+        # If the import failed on the loader thread, it is retried here and raises normally
+        self.create_live_plot()
+
+    def create_live_plot(self):
+        """Builds the figure and its Tk canvas in place of the placeholder (on the Tk thread)."""
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        self.fig = Figure(figsize=(5, 4), dpi=100, facecolor='#F0F0F0')
+        self.ax_temp = self.fig.add_subplot(211)
+        self.ax_hum = self.fig.add_subplot(212, sharex=self.ax_temp)
+
+        self.canvas = FigureCanvasTkAgg(self.fig, master=self.graph_frame)
+        self.graph_placeholder.destroy()
+        self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.setup_live_plot()
+        self.plot_ready = True
+
+    def find_ports(self):
+        """Serial ports plus the daemon's sample bus, if it is running. Can take seconds on some systems."""
         ports = [port.device for port in serial.tools.list_ports.comports()]
-        self.port_selector['values'] = ports
+        if SampleBus.exists():
+            ports.insert(0, BUS_PORT_LABEL)
+        return ports
+
+    def scan_ports(self):
+        try:
+            ports = self.find_ports()
+        except Exception as e:
+            print(f"Error listing serial ports: {e}")
+            ports = []
+        self.ui.set_latest('ports', ports)
+
+    def update_ports_list(self):
+        """Lists the ports on a worker thread; the result arrives through the UI dispatcher."""
+        self.refresh_button.config(state=tk.DISABLED)
+        self.update_status("Status: Searching for serial ports...")
+        threading.Thread(target=self.scan_ports, name="PortScan", daemon=True).start()
+
+    def apply_ports_list(self, ports):
+        if self.is_monitoring:
+            return  # Monitoring was started with the old list while the scan ran
+        self.refresh_button.config(state=tk.NORMAL)
+        self.port_selector.delete(0, tk.END)
+        for port in ports:
+            self.port_selector.insert(tk.END, port)
         if ports:
-            self.port_var.set(ports[0])
+            self.port_selector.selection_set(0)
             self.update_status("Status: Ready to start monitoring.")
         else:
-            self.port_var.set("")
             self.update_status("Status: No COM ports found. Please connect a device.")
 
+    def selected_ports(self):
+        return [self.port_selector.get(i) for i in self.port_selector.curselection()]
+
     def open_report_dialog(self):
         """Opens a dialog for the user to select a date range for the report."""
-        try:
-            log_data = pd.read_csv(CSV_FILE)
-            if log_data.empty:
-                raise pd.errors.EmptyDataError
-            min_date_str = pd.to_datetime(log_data['Timestamp'].min()).strftime('%Y-%m-%d %H:%M:%S')
-            max_date_str = pd.to_datetime(log_data['Timestamp'].max()).strftime('%Y-%m-%d %H:%M:%S')
-        except (FileNotFoundError, pd.errors.EmptyDataError):
+        self.csv_writer.flush()
+        # Dataset bounds come from the first and last partitions, not a full read
+        bounds = self.log.load().bounds()
+        if bounds is None:
             messagebox.showerror("Error", "Log file is empty or not found. Cannot generate report.")
             return
+        min_date_str, max_date_str = bounds
 
         dialog = tk.Toplevel(self.root)
         dialog.title("Report Options")
-        dialog.geometry("400x200")
+        dialog.geometry("400x340")
 
         frame = ttk.Frame(dialog, padding=20)
         frame.pack(expand=True, fill=tk.BOTH)
@@ -186,18 +378,77 @@ class SensorApp:
         end_entry.insert(0, max_date_str)
         end_entry.pack()
 
-        def do_generate():
-            self.update_status("Status: Generating report...")
+        # Graph options: how to thin out long ranges, and whether to draw min/max bands
+        options_frame = ttk.Frame(frame)
+        options_frame.pack(pady=8)
+        ttk.Label(options_frame, text="Graph detail:").pack(side=tk.LEFT)
+        decimation_var = tk.StringVar(value='lttb')
+        ttk.Combobox(options_frame, textvariable=decimation_var, values=('lttb', 'minmax'),
+                     state='readonly', width=8).pack(side=tk.LEFT, padx=5)
+        bands_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Min/Max bands", variable=bands_var).pack(side=tk.LEFT, padx=5)
+        ttk.Label(options_frame, text="Graph format:").pack(side=tk.LEFT)
+        format_var = tk.StringVar(value='png')
+        ttk.Combobox(options_frame, textvariable=format_var, values=('png', 'svg'),
+                     state='readonly', width=5).pack(side=tk.LEFT, padx=5)
+
+        progress_var = tk.DoubleVar(value=0.0)
+        phase_var = tk.StringVar(value="")
+        button_frame = ttk.Frame(frame)
+        button_frame.pack(pady=10)
+        generate_button = ttk.Button(button_frame, text="Generate")
+        generate_button.pack(side=tk.LEFT, padx=5)
+        cancel_button = ttk.Button(button_frame, text="Cancel", state=tk.DISABLED)
+        cancel_button.pack(side=tk.LEFT, padx=5)
+        ttk.Progressbar(frame, variable=progress_var, maximum=1.0, length=300).pack()
+        ttk.Label(frame, textvariable=phase_var).pack()
+
+        def finish_job(job):
+            """Polls the worker until the report is done, updating the progress bar meanwhile."""
+            for job_id, phase, fraction in self.report_jobs.poll_progress():
+                if job_id == job.job_id and dialog.winfo_exists():
+                    progress_var.set(fraction)
+                    phase_var.set(phase)
+            if not job.future.done():
+                self.root.after(REPORT_POLL_MS, finish_job, job)
+                return
+            if not dialog.winfo_exists():
+                return
+            generate_button.config(state=tk.NORMAL)
+            cancel_button.config(state=tk.DISABLED)
             try:
-                generate_report(start_date=start_entry.get(), end_date=end_entry.get())
-                messagebox.showinfo("Success", "PDF report has been generated successfully.", parent=dialog)
+                report_path = job.future.result()
+                messagebox.showinfo("Success", f"PDF report has been generated successfully.\n{report_path}", parent=dialog)
                 self.update_status("Status: Report generated.")
                 dialog.destroy()
+            except (ReportCancelled, CancelledError):
+                phase_var.set("Cancelled")
+                self.update_status("Status: Report cancelled.")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to generate report:\n{e}", parent=dialog)
                 self.update_status("Status: Error generating report.")
 
-        ttk.Button(frame, text="Generate", command=do_generate).pack(pady=20)
+        def do_generate():
+            self.update_status("Status: Generating report...")
+            try:
+                alert_range = (float(self.min_temp_var.get()), float(self.max_temp_var.get()))
+            except ValueError:
+                alert_range = None
+            options = dict(start_date=start_entry.get(), end_date=end_entry.get(),
+                           decimation=decimation_var.get(), alert_range=alert_range,
+                           show_bands=bands_var.get(), graph_format=format_var.get(), backend=STORAGE_BACKEND)
+            if self.report_jobs is None:
+                generate_report(**options)
+                return
+            # The report is built in a worker process, so the window stays responsive
+            job = self.report_jobs.submit(**options)
+            generate_button.config(state=tk.DISABLED)
+            cancel_button.config(state=tk.NORMAL, command=job.cancel)
+            progress_var.set(0.0)
+            phase_var.set("Queued")
+            self.root.after(REPORT_POLL_MS, finish_job, job)
+
+        generate_button.config(command=do_generate)
 
     def on_history_close(self):
         self.history_window.withdraw()
@@ -213,41 +464,72 @@ class SensorApp:
         self.history_window.geometry("700x500")
         self.history_window.protocol("WM_DELETE_WINDOW", self.on_history_close)
 
-        cols = ('Timestamp', 'Temperature_C', 'Humidity_Percent')
-        self.history_tree = ttk.Treeview(self.history_window, columns=cols, show='headings')
-        
-        for col in cols:
-            self.history_tree.heading(col, text=col)
-            self.history_tree.column(col, width=150)
-        
+        # Only the visible rows are held in the table; pages are read from the log on scroll
+        self.history_view = VirtualHistoryView(self.history_window, self.log,
+                                               flush=self.csv_writer.flush, padding=5)
+        self.history_view.pack(fill='both', expand=True)
         self.load_history_data()
 
-        vsb = ttk.Scrollbar(self.history_window, orient="vertical", command=self.history_tree.yview)
-        vsb.pack(side='right', fill='y')
-        self.history_tree.configure(yscrollcommand=vsb.set)
-        self.history_tree.pack(fill='both', expand=True)
-
     def load_history_data(self):
-        # Clear existing data before loading
-        for item in self.history_tree.get_children():
-            self.history_tree.delete(item)
-        
-        try:
-            with open(CSV_FILE, 'r', newline='') as file:
-                reader = csv.reader(file)
-                next(reader) # Skip header
-                for row in reader:
-                    self.history_tree.insert("", "end", values=row)
-        except (FileNotFoundError, StopIteration):
-            pass # No file or empty file, just show an empty table
-
-    def add_log_entry_to_history(self, row_data):
-        if self.history_tree and self.history_window and self.history_window.winfo_exists():
-            self.history_tree.insert("", "end", values=row_data)
-            self.history_tree.yview_moveto(1.0)
+        self.history_view.refresh()
+
+    def add_log_entries_to_history(self, batches):
+        """Shows batches of readings in the open history window; they are only formatted as rows here."""
+        if self.history_view and self.history_window and self.history_window.winfo_exists():
+            self.history_view.add_live_rows([
+                (f"{reading.timestamp:%Y-%m-%d %H:%M:%S}", f"{reading.temp:.2f}", f"{reading.humidity:.2f}",
+                 reading.device_id)
+                for readings in batches for reading in readings])
+
+    def on_stats_close(self):
+        self.stats_window.withdraw()
+
+    def show_stats_panel(self):
+        if self.stats_window and self.stats_window.winfo_exists():
+            if self.stats_window.state() == 'withdrawn':
+                self.stats_window.deiconify()
+                self.refresh_stats_panel()  # The refresh timer stops while the panel is hidden
+            self.stats_window.lift()
+            return
+
+        self.stats_window = tk.Toplevel(self.root)
+        self.stats_window.title("Pipeline Stats")
+        self.stats_window.geometry("820x420")
+        self.stats_window.protocol("WM_DELETE_WINDOW", self.on_stats_close)
+
+        self.stats_tree = ttk.Treeview(self.stats_window, columns=('labels', 'value'), show='tree headings')
+        self.stats_tree.heading('#0', text="Metric")
+        self.stats_tree.heading('labels', text="Labels")
+        self.stats_tree.heading('value', text="Value")
+        self.stats_tree.column('#0', width=260)
+        self.stats_tree.column('labels', width=140)
+        self.stats_tree.column('value', width=400)
+        self.stats_tree.pack(fill='both', expand=True)
+        self.refresh_stats_panel()
+
+    def refresh_stats_panel(self):
+        """Updates the stats rows in place while the panel is visible."""
+        if not (self.stats_window and self.stats_window.winfo_exists()) or self.stats_window.state() == 'withdrawn':
+            return
+        seen = set()
+        for kind, name, help, samples in self.metrics.collect():
+            for labels, value in samples:
+                label_text = ', '.join(f"{key}={label}" for key, label in labels.items())
+                iid = f"{name}|{label_text}"
+                seen.add(iid)
+                text = summarize(kind, value)
+                if self.stats_tree.exists(iid):
+                    self.stats_tree.item(iid, values=(label_text, text))
+                else:
+                    self.stats_tree.insert('', tk.END, iid=iid, text=name, values=(label_text, text))
+        for iid in self.stats_tree.get_children():
+            if iid not in seen:
+                self.stats_tree.delete(iid)
+        self.root.after(STATS_REFRESH_MS, self.refresh_stats_panel)
 
     def start_monitoring(self):
-        if not self.port_var.get():
+        ports = self.selected_ports()
+        if not ports:
             messagebox.showerror("Connection Error", "No COM port selected.")
             return
 
@@ -260,148 +542,237 @@ class SensorApp:
         self.update_status("Status: Connecting to device...")
 
         self.timestamps.clear(); self.temps.clear(); self.hums.clear()
-        
+
+        if BUS_PORT_LABEL in ports:
+            # The daemon owns the serial ports and the log; only follow its sample bus
+            self.log_readings = False
+            self.engine = BusFollower(on_readings=self.process_sensor_data, on_status=self.on_port_status)
+        else:
+            self.log_readings = True
+            self.engine = SerialIngestionEngine(
+                ports, on_readings=self.process_sensor_data,
+                on_status=self.on_port_status, baud_rate=BAUD_RATE)
         self.serial_thread = threading.Thread(target=self.serial_worker, daemon=True)
         self.serial_thread.start()
         self.update_graph()
 
     def stop_monitoring(self):
         self.is_monitoring = False
-        if self.serial_thread and self.serial_thread.is_alive():
-            # No need to join a daemon thread, it will exit with the app
-            pass
+        if self.engine:
+            self.engine.stop()
+        self.join_serial_thread()
+        self.csv_writer.flush()
         self.start_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
         self.report_button.config(state=tk.NORMAL)
-        self.port_selector.config(state='readonly')
+        self.port_selector.config(state=tk.NORMAL)
         self.refresh_button.config(state=tk.NORMAL)
         self.update_status("Status: Monitoring stopped.")
         
-    def update_graph(self):
-        if not self.is_monitoring: return
-
-        self.ax_temp.clear(); self.ax_hum.clear()
-
-        if self.timestamps:
-            self.ax_temp.plot(self.timestamps, self.temps, color='tab:red', marker='o', ls='-')
-            self.ax_hum.plot(self.timestamps, self.hums, color='tab:blue', marker='x', ls='--')
-
+    def setup_live_plot(self):
+        """Creates the live graph's axes decoration and line artists once; updates only change their data."""
+        import matplotlib.dates as mdates
         self.ax_temp.set_title("Live Temperature"); self.ax_temp.set_ylabel("Temp (°C)"); self.ax_temp.grid(True, ls='--', alpha=0.6)
         self.ax_hum.set_title("Live Humidity"); self.ax_hum.set_ylabel("Humidity (%)"); self.ax_hum.grid(True, ls='--', alpha=0.6)
-        
         self.ax_hum.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
+
+        # Animated artists are left out of normal draws and blitted on top of a saved background
+        self.temp_line, = self.ax_temp.plot([], [], color='tab:red', marker='o', ls='-', animated=True)
+        self.hum_line, = self.ax_hum.plot([], [], color='tab:blue', marker='x', ls='--', animated=True)
         self.fig.autofmt_xdate()
         self.fig.tight_layout(pad=2.0)
-        self.canvas.draw()
-        
-        self.root.after(1000, self.update_graph)
+        self.canvas.mpl_connect('draw_event', self.on_canvas_draw)
+
+    def on_canvas_draw(self, event):
+        # Runs after every full draw (including window resizes): save the static background
+        self.graph_background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_live_artists()
+
+    def draw_live_artists(self):
+        self.ax_temp.draw_artist(self.temp_line)
+        self.ax_hum.draw_artist(self.hum_line)
+
+    def time_axis_lookahead(self, x):
+        span = x[-1] - x[0]
+        return max(span * GRAPH_HEADROOM, GRAPH_RESCALE_FRAMES * GRAPH_REFRESH_MS / 1000 / 86400)  # Date units are days
+
+    def live_data_outside_limits(self, x):
+        x_min, x_max = self.ax_temp.get_xlim()
+        if x[0] < x_min or x[-1] > x_max or (x[0] - x_min) > self.time_axis_lookahead(x):
+            return True
+        for ax, values in ((self.ax_temp, self.temps), (self.ax_hum, self.hums)):
+            y_min, y_max = ax.get_ylim()
+            if min(values) < y_min or max(values) > y_max:
+                return True
+        return False
+
+    def rescale_live_axes(self, x):
+        self.ax_temp.set_xlim(x[0], x[-1] + self.time_axis_lookahead(x))
+        for ax, values in ((self.ax_temp, self.temps), (self.ax_hum, self.hums)):
+            low, high = min(values), max(values)
+            margin = max((high - low) * GRAPH_HEADROOM, 1.0)
+            ax.set_ylim(low - margin, high + margin)
+        self.fig.tight_layout(pad=2.0)
 
-    def serial_worker(self):
-        """Handles serial connection, reading, and auto-reconnecting."""
-        while self.is_monitoring:
-            if self.ser is None or not self.ser.is_open:
-                try:
-                    selected_port = self.port_var.get()
-                    self.update_status(f"Status: Connecting to {selected_port}...")
-                    self.ser = serial.Serial(selected_port, BAUD_RATE, timeout=1)
-                    time.sleep(2) # Wait for connection to establish
-                    self.update_status("Status: Connected and Monitoring...")
-                except serial.SerialException:
-                    self.update_status("Status: Connection Failed! Retrying...")
-                    time.sleep(3) # Wait before retrying
-                    continue # Loop back to try connecting again
+    def update_graph(self):
+        if not self.is_monitoring: return
+        if not self.plot_ready:
+            # Readings are already collected; drawing starts once the figure exists
+            self.root.after(GRAPH_REFRESH_MS, self.update_graph)
+            return
+        import matplotlib.dates as mdates
+
+        started = time.perf_counter()
+        if self.timestamps:
+            x = mdates.date2num(list(self.timestamps))
+            self.temp_line.set_data(x, list(self.temps))
+            self.hum_line.set_data(x, list(self.hums))
+
+            if self.graph_background is None or self.live_data_outside_limits(x):
+                # Data left the visible area: rescale, lay out and redraw everything once
+                self.rescale_live_axes(x)
+                self.canvas.draw()
+                self.full_redraws += 1
             else:
-                try:
-                    line = self.ser.readline().decode('utf-8').strip()
-                    if line:
-                        temp, humidity = self.parse_data(line)
-                        if temp is not None:
-                            self.process_sensor_data(temp, humidity)
-                except serial.SerialException:
-                    if self.ser and self.ser.is_open:
-                        self.ser.close()
-                    self.ser = None
-                    self.update_status("Status: Connection Lost! Reconnecting...")
-                    print("Serial connection lost during read.")
-                except Exception as e:
-                    print(f"An unexpected error occurred while reading: {e}")
-
-        if self.ser and self.ser.is_open:
-            self.ser.close()
-            print("Serial port closed.")
-
-    def process_sensor_data(self, temp, humidity):
-        timestamp_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        row_data = (timestamp_str, f"{temp:.2f}", f"{humidity:.2f}")
-
-        self.timestamps.append(datetime.now())
-        self.temps.append(temp)
-        self.hums.append(humidity)
-        
-        self.root.after(0, self.update_gui_labels, temp, humidity)
-        self.root.after(0, self.add_log_entry_to_history, row_data)
-        self.root.after(0, self.check_alerts, temp)
-        
-        self.log_to_csv(row_data)
+                # Only the two lines changed: restore the background and blit them
+                self.canvas.restore_region(self.graph_background)
+                self.draw_live_artists()
+                self.canvas.blit(self.fig.bbox)
+
+        elapsed = time.perf_counter() - started
+        self.frame_seconds.observe(elapsed)
+        self.frame_times.append(elapsed * 1000)
+        self.frame_var.set(f"Graph: {self.frame_times[-1]:.1f} ms/frame "
+                           f"(avg {sum(self.frame_times) / len(self.frame_times):.1f} ms, {self.full_redraws} full redraws)")
+
+        self.root.after(GRAPH_REFRESH_MS, self.update_graph)
+
+    def setup_aggregation(self, mode=AGGREGATION_MODE):
+        """Creates the aggregation stage for `mode` and, unless every reading is logged, the raw history."""
+        self.aggregator = make_stage(mode, AGGREGATION_WINDOW, DEADBAND_TEMP, DEADBAND_HUM, DEADBAND_HEARTBEAT)
+        self.raw_history = None
+        if mode != AGGREGATE_RAW and RAW_HISTORY_SECONDS:
+            self.raw_history = RawHistory(RAW_HISTORY_SECONDS)
+
+    def join_serial_thread(self):
+        """Waits for the stopped serial thread, whose last step queues the aggregator's open windows."""
+        if self.serial_thread and self.serial_thread.is_alive():
+            self.serial_thread.join(SERIAL_STOP_TIMEOUT)
+            if self.serial_thread.is_alive():
+                print("Warning: the serial thread did not stop; its last records may not be logged.")
 
-    def check_alerts(self, current_temp):
+    def serial_worker(self):
+        """Runs the ingestion engine, which reads and reconnects every selected port on this one thread."""
+        self.engine.run()
+        if self.log_readings:
+            # Windows still open when ingestion stops are logged as they are
+            self.write_to_log(self.aggregator.flush())
+
+    def on_port_status(self, device_id, text):
+        if len(self.engine.ports) > 1 and device_id not in text:
+            text = f"{text} [{device_id}]"
+        self.update_status(text)
+
+    def process_sensor_data(self, readings):
+        """Handles one batch of readings from a single serial chunk (runs on the serial thread)."""
+        events = self.alerts.evaluate(readings)
+        if events:
+            self.ui.set_latest('alerts', self.alerts.active())
+
+        # Readings always reach the aggregation stage; only the display skips batches if the GUI falls behind
+        self.ui.post(readings)
+        if not self.log_readings:
+            return
+        self.alert_log.write_events(events)
+        if self.raw_history:
+            self.raw_history.record(readings, events)
+        self.write_to_log(self.aggregator.process(readings))
+
+    def apply_ui_updates(self, items, latest):
+        """UiDispatcher tick: applies every batch queued since the last tick in one pass."""
+        if items:
+            for readings in items:
+                for reading in readings:
+                    self.timestamps.append(reading.timestamp)
+                    self.temps.append(reading.temp)
+                    self.hums.append(reading.humidity)
+            newest = items[-1][-1]
+            self.update_gui_labels(newest.temp, newest.humidity)
+            self.add_log_entries_to_history(items)
+        if 'ports' in latest:
+            self.apply_ports_list(latest['ports'])
+        if 'alerts' in latest:
+            self.apply_alert_state(latest['alerts'])
+        if 'status' in latest:
+            self.apply_status(*latest['status'])
+        self.ui_queue_var.set(f"UI queue: {self.ui.depth}/{self.ui.max_items} (peak {self.ui.peak_depth}), "
+                              f"{self.ui.last_batch} batches last tick, {self.ui.dropped} dropped")
+
+    def compile_alert_rules(self, *args):
+        """Rebuilds the alert rules whenever a threshold is edited; samples never re-read the entries."""
         try:
-            min_val = float(self.min_temp_var.get())
-            max_val = float(self.max_temp_var.get())
+            rules = threshold_rules(self.min_temp_var.get(), self.max_temp_var.get(), ALERT_HYSTERESIS)
+            self.alerts.set_rules(rules + self.extra_alert_rules)
         except ValueError:
             self.update_status("Status: Invalid alert threshold!", once=True)
             return
+        self.apply_alert_state(self.alerts.active())
 
-        is_alert = not (min_val <= current_temp <= max_val)
-        if is_alert != self.alert_active:
-            self.alert_active = is_alert
-            new_style = 'Alert.TLabel' if is_alert else 'Data.TLabel'
+    def apply_alert_state(self, active):
+        names = sorted({rule for _, rule in active})
+        if names != self.alert_active:
+            self.alert_active = names
+            new_style = 'Alert.TLabel' if names else 'Data.TLabel'
             self.temp_label.config(style=new_style)
-            if is_alert:
-                self.update_status("Status: !!! TEMPERATURE ALERT !!!")
+            if names:
+                self.update_status(f"Status: !!! ALERT: {', '.join(names)} !!!")
             else:
                 # Only revert status if we are not in another state (like reconnecting)
                 if "Monitoring" in self.status_var.get() or "ALERT" in self.status_var.get():
                     self.update_status("Status: Connected and Monitoring...")
 
-    def parse_data(self, line):
-        try:
-            # This regex is more robust to variations in spacing and wording
-            temp_match = re.search(r"Temperature:\s*([\d\.]+)", line)
-            hum_match = re.search(r"Humidity:\s*([\d\.]+)", line)
-            if temp_match and hum_match:
-                return float(temp_match.group(1)), float(hum_match.group(1))
-        except (AttributeError, ValueError):
-            return None, None
-        return None, None
-
     def update_gui_labels(self, temp, humidity):
         self.temp_var.set(f"{temp:.2f} °C"); self.hum_var.set(f"{humidity:.2f} %")
 
     def update_status(self, text, once=False):
-        def do_update():
-            if once and self.status_var.get() == text:
-                return
-            self.status_var.set(text)
-        self.root.after(0, do_update)
+        if threading.current_thread() is threading.main_thread():
+            self.apply_status(text, once)
+        else:
+            # Only the newest status from the worker threads is shown
+            self.ui.set_latest('status', (text, once))
 
-    def log_to_csv(self, row_data):
-        file_exists = os.path.isfile(CSV_FILE)
-        try:
-            with open(CSV_FILE, 'a', newline='') as file:
-                writer = csv.writer(file)
-                if not file_exists or os.path.getsize(CSV_FILE) == 0:
-                    writer.writerow(['Timestamp', 'Temperature_C', 'Humidity_Percent'])
-                writer.writerow(row_data)
-        except IOError as e: print(f"Error writing to CSV: {e}")
+    def apply_status(self, text, once=False):
+        if once and self.status_var.get() == text:
+            return
+        self.status_var.set(text)
+
+    def write_to_log(self, readings):
+        first_drop = self.csv_writer.rows_dropped == 0
+        if not self.csv_writer.write_readings(readings) and first_drop:
+            print("Warning: log write queue is full, dropping rows.")
 
     def on_closing(self):
         if self.is_monitoring:
             if messagebox.askyesno("Exit", "Monitoring is active. Are you sure you want to exit?"):
                 self.is_monitoring = False # This will signal the thread to stop
-                self.root.destroy()
+                if self.engine:
+                    self.engine.stop()
+                self.shutdown()
         else:
-            self.root.destroy()
+            self.shutdown()
+
+    def shutdown(self):
+        self.ui.stop()
+        self.join_serial_thread()
+        self.csv_writer.close()
+        self.alert_log.close()
+        if self.raw_history:
+            self.raw_history.close()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.report_jobs:
+            self.report_jobs.shutdown()
+        self.root.destroy()
 
 if __name__ == '__main__':
     root = tk.Tk()
@@ -0,0 +1,275 @@
+import bisect
+import http.server
+import threading
+import time
+
+METRICS_HOST = '127.0.0.1'  # Local scrapes only
+METRICS_PORT = 9464
+# Upper bounds (seconds) of the latency buckets; the last bucket is +Inf
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0)
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram. `observe()` is a bisect and two
+    additions, cheap enough for every batch on the ingestion path.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def time(self):
+        """Context manager that observes the time spent in its block."""
+        return _Timer(self)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (the largest value seen for the last bucket)."""
+        with self._lock:
+            counts, count, largest = list(self.counts), self.count, self.max
+        if count == 0:
+            return float('nan')
+        rank, seen = q * count, 0
+        for i, n in enumerate(counts):
+            seen += n
+            if seen >= rank and n:
+                return min(self.buckets[i], largest) if i < len(self.buckets) else largest
+        return largest
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else float('nan')
+
+
+class _Timer:
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """
+    Registry of pipeline metrics, read at scrape time.
+
+    Components keep their own counters as plain attributes (the parser's
+    `lines_seen`, the writer's `rows_written`, ...) and Histograms for their
+    latencies. The app registers a callback for each metric, so nothing is
+    copied on the hot path. A callback returns a number (or a Histogram),
+    or a list of `(labels dict, value)` pairs for one sample per device,
+    report phase and so on.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def counter(self, name, help, source):
+        self._add(COUNTER, name, help, source)
+
+    def gauge(self, name, help, source):
+        self._add(GAUGE, name, help, source)
+
+    def histogram(self, name, help, source):
+        self._add(HISTOGRAM, name, help, source)
+
+    def _add(self, kind, name, help, source):
+        with self._lock:
+            self._metrics.append((kind, name, help, source))
+
+    def collect(self):
+        """Returns [(kind, name, help, [(labels, value)])] with every callback evaluated."""
+        with self._lock:
+            metrics = list(self._metrics)
+        collected = []
+        for kind, name, help, source in metrics:
+            try:
+                value = source()
+            except Exception as e:
+                print(f"Error collecting metric {name}: {e}")
+                continue
+            if value is None:
+                samples = []
+            elif isinstance(value, list):
+                samples = value
+            else:
+                samples = [({}, value)]
+            collected.append((kind, name, help, samples))
+        return collected
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        for kind, name, help, samples in self.collect():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if kind != HISTOGRAM:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                with value._lock:
+                    counts, count, total = list(value.counts), value.count, value.sum
+                cumulative = 0
+                for bound, n in zip(value.buckets + (float('inf'),), counts):
+                    cumulative += n
+                    bucket_labels = dict(labels, le=_format_value(float(bound)))
+                    lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(float(total))}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """Serves `metrics.render()` at http://host:port/metrics from a daemon thread."""
+
+    def __init__(self, metrics, host=METRICS_HOST, port=METRICS_PORT):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self):
+        metrics = self.metrics
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes every few seconds would flood the console
+
+        self._server = http.server.ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def register_pipeline(metrics, engine, writer=None, dispatcher=None, alerts=None, bus=None, aggregator=None):
+    """
+    Registers the ingestion pipeline's metrics. `engine`, `writer`, ... are
+    callables returning the current component (or None), because the GUI
+    replaces its ingestion engine every time monitoring is restarted. The
+    network collector has no serial ports and passes engine=None.
+    """
+    def per_port(attribute, parser=False):
+        def collect():
+            current = engine()
+            if current is None:
+                return []
+            return [({'device': state.device_id}, getattr(state.parser if parser else state, attribute))
+                    for state in current.ports]
+        return collect
+
+    def component(getter, read):
+        def collect():
+            current = getter()
+            return None if current is None else read(current)
+        return collect
+
+    if engine is not None:
+        metrics.counter('sensor_serial_bytes_read_total', "Bytes read from each serial port", per_port('bytes_read'))
+        metrics.counter('sensor_lines_total', "Complete lines received from each port", per_port('lines_seen', True))
+        metrics.counter('sensor_readings_parsed_total', "Readings parsed from each port", per_port('readings_parsed', True))
+        metrics.counter('sensor_failed_reads_total', "'Failed to read' lines from each port", per_port('failed_reads', True))
+        metrics.counter('sensor_unparsed_lines_total', "Other lines that were not readings", per_port('unparsed', True))
+        metrics.counter('sensor_crc_errors_total', "Binary frames rejected by their CRC", per_port('crc_errors', True))
+        metrics.counter('sensor_missing_frames_total', "Binary frames lost, from gaps in the sequence numbers",
+                        per_port('missing_frames', True))
+        metrics.counter('sensor_reconnects_total', "Connections lost and reopened", per_port('reconnects'))
+        metrics.histogram('sensor_chunk_seconds', "Time to parse and hand on one serial chunk",
+                          component(engine, lambda e: e.chunk_seconds))
+    if writer is not None:
+        metrics.counter('sensor_rows_written_total', "Rows written to the log", component(writer, lambda w: w.rows_written))
+        metrics.counter('sensor_rows_dropped_total', "Rows dropped because the write queue was full",
+                        component(writer, lambda w: w.rows_dropped))
+        metrics.gauge('sensor_write_queue_depth', "Rows waiting for the log writer", component(writer, lambda w: w.queue_depth))
+        metrics.histogram('sensor_write_batch_seconds', "Time to write and commit one batch",
+                          component(writer, lambda w: w.batch_seconds))
+    if dispatcher is not None:
+        metrics.gauge('sensor_ui_queue_depth', "Batches waiting for the GUI tick", component(dispatcher, lambda d: d.depth))
+        metrics.counter('sensor_ui_dropped_total', "Batches dropped from the display",
+                        component(dispatcher, lambda d: d.dropped))
+        metrics.histogram('sensor_ui_tick_seconds', "Time spent applying one GUI tick of updates",
+                          component(dispatcher, lambda d: d.tick_seconds))
+    if alerts is not None:
+        metrics.histogram('sensor_alert_evaluate_seconds', "Time to evaluate the alert rules on one batch",
+                          component(alerts, lambda a: a.evaluate_seconds))
+    if bus is not None:
+        metrics.counter('sensor_bus_published_total', "Samples published on the shared-memory bus",
+                        component(bus, lambda b: b.write_seq))
+    if aggregator is not None:
+        metrics.counter('sensor_aggregator_readings_total', "Readings passed to the aggregation stage",
+                        component(aggregator, lambda a: a.readings_in))
+        metrics.counter('sensor_aggregator_records_total', "Records the aggregation stage sent to the log",
+                        component(aggregator, lambda a: a.records_out))
+
+
+def register_reports(metrics, report_jobs):
+    """Registers the per-phase and whole-job timings collected by a ReportJobManager."""
+    metrics.histogram('sensor_report_phase_seconds', "Time spent in each phase of report generation",
+                      lambda: [({'phase': phase}, histogram) for phase, histogram in list(report_jobs.phase_seconds.items())])
+    metrics.histogram('sensor_report_seconds', "Time to generate one report", lambda: report_jobs.job_seconds)
+
+
+def summarize(kind, value):
+    """One-line text for a sample, as shown in the GUI's stats panel."""
+    if kind != HISTOGRAM:
+        return f"{value:,}" if isinstance(value, int) else f"{value:,.2f}"
+    if not value.count:
+        return "no samples"
+    return (f"n={value.count:,}  mean {value.mean * 1000:.2f} ms  p50 {value.quantile(0.5) * 1000:.2f} ms  "
+            f"p99 {value.quantile(0.99) * 1000:.2f} ms  max {value.max * 1000:.2f} ms")
@@ -0,0 +1,560 @@
+import bisect
+import csv
+import gzip
+import json
+import os
+import queue
+import re
+import threading
+from collections import namedtuple
+
+from csv_writer import CSV_HEADER, CsvBatchWriter
+from rollups import RollupStore
+from time_index import TimeIndex
+
+PARTITION_DAY = 'day'     # Start a new partition at midnight...
+PARTITION_MAX_BYTES = 64 * 1024 * 1024  # ...or once the current one reaches this size
+META_SUFFIX = '.meta.json'  # Row count and bounds of a compressed partition
+TAIL_BACKFILL_BYTES = 8192  # How far back from the end LogTail starts when it attaches
+CHECKPOINT_ROWS = 4096      # A compressed partition's meta records where every this many rows start
+
+Partition = namedtuple('Partition', ['name', 'path', 'start', 'compressed'])
+
+
+def _name_stamp(timestamp):
+    """"2025-07-24 01:15:10" -> "20250724_011510", the start stamp used in partition names."""
+    return timestamp.replace('-', '').replace(':', '').replace(' ', '_')
+
+
+def _stamp_timestamp(date, time):
+    return f"{date[:4]}-{date[4:6]}-{date[6:]} {time[:2]}:{time[2:4]}:{time[4:]}"
+
+
+class PartitionedLog:
+    """
+    The sensor log, stored as one CSV file per day (or per `max_bytes`).
+
+    Partitions live next to the legacy log path given to the constructor
+    (`data/data.csv`) and are named after their first row, e.g.
+    `data/data_20250724_000000.csv`; a partition holds the rows from its own
+    start up to the next partition's start. Closed partitions are gzipped in
+    the background (`data_20250724_000000.csv.gz`, plus a small `.meta.json`
+    with their row count and bounds). An existing single-file `data.csv` is
+    kept and read as the oldest partition.
+
+    The query methods mirror TimeIndex (`bounds`, `estimate_rows`,
+    `read_range`, `iter_range`, `read_rows`, `find_row`, `row_count`), so the
+    report generator and the history view work on either. A range query only
+    opens the partitions that overlap it. Uncompressed partitions are read
+    through their own TimeIndex; compressed ones are streamed.
+    """
+
+    def __init__(self, csv_path, max_bytes=PARTITION_MAX_BYTES):
+        self.csv_path = csv_path
+        self.directory = os.path.dirname(csv_path) or '.'
+        self.prefix = os.path.splitext(os.path.basename(csv_path))[0]
+        self.max_bytes = max_bytes
+        self.header = CSV_HEADER
+        self.rollups = RollupStore(csv_path, time_index=self)
+        self._pattern = re.compile(rf"^{re.escape(self.prefix)}_(\d{{8}})_(\d{{6}})(?:_(\d+))?\.csv(\.gz)?$")
+        self._lock = threading.RLock()
+        self._partitions = None
+        self._indexes = {}   # Partition name -> TimeIndex, for uncompressed partitions
+        self._meta = {}      # Partition name -> row count and bounds, for compressed partitions
+        self._cursor = None  # [name, open gzip file, row it is positioned at] of the last compressed partition paged through
+        self._compress_queue = None
+
+    # --- Partition layout ---
+
+    def partitions(self):
+        """Every partition, oldest first."""
+        with self._lock:
+            if self._partitions is None:
+                self._partitions = self._scan()
+            return list(self._partitions)
+
+    def _scan(self):
+        found = {}
+        if not os.path.isdir(self.directory):
+            return []
+        for entry in os.scandir(self.directory):
+            match = self._pattern.match(entry.name)
+            if match:
+                date, time, seq, gz = match.groups()
+                name = entry.name[:-3] if gz else entry.name
+                # A partition that was compressed but not yet removed is still read from the plain file
+                if name in found and not found[name].compressed:
+                    continue
+                found[name] = Partition(name, entry.path, (_stamp_timestamp(date, time), int(seq or 0)), bool(gz))
+        legacy = self._legacy_partition()
+        partitions = sorted(found.values(), key=lambda p: p.start)
+        if legacy is not None:
+            partitions.insert(0, legacy)
+        return [p._replace(start=p.start[0]) for p in partitions]
+
+    def _legacy_partition(self):
+        name = os.path.basename(self.csv_path)
+        for path, compressed in ((self.csv_path, False), (self.csv_path + '.gz', True)):
+            if os.path.isfile(path):
+                return Partition(name, path, ('', 0), compressed)
+        return None
+
+    def refresh(self):
+        """Forgets the cached partition list, e.g. after another process has rolled over."""
+        with self._lock:
+            self._partitions = None
+            self._close_cursor()
+
+    def overlapping(self, start=None, end=None):
+        """The partitions that can hold rows with start <= timestamp <= end."""
+        partitions = self.partitions()
+        selected = []
+        for i, partition in enumerate(partitions):
+            if end is not None and partition.start > end:
+                break
+            next_start = partitions[i + 1].start if i + 1 < len(partitions) else None
+            # Rows with the next partition's start stamp can sit in either partition after a size rollover
+            if start is None or next_start is None or next_start >= start:
+                selected.append(partition)
+        return selected
+
+    def writable_path(self, timestamp):
+        """The partition a row logged at `timestamp` belongs in: the newest one, or a new one."""
+        partitions = self.partitions()
+        if partitions:
+            newest = partitions[-1]
+            if not newest.compressed and newest.path != self.csv_path and newest.start[:10] == timestamp[:10] \
+                    and os.path.getsize(newest.path) < self.max_bytes:
+                return newest.path
+        base = os.path.join(self.directory, f"{self.prefix}_{_name_stamp(timestamp)}")
+        path, seq = base + '.csv', 0
+        while os.path.exists(path) or os.path.exists(path + '.gz'):
+            seq += 1
+            path = f"{base}_{seq}.csv"
+        with self._lock:
+            self._partitions = None
+        return path
+
+    def index(self, partition):
+        """The TimeIndex of an uncompressed partition."""
+        with self._lock:
+            index = self._indexes.get(partition.name)
+            if index is None or index.csv_path != partition.path:
+                index = self._indexes[partition.name] = TimeIndex(partition.path)
+            return index
+
+    def meta(self, partition):
+        """
+        Row count, uncompressed size, first/last timestamp and row checkpoints
+        ([row, uncompressed offset, timestamp] every CHECKPOINT_ROWS rows) of a
+        compressed partition.
+        """
+        meta = self._meta.get(partition.name)
+        if meta is None:
+            meta_path = partition.path[:-3] + META_SUFFIX
+            try:
+                with open(meta_path, 'r') as file:
+                    meta = json.load(file)
+            except (OSError, ValueError):
+                pass
+            if meta is None or 'checkpoints' not in meta:
+                # Compressed by something else, or before checkpoints were kept; measure it once
+                meta = self._measure(partition.path)
+                try:
+                    with open(meta_path, 'w') as file:
+                        json.dump(meta, file)
+                except OSError:
+                    pass
+            self._meta[partition.name] = meta
+        return meta
+
+    @staticmethod
+    def _measure(path):
+        rows, size, first, last, checkpoints = 0, 0, None, None, []
+        with gzip.open(path, 'rb') as file:
+            for i, line in enumerate(file):
+                if i > 0 and line.endswith(b'\n'):
+                    timestamp = line.split(b',', 1)[0].decode('utf-8')
+                    if rows % CHECKPOINT_ROWS == 0:
+                        checkpoints.append([rows, size, timestamp])
+                    first = first or timestamp
+                    last = timestamp
+                    rows += 1
+                size += len(line)
+        return {'rows': rows, 'bytes': size, 'first': first, 'last': last, 'checkpoints': checkpoints}
+
+    def partition_rows(self, partition):
+        if partition.compressed:
+            return self.meta(partition)['rows']
+        return self.index(partition).ensure_loaded().row_count
+
+    # --- Ingestion hooks (called by PartitionedCsvWriter) ---
+
+    def on_rows_written(self, path, rows, offsets, end_offset):
+        name = os.path.basename(path)
+        with self._lock:
+            if self._partitions is not None and (not self._partitions or self._partitions[-1].name != name):
+                self._partitions = None  # The writer started a new partition
+        self.index(Partition(name, path, None, False)).on_rows_written(rows, offsets, end_offset)
+        self.rollups.on_rows_written(rows, offsets, end_offset, path=path)
+
+    def on_partition_closed(self, path):
+        self.compress_in_background([path])
+
+    # --- Compression ---
+
+    def closed_partitions(self):
+        """Uncompressed partitions that are no longer written to: all but the newest."""
+        partitions = self.partitions()
+        return [p for p in partitions[:-1] if not p.compressed]
+
+    def compress_in_background(self, paths=None):
+        """Queues partitions (default: every closed one) for gzip compression on a background thread."""
+        with self._lock:
+            if self._compress_queue is None:
+                self._compress_queue = queue.Queue()
+                threading.Thread(target=self._compress_worker, name="PartitionCompressor", daemon=True).start()
+        for path in paths if paths is not None else [p.path for p in self.closed_partitions()]:
+            self._compress_queue.put(path)
+
+    def _compress_worker(self):
+        while True:
+            path = self._compress_queue.get()
+            try:
+                self.compress(path)
+            except Exception as e:
+                print(f"Error compressing log partition {path}: {e}")
+
+    def compress(self, path):
+        """Gzips one closed partition, then removes the plain file and its time index."""
+        if not os.path.isfile(path):
+            return
+        name = os.path.basename(path)
+        gz_path = path + '.gz'
+        if not os.path.isfile(gz_path):
+            # Make sure the rollups have every row before the plain file goes away
+            self.rollups.sync([path])
+            tmp_path = gz_path + '.tmp'
+            with open(path, 'rb') as source, gzip.open(tmp_path, 'wb') as target:
+                for line in source:
+                    if not line.endswith(b'\n'):
+                        break  # Never compress a torn last line
+                    target.write(line)
+            meta = self._measure(tmp_path)
+            with open(path + META_SUFFIX, 'w') as file:
+                json.dump(meta, file)
+            os.replace(tmp_path, gz_path)
+        with self._lock:
+            self._indexes.pop(name, None)
+            self._meta.pop(name, None)
+            self._partitions = None
+        for leftover in (path, path + '.idx'):
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass  # Already gone, or still open elsewhere (Windows); retried on the next compression pass
+
+    # --- Queries (same interface as TimeIndex) ---
+
+    def load(self):
+        self.refresh()
+        return self
+
+    def ensure_loaded(self):
+        return self
+
+    @property
+    def row_count(self):
+        return sum(self.partition_rows(p) for p in self.partitions())
+
+    def sync_rollups(self):
+        """Brings the rollups up to date with every partition; compressed ones are skipped once merged."""
+        paths = []
+        for partition in self.partitions():
+            if partition.compressed and self.rollups.covered(partition.path) >= self.meta(partition)['bytes']:
+                continue
+            paths.append(partition.path)
+        return self.rollups.sync(paths)
+
+    def bounds(self):
+        """Returns (first, last) timestamp strings across all partitions, or None if there are no rows."""
+        partitions = [p for p in self.partitions() if self.partition_rows(p)]
+        if not partitions:
+            return None
+        return self._partition_bounds(partitions[0])[0], self._partition_bounds(partitions[-1])[1]
+
+    def _partition_bounds(self, partition):
+        if partition.compressed:
+            meta = self.meta(partition)
+            return meta['first'], meta['last']
+        return self.index(partition).bounds()
+
+    def estimate_rows(self, start=None, end=None):
+        total = 0
+        for partition in self.overlapping(start, end):
+            if partition.compressed:
+                total += self.meta(partition)['rows']
+            else:
+                total += self.index(partition).estimate_rows(start, end)
+        return total
+
+    def iter_range(self, start=None, end=None):
+        """Streams the rows with start <= timestamp <= end, opening only the overlapping partitions."""
+        for partition in self.overlapping(start, end):
+            if not partition.compressed:
+                yield from self.index(partition).iter_range(start, end)
+                continue
+            with gzip.open(partition.path, 'rt', newline='') as file:
+                reader = csv.reader(file)
+                next(reader, None)
+                for row in reader:
+                    if not row or (start is not None and row[0] < start):
+                        continue
+                    if end is not None and row[0] > end:
+                        break
+                    yield row
+
+    def read_range(self, start=None, end=None):
+        """The rows for [start, end] as CSV bytes under a single header line, for pd.read_csv."""
+        chunks = [(','.join(self.header) + '\n').encode('utf-8')]
+        start_key = start.encode('utf-8') if start is not None else None
+        end_key = end.encode('utf-8') if end is not None else None
+        for partition in self.overlapping(start, end):
+            if not partition.compressed:
+                index = self.index(partition).ensure_loaded()
+                chunks.append(index.read_range(start, end)[index.data_offset:])
+                continue
+            with gzip.open(partition.path, 'rb') as file:
+                file.readline()
+                for line in file:
+                    timestamp = line.split(b',', 1)[0]
+                    if start_key is not None and timestamp < start_key:
+                        continue
+                    if end_key is not None and timestamp > end_key:
+                        break
+                    chunks.append(line)
+        return b''.join(chunks)
+
+    def _close_cursor(self):
+        if self._cursor is not None:
+            self._cursor[1].close()
+            self._cursor = None
+
+    def _seek_compressed(self, partition, row):
+        """
+        The cursor of a compressed partition, positioned at the start of row
+        number `row`. Paging forward continues from where the last read ended;
+        otherwise the stream restarts at the nearest checkpoint. Call with
+        the lock held.
+        """
+        cursor = self._cursor
+        if cursor is None or cursor[0] != partition.name or cursor[2] > row:
+            self._close_cursor()
+            cursor = self._cursor = [partition.name, gzip.open(partition.path, 'rb'), 0]
+            cursor[1].readline()  # Header
+        checkpoints = self.meta(partition)['checkpoints']
+        i = bisect.bisect_right([checkpoint[0] for checkpoint in checkpoints], row) - 1
+        if i >= 0 and checkpoints[i][0] > cursor[2]:
+            cursor[1].seek(checkpoints[i][1])
+            cursor[2] = checkpoints[i][0]
+        while cursor[2] < row and cursor[1].readline():
+            cursor[2] += 1
+        return cursor
+
+    def _compressed_rows(self, partition, first, count):
+        """Up to `count` rows of a compressed partition from row number `first`, streamed."""
+        with self._lock:
+            cursor = self._seek_compressed(partition, first)
+            rows = []
+            while len(rows) < count:
+                line = cursor[1].readline()
+                if not line.endswith(b'\n'):
+                    break
+                cursor[2] += 1
+                rows.append(next(csv.reader([line.decode('utf-8')]), []))
+            return rows
+
+    def _find_compressed(self, partition, timestamp):
+        """Number of the first row of a compressed partition at or after `timestamp`."""
+        checkpoints = self.meta(partition)['checkpoints']
+        i = max(0, bisect.bisect_left([checkpoint[2] for checkpoint in checkpoints], timestamp) - 1)
+        row = checkpoints[i][0] if checkpoints else 0
+        key = timestamp.encode('utf-8')
+        with self._lock:
+            cursor = self._seek_compressed(partition, row)
+            while True:
+                line = cursor[1].readline()
+                if not line.endswith(b'\n'):
+                    return row
+                cursor[2] += 1
+                if line.split(b',', 1)[0] >= key:
+                    return row
+                row += 1
+
+    def read_rows(self, first, count):
+        """Returns up to `count` rows starting at row number `first`, counted across all partitions."""
+        rows = []
+        base = 0
+        for partition in self.partitions():
+            if len(rows) >= count:
+                break
+            n = self.partition_rows(partition)
+            if first < base + n:
+                local = max(0, first - base)
+                wanted = count - len(rows)
+                if partition.compressed:
+                    rows.extend(self._compressed_rows(partition, local, wanted))
+                else:
+                    rows.extend(self.index(partition).read_rows(local, wanted))
+            base += n
+        return rows
+
+    def find_row(self, timestamp):
+        """Returns the number of the first row at or after `timestamp`, counted across all partitions."""
+        base = 0
+        for partition in self.partitions():
+            n = self.partition_rows(partition)
+            last = self._partition_bounds(partition)[1] if n else None
+            if last is not None and last >= timestamp:
+                if partition.compressed:
+                    return base + self._find_compressed(partition, timestamp)
+                return base + self.index(partition).find_row(timestamp)
+            base += n
+        return base
+
+
+class PartitionedCsvWriter(CsvBatchWriter):
+    """
+    CsvBatchWriter that writes into a PartitionedLog, starting a new partition
+    at midnight (`period='day'`) or when the current file reaches the log's
+    `max_bytes`. Closed partitions are handed to the log for background
+    compression when `compress` is set.
+
+    Listeners are called as `listener(path, rows, offsets, end_offset)`; the
+    log's own indexes and rollups are always updated.
+    """
+
+    def __init__(self, log, period=PARTITION_DAY, compress=True, listeners=(), **kwargs):
+        super().__init__(log.csv_path, **kwargs)
+        self.log = log
+        self.period = period
+        self.compress = compress
+        self.listeners = [log.on_rows_written] + list(listeners)
+        self._day = None
+
+    def _rolls_over(self, row):
+        if self.period == PARTITION_DAY and row[0][:10] != self._day:
+            return True
+        return self._file.tell() >= self.log.max_bytes
+
+    def _close_partition(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        self._unsynced = False
+        if self.compress:
+            self.log.on_partition_closed(self.path)
+
+    def _write_batch(self, batch, force_sync=False):
+        if not batch:
+            super()._write_batch(batch, force_sync)
+            return
+        while batch:
+            if self._file is not None and self._rolls_over(batch[0]):
+                self._close_partition()
+            if self._file is None:
+                self.path = self.log.writable_path(batch[0][0])
+                self._day = batch[0][0][:10]
+            # Write up to the first row of the next day; the size limit is checked between batches
+            run = 1
+            while run < len(batch) and (self.period != PARTITION_DAY or batch[run][0][:10] == self._day):
+                run += 1
+            rows = batch[:run]
+            del batch[:run]
+            super()._write_batch(rows, force_sync)
+
+    def _notify(self, rows, offsets, end_offset):
+        for listener in self.listeners:
+            try:
+                listener(self.path, rows, offsets, end_offset)
+            except Exception as e:
+                print(f"Error in CSV writer listener: {e}")
+
+
+
+class LogTail:
+    """
+    Follows a PartitionedLog that another process is writing, like `tail -f`.
+
+    Each `poll()` reads only the bytes appended to the newest partition since
+    the previous poll and returns them as rows, so its cost depends on how
+    much arrived, not on how much history exists. When it first attaches it
+    starts `backfill_bytes` before the end, to show the most recent rows
+    straight away. When the writer moves on to a new partition, the tail
+    finishes the old one and continues at the start of the new one.
+    """
+
+    def __init__(self, log, backfill_bytes=TAIL_BACKFILL_BYTES):
+        self.log = log
+        self.backfill_bytes = backfill_bytes
+        self.path = None
+        self.offset = 0
+        self._carry = b''
+        self._skip_partial = False
+
+    def _newest(self):
+        self.log.refresh()
+        partitions = self.log.partitions()
+        if partitions and not partitions[-1].compressed:
+            return partitions[-1].path
+        return None
+
+    def _attach(self, path, from_end):
+        with open(path, 'rb') as file:
+            header_length = len(file.readline())
+        size = os.path.getsize(path)
+        self.path = path
+        self.offset = max(header_length, size - self.backfill_bytes) if from_end else header_length
+        self._carry = b''
+        self._skip_partial = self.offset > header_length  # Landed inside a row; drop its tail
+
+    def _read_new(self):
+        try:
+            if os.path.getsize(self.path) < self.offset:
+                self._attach(self.path, from_end=False)  # Truncated or replaced
+            with open(self.path, 'rb') as file:
+                file.seek(self.offset)
+                chunk = file.read()
+        except FileNotFoundError:
+            # Compressed under us; offsets refer to the uncompressed data, so finish reading the .gz
+            try:
+                with gzip.open(self.path + '.gz', 'rb') as file:
+                    file.seek(self.offset)
+                    chunk = file.read()
+            except OSError:
+                return []
+        self.offset += len(chunk)
+        lines = (self._carry + chunk).split(b'\n')
+        self._carry = lines.pop()
+        if self._skip_partial and lines:
+            lines.pop(0)
+            self._skip_partial = False
+        return [row for row in csv.reader(line.decode('utf-8') for line in lines) if row]
+
+    def poll(self):
+        """Returns the rows appended since the last call (lists of strings)."""
+        if self.path is None:
+            newest = self._newest()
+            if newest is None:
+                return []
+            self._attach(newest, from_end=True)
+        rows = self._read_new()
+        if not rows:
+            # Nothing new: check whether the writer has started another partition
+            newest = self._newest()
+            if newest is not None and newest != self.path:
+                rows = self._read_new()
+                self._attach(newest, from_end=False)
+                rows += self._read_new()
+        return rows
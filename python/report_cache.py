@@ -0,0 +1,103 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+REPORT_CACHE_DIR = os.path.join('reports', 'cache')
+REPORT_CACHE_MAX_BYTES = 256 * 1024 * 1024  # Least recently used entries are evicted above this size
+CACHE_SUFFIX = '.pkl'
+
+
+class ReportCache:
+    """
+    Disk cache of computed report content, one pickle file per entry.
+
+    An entry's mtime is its last use: `get()` touches it, and once the
+    directory grows past `max_bytes`, `put()` deletes the least recently
+    used entries. Entries are replaced atomically, so report worker
+    processes can share one cache directory without a common index.
+    """
+
+    def __init__(self, directory=REPORT_CACHE_DIR, max_bytes=REPORT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(*parts):
+        """A file-name-safe key for any tuple of reprs (strings, numbers, None, tuples)."""
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def get(self, key):
+        """The cached entry, or None."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                entry = pickle.load(file)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+            print(f"Warning: dropping unreadable report cache entry {path}: {e}")
+            self._remove(path)
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # Evicted by another process meanwhile
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            self._remove(temp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Deletes least recently used entries until the cache fits in `max_bytes`."""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not name.endswith(CACHE_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        self.max_bytes, max_bytes = 0, self.max_bytes
+        try:
+            self.evict()
+        finally:
+            self.max_bytes = max_bytes
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,191 @@
+"""
+Runs report generation in worker processes.
+
+The GUI submits jobs through ReportJobManager, which reports progress and
+supports cancellation without blocking the Tk main thread. Run as a
+script, this module renders one report per day/week for a date range
+across all cores:
+
+    python report_jobs.py --start 2025-07-01 --end 2025-07-31 --period day
+"""
+import argparse
+import itertools
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from metrics import Histogram
+from partitions import PartitionedLog
+from sqlite_log import BINARY_BACKEND, SQLITE_BACKEND, SQLITE_DB, STORAGE_BACKENDS, SqliteLog
+
+DONE_PHASE = "Done"  # Last phase reported by generate_report
+PERIODS = {'hour': timedelta(hours=1), 'day': timedelta(days=1), 'week': timedelta(weeks=1)}
+
+
+class ReportCancelled(Exception):
+    """Raised from a progress callback to abandon a report that is being generated."""
+
+
+def _run_job(job_id, options, progress_queue, cancel_event):
+    """Worker-process entry point: generates one report and streams its progress back."""
+    # Imported here so the GUI can submit jobs without loading pandas, matplotlib and fpdf itself
+    from generate_report import generate_report
+
+    def progress(phase, fraction):
+        if cancel_event is not None and cancel_event.is_set():
+            raise ReportCancelled()
+        if progress_queue is not None:
+            # Wall-clock time, so the GUI can time each phase of a job that ran in another process
+            progress_queue.put((job_id, phase, fraction, time.time()))
+
+    return generate_report(progress=progress, **options)
+
+
+class ReportJob:
+    def __init__(self, job_id, future, cancel_event):
+        self.job_id = job_id
+        self.future = future
+        self.cancel_event = cancel_event
+
+    def cancel(self):
+        """Cancels a queued job outright, or stops a running one at its next phase."""
+        self.cancel_event.set()
+        self.future.cancel()
+
+
+class ReportJobManager:
+    """
+    Submits report jobs to a process pool. Progress updates are collected in
+    a queue that the GUI drains with `poll_progress()` from a Tk timer.
+
+    Draining the queue also times each phase (from one progress update to
+    the next) into `phase_seconds` and whole jobs into `job_seconds`.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self._executor = None
+        self._manager = None
+        self._progress_queue = None
+        self._ids = itertools.count(1)
+        self.phase_seconds = {}   # Phase name -> Histogram
+        self.job_seconds = Histogram()
+        self._current_phase = {}  # job_id -> (phase, phase started, job started)
+
+    def _ensure_started(self):
+        if self._executor is None:
+            # Spawned (not forked) workers, so they never inherit the GUI's Tk state or threads.
+            # Manager queues and events can be handed to them on every platform.
+            context = multiprocessing.get_context('spawn')
+            self._manager = context.Manager()
+            self._progress_queue = self._manager.Queue()
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+
+    def submit(self, **options):
+        """Queues generate_report(**options). Returns a ReportJob."""
+        self._ensure_started()
+        job_id = next(self._ids)
+        cancel_event = self._manager.Event()
+        future = self._executor.submit(_run_job, job_id, options, self._progress_queue, cancel_event)
+        return ReportJob(job_id, future, cancel_event)
+
+    def poll_progress(self):
+        """Returns every (job_id, phase, fraction) update received since the last call."""
+        updates = []
+        if self._progress_queue is None:
+            return updates
+        while True:
+            try:
+                job_id, phase, fraction, at = self._progress_queue.get_nowait()
+            except (queue.Empty, EOFError, OSError):
+                return updates
+            self._time_phase(job_id, phase, at)
+            updates.append((job_id, phase, fraction))
+
+    def _time_phase(self, job_id, phase, at):
+        previous = self._current_phase.pop(job_id, None)
+        job_started = at
+        if previous is not None:
+            previous_phase, phase_started, job_started = previous
+            histogram = self.phase_seconds.get(previous_phase)
+            if histogram is None:
+                histogram = self.phase_seconds[previous_phase] = Histogram()
+            histogram.observe(at - phase_started)
+        if phase == DONE_PHASE:
+            self.job_seconds.observe(at - job_started)
+        else:
+            self._current_phase[job_id] = (phase, at, job_started)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+
+# --- Batch command line ---
+
+def iter_ranges(start, end, period):
+    step = PERIODS[period]
+    current = start
+    while current <= end:
+        yield current, min(current + step - timedelta(seconds=1), end)
+        current += step
+
+
+def main():
+    from generate_report import CSV_FILE, REPORTS_DIR, STORAGE_BACKEND
+
+    ap = argparse.ArgumentParser(description="Render one PDF report per period across all cores.")
+    ap.add_argument('--start', required=True, help="First day, YYYY-MM-DD")
+    ap.add_argument('--end', required=True, help="Last day, YYYY-MM-DD (inclusive)")
+    ap.add_argument('--period', choices=sorted(PERIODS), default='day')
+    ap.add_argument('--jobs', type=int, default=os.cpu_count(), help="Worker processes (default: all cores)")
+    ap.add_argument('--out', default=os.path.join(REPORTS_DIR, 'batch'), help="Output directory")
+    ap.add_argument('--decimation', choices=('lttb', 'minmax'), default='lttb')
+    ap.add_argument('--bands', action='store_true', help="Overlay min/max bands")
+    ap.add_argument('--format', choices=('png', 'svg'), default='png', help="Graph image format (svg is vector)")
+    ap.add_argument('--backend', choices=STORAGE_BACKENDS, default=STORAGE_BACKEND, help="Log storage to read")
+    args = ap.parse_args()
+
+    start = datetime.strptime(args.start, '%Y-%m-%d')
+    end = datetime.strptime(args.end, '%Y-%m-%d') + timedelta(days=1) - timedelta(seconds=1)
+    os.makedirs(args.out, exist_ok=True)
+
+    # Bring the index and rollups up to date once, instead of in every worker
+    if args.backend == BINARY_BACKEND:
+        from sample_log import SAMPLE_LOG, SampleLog
+        SampleLog(SAMPLE_LOG).sync_rollups()
+    elif args.backend == SQLITE_BACKEND:
+        SqliteLog(SQLITE_DB).sync_rollups()
+    else:
+        PartitionedLog(CSV_FILE).sync_rollups()
+
+    jobs = {}
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for range_start, range_end in iter_ranges(start, end, args.period):
+            output_path = os.path.join(args.out, f"Sensor_Report_{range_start:%Y%m%d_%H%M}.pdf")
+            options = dict(start_date=f"{range_start:%Y-%m-%d %H:%M:%S}", end_date=f"{range_end:%Y-%m-%d %H:%M:%S}",
+                           decimation=args.decimation, show_bands=args.bands, graph_format=args.format,
+                           backend=args.backend, output_path=output_path)
+            jobs[pool.submit(_run_job, None, options, None, None)] = range_start
+
+        done = failed = 0
+        for future in as_completed(jobs):
+            try:
+                future.result()
+                done += 1
+            except Exception as e:
+                failed += 1
+                print(f"❌ {jobs[future]:%Y-%m-%d %H:%M}: {e}")
+
+    print(f"✅ Batch finished: {done} reports written to {args.out}, {failed} skipped.")
+
+
+if __name__ == '__main__':
+    main()
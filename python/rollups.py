@@ -0,0 +1,565 @@
+import csv
+import gzip
+import json
+import math
+import os
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+ROLLUP_SUFFIX = '.rollups.db'
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+SKETCH_SCALE = 100  # The log stores values with two decimals, so the histogram sketch is exact
+BUCKET_CACHE_SIZE = 64  # Decoded buckets kept by the writer; the current day's sketch is large to decode
+PARALLEL_SYNC_BYTES = 64 * 1024 * 1024  # Larger backlogs are merged with a multi-core scan (chunked_scan.py)
+
+# Rollup levels, coarsest first: (name, length of the timestamp prefix that identifies a bucket)
+LEVELS = (
+    ('day', 10),     # "2025-07-24"
+    ('hour', 13),    # "2025-07-24 01"
+    ('minute', 16),  # "2025-07-24 01:18"
+)
+METRICS = (('temp', 'Temperature_C'), ('hum', 'Humidity_Percent'))
+WINDOW_COLUMNS = slice(4, 9)  # Temperature_Min, _Max, Humidity_Min, _Max, Samples of a window record (aggregation.py)
+
+
+class MetricState:
+    """
+    Mergeable summary of one metric: count, Welford mean/M2, min, max and a
+    histogram sketch (value * 100 -> count) that gives the exact median.
+    """
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max', 'hist')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.hist = Counter()
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.hist[round(value * SKETCH_SCALE)] += 1
+
+    def add_window(self, mean, minimum, maximum, samples):
+        """
+        Adds `samples` readings known only by their mean, min and max (a
+        window record). Count, mean, min and max stay exact; the spread
+        inside the window is unknown, so std and median use the mean.
+        """
+        other = MetricState()
+        other.count, other.mean, other.min, other.max = samples, mean, minimum, maximum
+        other.hist[round(mean * SKETCH_SCALE)] = samples
+        return self.merge(other)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            self.hist = Counter(other.hist)
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.hist.update(other.hist)
+        return self
+
+    @property
+    def std(self):
+        """Sample standard deviation (ddof=1), as pandas computes it."""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else math.nan
+
+    @property
+    def median(self):
+        if self.count == 0:
+            return math.nan
+        # Average of the two middle values for an even count, like pandas
+        lower, upper = (self.count - 1) // 2, self.count // 2
+        seen, low_value = 0, None
+        for key in sorted(self.hist):
+            seen += self.hist[key]
+            if low_value is None and seen > lower:
+                low_value = key
+            if seen > upper:
+                return (low_value + key) / 2 / SKETCH_SCALE
+        return math.nan
+
+    def to_columns(self):
+        return (self.count, self.mean, self.m2, self.min, self.max,
+                json.dumps(self.hist))  # Integer keys are written as strings
+
+    @classmethod
+    def from_columns(cls, count, mean, m2, min_, max_, hist):
+        state = cls()
+        state.count, state.mean, state.m2, state.min, state.max = count, mean, m2, min_, max_
+        state.hist = Counter({int(k): v for k, v in json.loads(hist).items()})
+        return state
+
+
+class BucketState:
+    """Summary of every row that falls in one rollup bucket (or any merged range)."""
+    __slots__ = ('first', 'last', 'temp', 'hum')
+
+    def __init__(self):
+        self.first = None
+        self.last = None
+        self.temp = MetricState()
+        self.hum = MetricState()
+
+    def add(self, timestamp, temp, humidity):
+        self._extend(timestamp)
+        self.temp.add(temp)
+        self.hum.add(humidity)
+
+    def add_row(self, row):
+        """
+        Adds a log row: one reading, or a window record weighted by its
+        sample count. Raises ValueError or IndexError for a malformed row.
+        """
+        temp, humidity = float(row[1]), float(row[2])
+        if len(row) < WINDOW_COLUMNS.stop or row[WINDOW_COLUMNS.stop - 1] in ('', None):
+            self.add(row[0], temp, humidity)
+            return
+        temp_min, temp_max, hum_min, hum_max, samples = (float(value) for value in row[WINDOW_COLUMNS])
+        if samples < 1 or not samples.is_integer():
+            raise ValueError(f"Window record with {samples} samples")
+        self._extend(row[0])
+        self.temp.add_window(temp, temp_min, temp_max, int(samples))
+        self.hum.add_window(humidity, hum_min, hum_max, int(samples))
+
+    def _extend(self, timestamp):
+        if self.first is None or timestamp < self.first:
+            self.first = timestamp
+        if self.last is None or timestamp > self.last:
+            self.last = timestamp
+
+    def merge(self, other):
+        if other.first is not None and (self.first is None or other.first < self.first):
+            self.first = other.first
+        if other.last is not None and (self.last is None or other.last > self.last):
+            self.last = other.last
+        self.temp.merge(other.temp)
+        self.hum.merge(other.hum)
+        return self
+
+    @property
+    def count(self):
+        return self.temp.count
+
+    def metric(self, column):
+        """Returns the MetricState for a log column name such as 'Temperature_C'."""
+        return self.temp if column == 'Temperature_C' else self.hum
+
+
+def _columns_sql():
+    cols = ['bucket TEXT PRIMARY KEY', 'first_ts TEXT', 'last_ts TEXT']
+    for prefix, _ in METRICS:
+        cols += [f'{prefix}_count INTEGER', f'{prefix}_mean REAL', f'{prefix}_m2 REAL',
+                 f'{prefix}_min REAL', f'{prefix}_max REAL', f'{prefix}_hist TEXT']
+    return ', '.join(cols)
+
+
+def _parse_ts(timestamp):
+    return datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+
+
+def _format_ts(moment):
+    return moment.strftime(TIMESTAMP_FORMAT)
+
+
+def _floor(moment, level):
+    if level == 'day':
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if level == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(second=0, microsecond=0)
+
+
+def _ceil(moment, level):
+    floor = _floor(moment, level)
+    return floor if floor == moment else floor + _LEVEL_STEP[level]
+
+
+_LEVEL_STEP = {'day': timedelta(days=1), 'hour': timedelta(hours=1), 'minute': timedelta(minutes=1)}
+
+
+class RollupStore:
+    """
+    Per-minute, per-hour and per-day rollups of the CSV log, kept in SQLite
+    next to it (`data/data.csv.rollups.db`).
+
+    Ingestion feeds it through `on_rows_written` (a CsvBatchWriter listener),
+    which merges each batch into the buckets it touches. `stats()` answers a
+    date range from the coarsest buckets that fit inside it and reads raw
+    rows from the log only for the partial minutes at either edge.
+
+    A store can summarise several source files (the partitions of a
+    PartitionedLog); how far each one has been merged is tracked per file
+    name, so a partition that is later gzip-compressed is not merged twice.
+    A backlog of more than PARALLEL_SYNC_BYTES (an existing log seen for the
+    first time) is summarised per minute on all cores by chunked_scan.py.
+    """
+
+    def __init__(self, csv_path, db_path=None, time_index=None):
+        self.csv_path = csv_path
+        self.db_path = db_path or csv_path + ROLLUP_SUFFIX
+        self.time_index = time_index
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._bucket_cache = {}  # (level, bucket) -> BucketState as last stored by this process
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Report jobs in other processes may be syncing at the same time; wait for their lock
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            for level, _ in LEVELS:
+                conn.execute(f"CREATE TABLE IF NOT EXISTS rollup_{level} ({_columns_sql()})")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- Ingestion ---
+
+    def _get_meta(self, conn, key, default=None):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, conn, key, value):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _meta_key(self, key, path):
+        """Meta keys of the main log are unqualified; other source files get their name appended."""
+        name = os.path.basename(path)
+        if name.endswith('.gz'):
+            name = name[:-3]
+        return key if name == os.path.basename(self.csv_path) else f"{key}:{name}"
+
+    def on_rows_written(self, rows, offsets, end_offset, path=None):
+        """CsvBatchWriter listener: merges a written batch (of `path`, default the log) into its buckets."""
+        if not rows:
+            return
+        path = path or self.csv_path
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            covered = int(self._get_meta(conn, self._meta_key('end_offset', path), -1))
+            if covered != offsets[0]:
+                # Rollups are behind the log (new store, or rows from another writer)
+                self._sync(conn, path, limit=offsets[0])
+            self._merge_rows(conn, rows)
+            self._set_meta(conn, self._meta_key('end_offset', path), end_offset)
+            conn.commit()
+
+    def sync(self, paths=None):
+        """Brings the rollups up to date with every complete row in the log (or in each of `paths`)."""
+        with self._lock:
+            conn = self._connect()
+            # Take the write lock before reading the covered offset, so two processes never merge the same rows
+            conn.execute("BEGIN IMMEDIATE")
+            for path in paths or [self.csv_path]:
+                self._sync(conn, path)
+            conn.commit()
+        return self
+
+    def rebuild(self, paths=None):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            for level, _ in LEVELS:
+                conn.execute(f"DELETE FROM rollup_{level}")
+            conn.execute("DELETE FROM meta")
+            for path in paths or [self.csv_path]:
+                self._sync(conn, path)
+            conn.commit()
+        return self
+
+    def covered(self, path=None):
+        """Byte offset up to which `path` (default the log) has been merged, or -1."""
+        key = self._meta_key('end_offset', path or self.csv_path)
+        return int(self._get_meta(self._connect(), key, -1))
+
+    def _sync(self, conn, path, limit=None, batch_rows=10000):
+        if not os.path.isfile(path):
+            return
+        compressed = path.endswith('.gz')
+        covered = int(self._get_meta(conn, self._meta_key('end_offset', path), -1))
+        # Offsets always refer to the uncompressed CSV, so they survive compression
+        with (gzip.open(path, 'rb') if compressed else open(path, 'rb')) as file:
+            header = file.readline()
+            first_row = file.readline().decode('utf-8')
+            if not first_row.endswith('\n'):
+                first_row = ''  # No complete data row yet
+            truncated = not compressed and covered > os.path.getsize(path)
+            known_first_row = self._get_meta(conn, self._meta_key('first_row', path)) or first_row
+            if truncated or (first_row and known_first_row != first_row):
+                # The file was replaced or truncated; start over. Other sources are re-merged on their next sync.
+                for level, _ in LEVELS:
+                    conn.execute(f"DELETE FROM rollup_{level}")
+                conn.execute("DELETE FROM meta")
+                covered = -1
+            if covered < len(header):
+                covered = len(header)
+            self._set_meta(conn, self._meta_key('first_row', path), first_row)
+            if not compressed and limit is None and os.path.getsize(path) - covered >= PARALLEL_SYNC_BYTES:
+                # A large existing log: summarise it per minute on all cores, then merge the minutes
+                from chunked_scan import scan_minutes
+                minutes, covered = scan_minutes(path, covered)
+                self._merge_minutes(conn, minutes)
+                self._set_meta(conn, self._meta_key('end_offset', path), covered)
+                return
+            file.seek(covered)
+            batch = []
+            for line in file:
+                if not line.endswith(b'\n') or (limit is not None and covered >= limit):
+                    break
+                covered += len(line)
+                row = next(csv.reader([line.decode('utf-8')]), None)
+                if row and len(row) >= 3:
+                    batch.append(row)
+                if len(batch) >= batch_rows:
+                    self._merge_rows(conn, batch)
+                    batch = []
+            self._merge_rows(conn, batch)
+        self._set_meta(conn, self._meta_key('end_offset', path), covered)
+
+    def merge_rows(self, conn, rows):
+        """
+        Merges rows into their buckets inside the caller's transaction on
+        `conn`, for logs that keep the rollup tables in their own database
+        (SqliteLog) instead of syncing from CSV files.
+        """
+        with self._lock:
+            self._merge_rows(conn, rows)
+
+    def sync_counted(self, count, identity, read_rows, batch_rows=50000):
+        """
+        Brings the rollups up to date with a log that numbers its rows
+        instead of tracking byte offsets (SampleLog). `read_rows(begin, stop)`
+        returns rows [begin, stop) of the log, which holds `count` rows;
+        `identity` (e.g. the first row's timestamp) tells a replaced log from
+        one that has only grown, and a replaced one is merged from scratch.
+        """
+        with self._lock:
+            conn = self._connect()
+            # Report jobs in other processes may sync at the same time; the write lock keeps merges single
+            conn.execute("BEGIN IMMEDIATE")
+            covered = int(self._get_meta(conn, 'records', 0))
+            if covered > count or (covered and self._get_meta(conn, 'first_ts') != identity):
+                for level, _ in LEVELS:
+                    conn.execute(f"DELETE FROM rollup_{level}")
+                conn.execute("DELETE FROM meta")
+                covered = 0
+            for begin in range(covered, count, batch_rows):
+                self._merge_rows(conn, read_rows(begin, min(begin + batch_rows, count)))
+            self._set_meta(conn, 'records', count)
+            if identity is not None:
+                self._set_meta(conn, 'first_ts', identity)
+            conn.commit()
+        return self
+
+    def merge_counted(self, rows, first, end, identity=None):
+        """
+        Merges the rows numbered [first, end) of such a log, as they are
+        written. Returns False without merging when the rollups do not hold
+        exactly the `first` rows before them; the caller then catches up
+        with `sync_counted()`. `identity` is recorded with the first rows.
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            if int(self._get_meta(conn, 'records', 0)) != first:
+                conn.rollback()
+                return False
+            self._merge_rows(conn, rows)
+            self._set_meta(conn, 'records', end)
+            if first == 0 and identity is not None:
+                self._set_meta(conn, 'first_ts', identity)
+            conn.commit()
+        return True
+
+    def _merge_rows(self, conn, rows):
+        if not rows:
+            return
+        for level, prefix_length in LEVELS:
+            buckets = {}
+            for row in rows:
+                key = row[0][:prefix_length] if row else None
+                state = buckets.get(key) or BucketState()
+                try:
+                    state.add_row(row)  # Leaves the state as it was if the row is malformed
+                except (ValueError, IndexError):
+                    continue
+                buckets[key] = state
+            for key, state in buckets.items():
+                existing = self._load_bucket(conn, level, key)
+                if existing is not None:
+                    state = existing.merge(state)
+                self._store_bucket(conn, level, key, state)
+
+    def _merge_minutes(self, conn, minutes):
+        """Merges {minute bucket key: BucketState} into every level, like _merge_rows does with rows."""
+        for level, prefix_length in LEVELS:
+            buckets = {}
+            for minute, state in minutes.items():
+                key = minute[:prefix_length]
+                if key in buckets:
+                    buckets[key].merge(state)
+                else:
+                    buckets[key] = BucketState().merge(state)
+            for key, state in buckets.items():
+                existing = self._load_bucket(conn, level, key)
+                if existing is not None:
+                    state = existing.merge(state)
+                self._store_bucket(conn, level, key, state)
+
+    def _load_bucket(self, conn, level, key):
+        cached = self._bucket_cache.get((level, key))
+        if cached is not None:
+            # Still valid unless another process has merged rows into the bucket since
+            row = conn.execute(f"SELECT temp_count, last_ts FROM rollup_{level} WHERE bucket = ?", (key,)).fetchone()
+            if row is not None and row[0] == cached.count and row[1] == cached.last:
+                return cached
+        row = conn.execute(f"SELECT * FROM rollup_{level} WHERE bucket = ?", (key,)).fetchone()
+        return self._row_to_state(row) if row else None
+
+    @staticmethod
+    def _row_to_state(row):
+        state = BucketState()
+        state.first, state.last = row[1], row[2]
+        state.temp = MetricState.from_columns(*row[3:9])
+        state.hum = MetricState.from_columns(*row[9:15])
+        return state
+
+    def _store_bucket(self, conn, level, key, state):
+        values = (key, state.first, state.last) + state.temp.to_columns() + state.hum.to_columns()
+        conn.execute(f"INSERT OR REPLACE INTO rollup_{level} VALUES ({', '.join('?' * len(values))})", values)
+        if len(self._bucket_cache) >= BUCKET_CACHE_SIZE:
+            self._bucket_cache.clear()
+        self._bucket_cache[(level, key)] = state
+
+    # --- Queries ---
+
+    def buckets(self, level, start=None, end=None):
+        """Returns [(bucket_key, BucketState)] for buckets of `level` whose rows lie in [start, end]."""
+        where, params = self._range_clause(start, end)
+        rows = self._connect().execute(f"SELECT * FROM rollup_{level}{where} ORDER BY bucket", params)
+        return [(row[0], self._row_to_state(row)) for row in rows]
+
+    def _range_clause(self, start, end):
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("first_ts >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("last_ts <= ?")
+            params.append(end)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def count_buckets(self, level, start=None, end=None):
+        where, params = self._range_clause(start, end)
+        return self._connect().execute(f"SELECT COUNT(*) FROM rollup_{level}{where}", params).fetchone()[0]
+
+    def series(self, level, start=None, end=None):
+        """
+        Returns (first_ts, temp_mean, temp_min, temp_max, hum_mean, hum_min, hum_max)
+        rows for the buckets of `level` in [start, end], without loading the sketches.
+        """
+        where, params = self._range_clause(start, end)
+        return self._connect().execute(
+            "SELECT first_ts, temp_mean, temp_min, temp_max, hum_mean, hum_min, hum_max "
+            f"FROM rollup_{level}{where} ORDER BY bucket", params).fetchall()
+
+    def finest_level(self, max_buckets, start=None, end=None):
+        """Returns the finest rollup level with at most `max_buckets` buckets in the range."""
+        for level, _ in reversed(LEVELS):
+            if self.count_buckets(level, start, end) <= max_buckets:
+                return level
+        return LEVELS[0][0]
+
+    def stats(self, start=None, end=None):
+        """
+        Returns a BucketState summarising every row with start <= timestamp <= end
+        (timestamp strings in the log's format; None means open-ended).
+        """
+        conn = self._connect()
+        if start is None or end is None:
+            bounds = conn.execute("SELECT MIN(first_ts), MAX(last_ts) FROM rollup_day").fetchone()
+            if bounds[0] is None:
+                return BucketState()
+            start = start or bounds[0]
+            end = end or bounds[1]
+
+        # Work on the half-open range [start, end + 1s) at one-second resolution
+        begin, stop = _parse_ts(start), _parse_ts(end) + timedelta(seconds=1)
+        result = BucketState()
+        edges = []
+        self._cover(conn, begin, stop, [level for level, _ in LEVELS], result, edges)
+        for edge_start, edge_stop in edges:
+            result.merge(self._raw_stats(_format_ts(edge_start), _format_ts(edge_stop - timedelta(seconds=1))))
+        return result
+
+    def _cover(self, conn, begin, stop, levels, result, edges):
+        """Merges whole buckets inside [begin, stop) into `result`; collects uncovered edges."""
+        if begin >= stop:
+            return
+        if not levels:
+            edges.append((begin, stop))
+            return
+        level, finer = levels[0], levels[1:]
+        lo, hi = _ceil(begin, level), _floor(stop, level)
+        if lo >= hi:
+            self._cover(conn, begin, stop, finer, result, edges)
+            return
+        prefix_length = dict(LEVELS)[level]
+        rows = conn.execute(
+            f"SELECT * FROM rollup_{level} WHERE bucket >= ? AND bucket < ?",
+            (_format_ts(lo)[:prefix_length], _format_ts(hi)[:prefix_length]))
+        for row in rows:
+            result.merge(self._row_to_state(row))
+        self._cover(conn, begin, lo, finer, result, edges)
+        self._cover(conn, hi, stop, finer, result, edges)
+
+    def _raw_stats(self, start, end):
+        state = BucketState()
+        if self.time_index is not None:
+            rows = self.time_index.ensure_loaded().iter_range(start, end)
+        else:
+            rows = self._scan_rows(start, end)
+        for row in rows:
+            try:
+                state.add_row(row)
+            except (ValueError, IndexError):
+                continue
+        return state
+
+    def _scan_rows(self, start, end):
+        with open(self.csv_path, 'r', newline='') as file:
+            reader = csv.reader(file)
+            next(reader, None)
+            for row in reader:
+                if row and start <= row[0] <= end:
+                    yield row
@@ -0,0 +1,259 @@
+import os
+import threading
+import time
+from datetime import datetime
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from ingestion import Reading
+from metrics import Histogram
+
+BUS_NAME = 'sensor_sample_bus'
+BUS_CAPACITY = 65536   # Samples kept; about 55 minutes of one board at 20 Hz
+MAX_DEVICES = 16
+DEVICE_NAME_BYTES = 64
+
+MAGIC = 0x53454E53  # "SENS"
+VERSION = 1
+# Header slots (int64)
+_H_MAGIC, _H_VERSION, _H_CAPACITY, _H_WRITE_SEQ, _H_DEVICES, _H_WRITER_PID = range(6)
+HEADER_SLOTS = 8
+
+SAMPLE_DTYPE = np.dtype([
+    ('seq', '<i8'),     # Sequence number of the sample; -1 while the slot is being rewritten
+    ('ts', '<i8'),      # Local time of the read, nanoseconds since the epoch
+    ('temp', '<f8'),
+    ('hum', '<f8'),
+    ('device', '<i4'),  # Index into the bus's device name table
+], align=True)
+
+
+class SampleBus:
+    """
+    Fixed-size ring of recent samples in shared memory, written by one
+    process (sensor_daemon.py) and read by any number of others.
+
+    The segment holds a small int64 header, a device name table and a NumPy
+    record array of `capacity` samples. The writer stores sample `seq` in
+    slot `seq % capacity` and then advances the header's write sequence.
+    There are no locks. A reader copies the slots it wants and keeps only
+    the records whose `seq` is still the expected one after the copy, so a
+    slot overwritten mid-read is dropped, never returned half-written.
+
+    `records` is a zero-copy view of the ring for readers that want to do
+    their own NumPy work on it.
+    """
+
+    def __init__(self, shm, owner):
+        self._shm = shm
+        self.owner = owner
+        self.name = shm.name
+        self.header = np.ndarray((HEADER_SLOTS,), dtype='<i8', buffer=shm.buf)
+        if self.header[_H_MAGIC] != MAGIC or self.header[_H_VERSION] != VERSION:
+            raise ValueError(f"Shared memory '{shm.name}' is not a sensor sample bus.")
+        self.capacity = int(self.header[_H_CAPACITY])
+        names_offset = HEADER_SLOTS * 8
+        self._names = np.ndarray((MAX_DEVICES, DEVICE_NAME_BYTES), dtype='u1', buffer=shm.buf, offset=names_offset)
+        records_offset = names_offset + MAX_DEVICES * DEVICE_NAME_BYTES
+        self.records = np.ndarray((self.capacity,), dtype=SAMPLE_DTYPE, buffer=shm.buf, offset=records_offset)
+        self._device_ids = {}
+        self._device_names = {}
+
+    @staticmethod
+    def _size(capacity):
+        return HEADER_SLOTS * 8 + MAX_DEVICES * DEVICE_NAME_BYTES + capacity * SAMPLE_DTYPE.itemsize
+
+    @classmethod
+    def create(cls, name=BUS_NAME, capacity=BUS_CAPACITY):
+        """Creates the bus (replacing a stale one left by a crashed daemon). Only the daemon does this."""
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls._size(capacity))
+        header = np.ndarray((HEADER_SLOTS,), dtype='<i8', buffer=shm.buf)
+        header[:] = 0
+        header[_H_CAPACITY] = capacity
+        header[_H_WRITER_PID] = os.getpid()
+        header[_H_VERSION] = VERSION
+        header[_H_MAGIC] = MAGIC
+        bus = cls(shm, owner=True)
+        bus.records['seq'] = -1
+        return bus
+
+    @classmethod
+    def attach(cls, name=BUS_NAME):
+        """Attaches to a running daemon's bus. Raises FileNotFoundError if there is none."""
+        shm = shared_memory.SharedMemory(name=name)
+        # Readers must not unlink the segment when they exit (Python < 3.13 tracks attached segments too)
+        try:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+        return cls(shm, owner=False)
+
+    @staticmethod
+    def exists(name=BUS_NAME):
+        try:
+            shared_memory.SharedMemory(name=name).close()
+            return True
+        except (FileNotFoundError, OSError):
+            return False
+
+    def close(self):
+        self.header = self._names = self.records = None
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+    # --- Writer ---
+
+    @property
+    def write_seq(self):
+        """Number of samples published so far; the next sample gets this sequence number."""
+        return int(self.header[_H_WRITE_SEQ])
+
+    @property
+    def writer_pid(self):
+        return int(self.header[_H_WRITER_PID])
+
+    def _device_index(self, device_id):
+        index = self._device_ids.get(device_id)
+        if index is None:
+            index = int(self.header[_H_DEVICES])
+            if index >= MAX_DEVICES:
+                index = MAX_DEVICES - 1  # Out of slots: share the last one
+            else:
+                encoded = device_id.encode('utf-8')[:DEVICE_NAME_BYTES - 1]
+                self._names[index, :] = 0
+                self._names[index, :len(encoded)] = np.frombuffer(encoded, dtype='u1')
+                self.header[_H_DEVICES] = index + 1
+            self._device_ids[device_id] = index
+        return index
+
+    def publish(self, readings):
+        """Appends a batch of ingestion Readings to the ring."""
+        seq = self.write_seq
+        for reading in readings:
+            slot = self.records[seq % self.capacity]
+            slot['seq'] = -1  # Readers copying this slot now will discard it
+            slot['ts'] = int(reading.timestamp.timestamp() * 1e9)
+            slot['temp'] = reading.temp
+            slot['hum'] = reading.humidity
+            slot['device'] = self._device_index(reading.device_id)
+            slot['seq'] = seq
+            seq += 1
+        self.header[_H_WRITE_SEQ] = seq
+
+    # --- Readers ---
+
+    def device_name(self, index):
+        name = self._device_names.get(index)
+        if name is None:
+            raw = bytes(self._names[index])
+            name = raw.split(b'\0', 1)[0].decode('utf-8', errors='replace')
+            if name:
+                self._device_names[index] = name
+        return name
+
+    def read_since(self, seq):
+        """
+        Returns (samples, next_seq): every sample with sequence number >= `seq`
+        still in the ring, as a structured array copy, and the value of `seq`
+        to pass next time. Samples the writer has already overwritten are
+        skipped.
+        """
+        end = self.write_seq
+        start = max(seq, end - self.capacity, 0)
+        if start >= end:
+            return np.empty(0, dtype=SAMPLE_DTYPE), end
+        slots = np.arange(start, end) % self.capacity
+        samples = self.records[slots]  # Fancy indexing copies
+        expected = np.arange(start, end)
+        valid = (samples['seq'] == expected) & (self.records['seq'][slots] == expected)
+        return samples[valid], end
+
+    def latest(self, n):
+        """The newest `n` samples (or fewer), oldest first."""
+        return self.read_since(self.write_seq - n)[0]
+
+    def to_readings(self, samples):
+        """Converts records from `read_since`/`latest` into ingestion Readings."""
+        return [Reading(self.device_name(int(device)), datetime.fromtimestamp(ts / 1e9), float(temp), float(hum))
+                for ts, temp, hum, device in zip(samples['ts'], samples['temp'], samples['hum'], samples['device'])]
+
+
+class BusFollower:
+    """
+    Delivers samples published on the bus to `on_readings` as lists of
+    Readings, with the same run()/stop() interface as SerialIngestionEngine
+    so the GUI can use either. Waits for the daemon to appear and re-attaches
+    if it is restarted.
+    """
+
+    def __init__(self, on_readings, on_status=None, name=BUS_NAME, poll_interval=0.05, reattach_after=2.0):
+        self.on_readings = on_readings
+        self.on_status = on_status
+        self.name = name
+        self.poll_interval = poll_interval
+        self.reattach_after = reattach_after
+        self.ports = []
+        self.chunk_seconds = Histogram()  # Reading and delivering one batch from the bus
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def is_running(self):
+        return self._running.is_set()
+
+    def stop(self):
+        self._running.clear()
+
+    def _status(self, text):
+        if self.on_status:
+            self.on_status(self.name, text)
+
+    def _attach(self):
+        while self._running.is_set():
+            try:
+                return SampleBus.attach(self.name)
+            except (FileNotFoundError, ValueError):
+                self._status("Status: Waiting for the sensor daemon...")
+                time.sleep(self.reattach_after)
+        return None
+
+    def run(self):
+        """Follows the bus on the calling thread until `stop()` is called."""
+        bus = self._attach()
+        if bus is None:
+            return
+        self._status("Status: Connected and Monitoring...")
+        seq = bus.write_seq  # Only samples published from now on
+        idle_since = time.monotonic()
+        try:
+            while self._running.is_set():
+                started = time.perf_counter()
+                samples, seq = bus.read_since(seq)
+                if len(samples):
+                    self.on_readings(bus.to_readings(samples))
+                    self.chunk_seconds.observe(time.perf_counter() - started)
+                    idle_since = time.monotonic()
+                elif time.monotonic() - idle_since > self.reattach_after:
+                    # A restarted daemon creates a new segment under the same name
+                    idle_since = time.monotonic()
+                    try:
+                        fresh = SampleBus.attach(self.name)
+                    except (FileNotFoundError, ValueError):
+                        continue
+                    if fresh.writer_pid != bus.writer_pid:
+                        bus.close()
+                        bus, seq = fresh, 0
+                        self._status("Status: Sensor daemon restarted, reconnected.")
+                    else:
+                        fresh.close()
+                time.sleep(self.poll_interval)
+        finally:
+            bus.close()
@@ -0,0 +1,475 @@
+"""
+The sensor log as an append-only file of fixed-size binary records
+(data/samples.bin), as an alternative to the CSV partitions and the SQLite
+log. Select it with STORAGE_BACKEND = 'binary' in main_gui.py /
+sensor_daemon.py, or --backend binary for the report tools.
+
+Readers map the file with numpy.memmap: a range query is a binary search on
+the timestamp column, and reports get typed columns straight from the page
+cache instead of parsing text. CSV stays available as an exchange format:
+
+    python sample_log.py import [--csv data/data.csv] [--log data/samples.bin] [--replace]
+    python sample_log.py export [--log data/samples.bin] [--out data/export.csv] [--start ...] [--end ...]
+"""
+import argparse
+import csv
+import functools
+import os
+import struct
+import time
+from datetime import timedelta
+
+import numpy as np
+
+from csv_writer import CSV_HEADER, CsvBatchWriter
+from rollups import ROLLUP_SUFFIX, RollupStore
+from sqlite_log import EPOCH, US, key_timestamp, timestamp_key
+
+SAMPLE_LOG = 'data/samples.bin'
+DEVICES_SUFFIX = '.devices'  # Device names, one per line; a record's device ID is its line number (0 = none)
+IMPORT_BATCH_ROWS = 50000
+SYNC_BATCH_RECORDS = 50000   # Records merged into the rollups per step when catching up
+EXPORT_CHUNK_RECORDS = 65536
+
+MAGIC = b'SENSLOG\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sII')  # magic, version, record size
+# ts: nanoseconds since 1970-01-01 in the log's local wall-clock time, like SqliteLog's timestamps, so
+# a day in the log is a day in the CSV timestamps and the rollups. Records are in the order they were
+# written, so ts is one sorted run, or a new run starts wherever the clock was set back (SampleLog._runs).
+RECORD = np.dtype([('ts', '<i8'), ('temp', '<f4'), ('humidity', '<f4'), ('device', '<u4')])
+SECOND_NS = 1000000000
+
+
+def datetime_ns(moment):
+    """Naive local datetime -> record timestamp."""
+    return (moment - EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def key_ns(timestamp):
+    """"2025-07-24 01:15:10" -> record timestamp of the start of that second."""
+    return timestamp_key(timestamp) * 1000
+
+
+@functools.lru_cache(maxsize=4096)
+def second_timestamp(second):
+    """Seconds since 1970 -> "2025-07-24 01:15:10" (cached: consecutive records mostly share one)."""
+    return key_timestamp(second * US)
+
+
+class SampleLog:
+    """
+    Fixed-width binary sensor log: a 16-byte header followed by RECORD
+    entries (int64 timestamp, float32 temperature and humidity, device ID).
+
+    `records()` maps every complete record read-only and remaps when the
+    file has grown, so a reader in another process sees rows as soon as the
+    writer has appended them. Each record keeps its own timestamp; queries
+    binary-search every sorted run of them and merge the runs into time
+    order (a log written with a steady clock is a single run). The query methods mirror TimeIndex and
+    SqliteLog (`bounds`, `estimate_rows`, `read_range`, `iter_range`,
+    `read_frame`, `read_rows`, `find_row`, `row_count`, `sync_rollups`), so
+    the history view and the report generator work unchanged. The rollups
+    live next to the log (`data/samples.bin.rollups.db`).
+    """
+
+    def __init__(self, path=SAMPLE_LOG):
+        self.path = path
+        self.header = CSV_HEADER
+        self.rollups = RollupStore(path, db_path=path + ROLLUP_SUFFIX, time_index=self)
+        self._records = np.empty(0, RECORD)
+        self._devices = ['']   # Device ID -> name
+        self._device_ids = {'': 0}
+        self._run_starts = [0]  # Record numbers where a sorted run of timestamps starts
+        self._scanned = 0       # Records checked for the start of a new run so far
+
+    # --- Reading ---
+
+    def records(self):
+        """Every complete record, as a read-only memory-mapped structured array."""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+        count = max(0, size - HEADER.size) // RECORD.itemsize
+        if count != len(self._records):
+            if count == 0:
+                self._records = np.empty(0, RECORD)
+            else:
+                self._check_header()
+                self._records = np.memmap(self.path, dtype=RECORD, mode='r', offset=HEADER.size, shape=(count,))
+        return self._records
+
+    def _check_header(self):
+        with open(self.path, 'rb') as file:
+            magic, version, record_size = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or record_size != RECORD.itemsize:
+            raise ValueError(f"{self.path} is not a version {VERSION} sample log")
+
+    def device_name(self, device_id):
+        if device_id >= len(self._devices):
+            self._load_devices()
+        return self._devices[device_id] if device_id < len(self._devices) else ''
+
+    def _load_devices(self):
+        try:
+            with open(self.path + DEVICES_SUFFIX, 'r', encoding='utf-8') as file:
+                names = file.read().split('\n')[:-1]  # Ignore a name still being written
+        except FileNotFoundError:
+            names = []
+        self._devices = [''] + names
+        self._device_ids = {name: i for i, name in enumerate(self._devices)}
+
+    def _runs(self):
+        """
+        (begin, stop) record numbers of each run of non-decreasing timestamps.
+        Only records appended since the last call are checked.
+        """
+        ts = self.records()['ts']
+        if len(ts) < self._scanned:  # Replaced by a shorter log
+            self._run_starts, self._scanned = [0], 0
+        if len(ts) > self._scanned:
+            begin = max(0, self._scanned - 1)
+            steps = np.flatnonzero(ts[begin + 1:] < ts[begin:-1]) + begin + 1
+            self._run_starts.extend(steps.tolist())
+            self._scanned = len(ts)
+        return list(zip(self._run_starts, self._run_starts[1:] + [len(ts)]))
+
+    def _spans(self, start=None, end=None):
+        """[(first, stop)] record numbers of start <= timestamp <= end (whole seconds) in each run."""
+        ts = self.records()['ts']
+        spans = []
+        for begin, stop in self._runs():
+            run = ts[begin:stop]
+            first = begin + (0 if start is None else int(np.searchsorted(run, key_ns(start))))
+            last = stop if end is None else begin + int(np.searchsorted(run, key_ns(end) + SECOND_NS))
+            spans.append((first, max(first, last)))
+        return spans
+
+    def _in_order(self, spans):
+        """
+        The records of `spans` in time order: a view of the mapped file for
+        one span, else a sorted copy. The sort is stable, so rows of the same
+        second keep the order they were written in.
+        """
+        records = self.records()
+        parts = [records[first:stop] for first, stop in spans if stop > first]
+        if len(parts) <= 1:
+            return parts[0] if parts else records[:0]
+        merged = np.concatenate(parts)
+        return merged[np.argsort(merged['ts'], kind='stable')]
+
+    def _rows_before(self, ts_ns):
+        """Number of records with a timestamp below `ts_ns`."""
+        ts = self.records()['ts']
+        return sum(int(np.searchsorted(ts[begin:stop], ts_ns)) for begin, stop in self._runs())
+
+    def select(self, start=None, end=None):
+        """
+        The records in [start, end] in time order: a view of the mapped file
+        (nothing is read until used), or a sorted copy if the clock was set
+        back in the range.
+        """
+        return self._in_order(self._spans(start, end))
+
+    def tail(self, count):
+        """The `count` records written last."""
+        records = self.records()
+        return records[max(0, len(records) - count):]
+
+    def to_rows(self, records):
+        """Records -> rows in the CSV layout (timestamp to the second, two-decimal strings, device name)."""
+        seconds = (records['ts'] // SECOND_NS).tolist()
+        temps = records['temp'].tolist()
+        hums = records['humidity'].tolist()
+        devices = records['device'].tolist()
+        return [[second_timestamp(second), f"{temp:.2f}", f"{humidity:.2f}", self.device_name(device)]
+                for second, temp, humidity, device in zip(seconds, temps, hums, devices)]
+
+    def _rollup_rows(self, records):
+        """Records -> (timestamp, temp, humidity) rows for the rollups, with the two-decimal values as logged."""
+        seconds = (records['ts'] // SECOND_NS).tolist()
+        temps = np.round(records['temp'].astype(np.float64), 2).tolist()
+        hums = np.round(records['humidity'].astype(np.float64), 2).tolist()
+        return [(second_timestamp(second), temp, humidity) for second, temp, humidity in zip(seconds, temps, hums)]
+
+    # --- Queries (same interface as TimeIndex) ---
+
+    def load(self):
+        return self
+
+    def ensure_loaded(self):
+        return self
+
+    @property
+    def row_count(self):
+        return len(self.records())
+
+    def bounds(self):
+        """Returns (first, last) timestamp strings, or None if there are no rows."""
+        ts = self.records()['ts']
+        if not len(ts):
+            return None
+        runs = self._runs()
+        first = min(int(ts[begin]) for begin, _ in runs)
+        last = max(int(ts[stop - 1]) for _, stop in runs)
+        return second_timestamp(first // SECOND_NS), second_timestamp(last // SECOND_NS)
+
+    def estimate_rows(self, start=None, end=None):
+        """Exact: two binary searches per run."""
+        return sum(stop - first for first, stop in self._spans(start, end))
+
+    def iter_range(self, start=None, end=None):
+        """Streams the rows with start <= timestamp <= end in the CSV layout."""
+        records = self.select(start, end)
+        for begin in range(0, len(records), EXPORT_CHUNK_RECORDS):
+            yield from self.to_rows(records[begin:begin + EXPORT_CHUNK_RECORDS])
+
+    def read_range(self, start=None, end=None):
+        """The rows for [start, end] as CSV bytes with a header line, for pd.read_csv."""
+        lines = [','.join(self.header)]
+        lines.extend(','.join(row) for row in self.iter_range(start, end))
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def read_frame(self, start=None, end=None):
+        """
+        The Timestamp/Temperature_C/Humidity_Percent columns for [start, end]
+        as a DataFrame, taken from the mapped records without any parsing.
+        Timestamps keep their sub-second part.
+        """
+        import pandas as pd
+        records = self.select(start, end)
+        return pd.DataFrame({
+            'Timestamp': records['ts'].view('datetime64[ns]'),
+            'Temperature_C': np.round(records['temp'].astype(np.float64), 2),
+            'Humidity_Percent': np.round(records['humidity'].astype(np.float64), 2),
+        })
+
+    def read_rows(self, first, count):
+        """Returns up to `count` rows starting at row number `first` (in time order)."""
+        records = self.records()
+        runs = self._runs()
+        if len(runs) == 1 or first >= len(records) or count <= 0:
+            return self.to_rows(records[first:first + count])
+        # Find the timestamp of row `first`: the lowest one with more than `first` rows at or below it.
+        # The ts column is strided in the mapped records, so each run is copied once for the searches.
+        run_ts = [np.ascontiguousarray(records['ts'][begin:stop]) for begin, stop in runs]
+        low, high = min(int(ts[0]) for ts in run_ts), max(int(ts[-1]) for ts in run_ts)
+        while low < high:
+            middle = (low + high) // 2
+            if sum(int(np.searchsorted(ts, middle, 'right')) for ts in run_ts) > first:
+                high = middle
+            else:
+                low = middle + 1
+        # Every run's next records from that timestamp on hold the rows wanted; merge and skip to `first`
+        starts = [int(np.searchsorted(ts, low)) for ts in run_ts]
+        skip = first - sum(starts)
+        spans = [(begin + start, min(stop, begin + start + skip + count))
+                 for (begin, stop), start in zip(runs, starts)]
+        return self.to_rows(self._in_order(spans)[skip:skip + count])
+
+    def find_row(self, timestamp):
+        """Returns the number of the first row at or after `timestamp`."""
+        return self._rows_before(key_ns(timestamp))
+
+    # --- Rollups ---
+
+    def sync_rollups(self):
+        """Merges every record the rollups have not seen yet (all of them if the log was replaced)."""
+        records = self.records()
+        first_ts = str(int(records[0]['ts'])) if len(records) else None
+        return self.rollups.sync_counted(len(records), first_ts,
+                                         lambda begin, stop: self._rollup_rows(records[begin:stop]),
+                                         SYNC_BATCH_RECORDS)
+
+    def on_records_written(self, records, first, end):
+        """SampleLogWriter listener: merges the batch just written, or catches up if the rollups are behind."""
+        identity = str(int(records[0]['ts'])) if first == 0 else None
+        if not self.rollups.merge_counted(self._rollup_rows(records), first, end, identity):
+            self.sync_rollups()
+
+    # --- Appending (one writing process at a time) ---
+
+    def open_for_append(self):
+        """
+        Opens the log for appending, writing the header of a new file and
+        dropping a partial record left by a crash mid-write.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file = open(self.path, 'ab')
+        size = file.tell()
+        if size == 0:
+            file.write(HEADER.pack(MAGIC, VERSION, RECORD.itemsize))
+            file.flush()
+        else:
+            self._check_header()
+            complete = HEADER.size + (size - HEADER.size) // RECORD.itemsize * RECORD.itemsize
+            if complete != size:
+                print(f"Warning: dropping {size - complete} bytes of a partial record at the end of {self.path}")
+                file.truncate(complete)
+        self._load_devices()
+        return file
+
+    def _device_id(self, name):
+        device_id = self._device_ids.get(name)
+        if device_id is None:
+            # Durable before any record refers to it
+            with open(self.path + DEVICES_SUFFIX, 'a', encoding='utf-8') as file:
+                file.write(name.replace('\n', ' ') + '\n')
+                file.flush()
+                os.fsync(file.fileno())
+            device_id = self._device_ids[name] = len(self._devices)
+            self._devices.append(name)
+        return device_id
+
+    def to_records(self, rows):
+        """
+        Rows of (timestamp, temp, humidity[, device]) -> a RECORD array ready
+        to append. The timestamp is a record timestamp or a CSV timestamp
+        string, kept as it is even when it is earlier than the previous
+        record's (readers then see a new sorted run). Malformed rows are
+        skipped.
+        """
+        ts, temps, hums, devices = [], [], [], []
+        for row in rows:
+            try:
+                timestamp = key_ns(row[0]) if isinstance(row[0], str) else row[0]
+                temp, humidity = float(row[1]), float(row[2])
+            except (ValueError, IndexError):
+                continue
+            ts.append(timestamp)
+            temps.append(temp)
+            hums.append(humidity)
+            devices.append(self._device_id(row[3] if len(row) > 3 else ''))
+        records = np.empty(len(ts), RECORD)
+        records['ts'] = ts
+        records['temp'] = temps
+        records['humidity'] = hums
+        records['device'] = devices
+        return records
+
+
+class SampleLogWriter(CsvBatchWriter):
+    """
+    CsvBatchWriter that appends each batch to a SampleLog as binary records;
+    the queue, batching and fsync policy are the same. `write_readings()`
+    queues ingestion Readings as (timestamp, temp, humidity, device) tuples,
+    so no timestamp or number is ever formatted as text; `write()` also
+    takes rows in the CSV layout.
+
+    Listeners are called as `listener(records, first, end)` with the RECORD
+    array of the batch, its first record number and the record count after
+    it; the log's rollups are always updated.
+    """
+
+    def __init__(self, log, listeners=(), **kwargs):
+        super().__init__(log.path, **kwargs)
+        self.log = log
+        self.listeners = [log.on_records_written] + list(listeners)
+        self._records_written = None
+
+    def write_readings(self, readings):
+        queued, moment, timestamp = True, None, None
+        for reading in readings:
+            if reading.timestamp is not moment:  # Readings of one serial chunk share their timestamp
+                moment, timestamp = reading.timestamp, datetime_ns(reading.timestamp)
+            queued &= self.write((timestamp, reading.temp, reading.humidity, reading.device_id))
+        return queued
+
+    def _open(self):
+        self._file = self.log.open_for_append()
+        self._records_written = (self._file.tell() - HEADER.size) // RECORD.itemsize
+
+    def _write_batch(self, batch, force_sync=False):
+        if batch:
+            if self._file is None:
+                self._open()
+            records = self.log.to_records(batch)
+            batch.clear()
+            self._file.write(records.tobytes())
+            self._file.flush()
+            first = self._records_written
+            self._records_written += len(records)
+            self.rows_written += len(records)
+            self.batches_written += 1
+            self._unsynced = True
+            if len(records):
+                self._notify(records, first, self._records_written)
+        self._sync_file(force_sync)
+
+
+def import_csv(csv_path, log_path, replace=False):
+    """Appends every partition of the CSV log to a new sample log. Returns the number of rows loaded."""
+    from partitions import PartitionedLog
+
+    if replace:
+        for suffix in ('', DEVICES_SUFFIX, ROLLUP_SUFFIX):
+            if os.path.exists(log_path + suffix):
+                os.remove(log_path + suffix)
+    log = SampleLog(log_path)
+    if log.row_count:
+        raise ValueError(f"{log_path} already holds {log.row_count} rows. Use --replace to rebuild it.")
+
+    loaded, batch = 0, []
+    started = time.perf_counter()
+    with log.open_for_append() as file:
+        for row in PartitionedLog(csv_path).iter_range():
+            if len(row) > len(CSV_HEADER):
+                raise ValueError(f"{csv_path} holds window records, which only the CSV log can store.")
+            batch.append(row)
+            if len(batch) >= IMPORT_BATCH_ROWS:
+                loaded += file.write(log.to_records(batch).tobytes()) // RECORD.itemsize
+                batch = []
+                print(f"  {loaded} rows ({loaded / (time.perf_counter() - started):,.0f} rows/s)")
+        loaded += file.write(log.to_records(batch).tobytes()) // RECORD.itemsize
+        file.flush()
+        os.fsync(file.fileno())
+    log.sync_rollups()
+    return loaded
+
+
+def export_csv(log_path, out_path, start=None, end=None):
+    """Writes the rows of [start, end] as a CSV file in the log's usual layout. Returns the number of rows."""
+    log = SampleLog(log_path)
+    exported = 0
+    with open(out_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(log.header)
+        records = log.select(start, end)
+        for begin in range(0, len(records), EXPORT_CHUNK_RECORDS):
+            rows = log.to_rows(records[begin:begin + EXPORT_CHUNK_RECORDS])
+            writer.writerows(rows)
+            exported += len(rows)
+    return exported
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = ap.add_subparsers(dest='command', required=True)
+    importer = commands.add_parser('import', help="Load the CSV partitions into a new sample log")
+    importer.add_argument('--csv', default='data/data.csv', help="Legacy log path; its partitions are found next to it")
+    importer.add_argument('--log', default=SAMPLE_LOG)
+    importer.add_argument('--replace', action='store_true', help="Delete an existing sample log first")
+    exporter = commands.add_parser('export', help="Write (part of) the sample log as CSV")
+    exporter.add_argument('--log', default=SAMPLE_LOG)
+    exporter.add_argument('--out', default='data/export.csv')
+    exporter.add_argument('--start', help='First second, "YYYY-MM-DD HH:MM:SS"')
+    exporter.add_argument('--end', help='Last second, "YYYY-MM-DD HH:MM:SS"')
+    args = ap.parse_args()
+
+    try:
+        if args.command == 'import':
+            print(f"🚀 Importing {os.path.dirname(args.csv) or '.'}/ into {args.log}...")
+            loaded = import_csv(args.csv, args.log, args.replace)
+            print(f"✅ Imported {loaded} rows into {args.log}.")
+        else:
+            exported = export_csv(args.log, args.out, args.start, args.end)
+            print(f"✅ Exported {exported} rows to {args.out}.")
+    except (OSError, ValueError) as e:
+        print(f"❌ Error: {e}")
+
+
+if __name__ == '__main__':
+    main()
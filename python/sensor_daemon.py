@@ -0,0 +1,229 @@
+"""
+Headless ingestion daemon: reads the sensor ports, logs the samples to
+the partitioned CSV log and publishes it on the shared-memory sample bus.
+
+    python sensor_daemon.py /dev/ttyUSB0 [/dev/ttyUSB1 ...]
+
+Local viewers attach to the bus instead of the serial port and read the
+latest samples straight from memory: main_gui.py (choose "Sensor daemon"
+in the port list), live_monitor.py --bus, or any script using
+sample_bus.SampleBus.attach(). Only the daemon writes the log while it runs.
+
+With --aggregate window or --aggregate deadband, the log gets one record
+per window or only the readings that changed (see aggregation.py), while
+the bus and the alerts still see every sample; the raw samples around each
+fired alert are kept in data/alert_raw.csv.
+
+Alert rules from alert_rules.json (see alerts.load_rules) are evaluated on
+every batch and their events logged to data/alerts.csv.
+
+Pipeline counters and latency histograms are served in the Prometheus text
+format on http://127.0.0.1:9465/metrics (see metrics.py).
+"""
+import argparse
+import os
+import signal
+import threading
+import time
+
+from aggregation import AGGREGATE_RAW, AGGREGATE_WINDOW, AGGREGATION_MODES, RawHistory, make_stage
+from alerts import ALERT_LOG, ALERT_RULES_FILE, AlertEngine, AlertLog, load_rules
+from csv_writer import AGGREGATE_HEADER, CSV_HEADER, FSYNC_PER_INTERVAL
+from ingestion import SerialIngestionEngine
+from metrics import Metrics, MetricsServer, register_pipeline
+from partitions import PARTITION_DAY, PartitionedCsvWriter, PartitionedLog
+from sample_bus import BUS_CAPACITY, BUS_NAME, SampleBus
+from sqlite_log import (BINARY_BACKEND, SQLITE_BACKEND, SQLITE_DB, STORAGE_BACKENDS, WINDOW_BACKENDS, SqliteBatchWriter,
+                        SqliteLog)
+from wire_protocol import BAUD_RATES, WIRE_FORMATS, WIRE_TEXT
+
+# --- Configuration ---
+WIRE_FORMAT = WIRE_TEXT  # 'text' (firmware env:uno) or 'binary' (env:uno_binary); sets the baud rate
+DATA_DIR = 'data'
+CSV_FILE = os.path.join(DATA_DIR, 'data.csv')
+STATS_INTERVAL = 60.0  # Seconds between one-line summaries on stdout
+METRICS_PORT = 9465    # Prometheus metrics on http://127.0.0.1:9465/metrics (the GUI uses 9464)
+
+# --- CSV writer settings (same as main_gui.py) ---
+CSV_QUEUE_SIZE = 10000
+CSV_BATCH_SIZE = 50
+CSV_FLUSH_INTERVAL = 1.0
+CSV_FSYNC_POLICY = FSYNC_PER_INTERVAL
+CSV_FSYNC_INTERVAL = 5.0
+PARTITION_PERIOD = PARTITION_DAY
+PARTITION_MAX_BYTES = 64 * 1024 * 1024
+STORAGE_BACKEND = 'csv'  # 'csv', 'sqlite' or 'binary'
+
+# --- Ingestion-time aggregation (same as main_gui.py) ---
+AGGREGATION_MODE = AGGREGATE_RAW  # 'raw', 'window' or 'deadband' (see aggregation.py)
+AGGREGATION_WINDOW = 1.0
+DEADBAND_TEMP = 0.1
+DEADBAND_HUM = 1.0
+DEADBAND_HEARTBEAT = 60.0
+RAW_HISTORY_SECONDS = 120.0
+
+
+def open_log_writer(backend=STORAGE_BACKEND, header=CSV_HEADER, max_queue=CSV_QUEUE_SIZE, batch_size=CSV_BATCH_SIZE):
+    """Opens the log of a storage backend and starts its writer. Returns (log, writer)."""
+    if header != CSV_HEADER and backend not in WINDOW_BACKENDS:
+        raise ValueError(f"Window records are only logged by the {'/'.join(WINDOW_BACKENDS)} backend, not '{backend}'.")
+    os.makedirs(DATA_DIR, exist_ok=True)
+    if backend == BINARY_BACKEND:
+        from sample_log import SAMPLE_LOG, SampleLog, SampleLogWriter
+        log = SampleLog(SAMPLE_LOG)
+        writer = SampleLogWriter(
+            log, max_queue=max_queue, batch_size=batch_size,
+            flush_interval=CSV_FLUSH_INTERVAL, fsync_policy=CSV_FSYNC_POLICY,
+            fsync_interval=CSV_FSYNC_INTERVAL).start()
+    elif backend == SQLITE_BACKEND:
+        log = SqliteLog(SQLITE_DB)
+        writer = SqliteBatchWriter(
+            log, max_queue=max_queue, batch_size=batch_size,
+            flush_interval=CSV_FLUSH_INTERVAL, fsync_policy=CSV_FSYNC_POLICY,
+            fsync_interval=CSV_FSYNC_INTERVAL).start()
+    else:
+        log = PartitionedLog(CSV_FILE, max_bytes=PARTITION_MAX_BYTES)
+        writer = PartitionedCsvWriter(
+            log, period=PARTITION_PERIOD, max_queue=max_queue, batch_size=batch_size, header=header,
+            flush_interval=CSV_FLUSH_INTERVAL, fsync_policy=CSV_FSYNC_POLICY,
+            fsync_interval=CSV_FSYNC_INTERVAL).start()
+        log.compress_in_background()
+    return log, writer
+
+
+class SensorDaemon:
+    """Wires the ingestion engine to the bus and the log writer."""
+
+    def __init__(self, ports, bus_name=BUS_NAME, capacity=BUS_CAPACITY, log_rows=True, alert_rules=(),
+                 backend=STORAGE_BACKEND, metrics_port=METRICS_PORT, aggregation=AGGREGATION_MODE,
+                 window_seconds=AGGREGATION_WINDOW, deadband=(DEADBAND_TEMP, DEADBAND_HUM),
+                 heartbeat_seconds=DEADBAND_HEARTBEAT, baud_rate=BAUD_RATES[WIRE_FORMAT]):
+        self.bus = SampleBus.create(bus_name, capacity)
+        self.alerts = AlertEngine(alert_rules)
+        self.aggregator = make_stage(aggregation, window_seconds, *deadband, heartbeat_seconds)
+        self.csv_writer = None
+        self.alert_log = None
+        self.raw_history = None
+        if log_rows:
+            header = AGGREGATE_HEADER if aggregation == AGGREGATE_WINDOW else CSV_HEADER
+            self.log, self.csv_writer = open_log_writer(backend, header)
+            self.alert_log = AlertLog(ALERT_LOG).start()
+            if aggregation != AGGREGATE_RAW and RAW_HISTORY_SECONDS:
+                self.raw_history = RawHistory(RAW_HISTORY_SECONDS)
+        self.engine = SerialIngestionEngine(ports, on_readings=self.on_readings,
+                                            on_status=self.on_status, baud_rate=baud_rate)
+
+        self.metrics = Metrics()
+        register_pipeline(self.metrics, lambda: self.engine, writer=lambda: self.csv_writer,
+                          alerts=lambda: self.alerts, bus=lambda: self.bus, aggregator=lambda: self.aggregator)
+        self.metrics_server = None
+        if metrics_port is not None:
+            try:
+                self.metrics_server = MetricsServer(self.metrics, port=metrics_port).start()
+            except OSError as e:
+                print(f"Warning: metrics endpoint not started on port {metrics_port}: {e}")
+
+    def on_readings(self, readings):
+        # Viewers see the samples before they are logged
+        self.bus.publish(readings)
+        events = self.alerts.evaluate(readings)
+        for event in events:
+            print(f"🚨 {event.timestamp:%Y-%m-%d %H:%M:%S} [{event.device_id}] {event.rule} {event.event} "
+                  f"({event.value:.2f}, threshold {event.threshold:g})")
+        if self.csv_writer is None:
+            return
+        self.alert_log.write_events(events)
+        if self.raw_history:
+            self.raw_history.record(readings, events)
+        self.csv_writer.write_readings(self.aggregator.process(readings))
+
+    def on_status(self, device_id, text):
+        print(f"[{device_id}] {text}")
+
+    def report(self):
+        dropped = self.csv_writer.rows_dropped if self.csv_writer else 0
+        failed = sum(state.parser.failed_reads for state in self.engine.ports)
+        line = f"📈 {self.bus.write_seq} samples published, {failed} failed sensor reads, {dropped} rows dropped"
+        if self.aggregator.records_out != self.aggregator.readings_in:
+            line += f", {self.aggregator.readings_in} readings logged as {self.aggregator.records_out} records"
+        missing = sum(state.parser.missing_frames for state in self.engine.ports)
+        crc_errors = sum(state.parser.crc_errors for state in self.engine.ports)
+        if missing or crc_errors:
+            line += f", {missing} frames lost, {crc_errors} CRC errors"
+        if self.csv_writer and self.csv_writer.batch_seconds.count:
+            line += f", write batch p99 {self.csv_writer.batch_seconds.quantile(0.99) * 1000:.1f} ms"
+        print(line)
+
+    def run(self):
+        thread = threading.Thread(target=self.engine.run, name="SerialIngestionEngine", daemon=True)
+        thread.start()
+        last_report = time.monotonic()
+        try:
+            while thread.is_alive():
+                thread.join(1.0)
+                if time.monotonic() - last_report >= STATS_INTERVAL:
+                    self.report()
+                    last_report = time.monotonic()
+        finally:
+            self.engine.stop()
+            thread.join(5.0)
+            if self.csv_writer:
+                self.csv_writer.write_readings(self.aggregator.flush())
+                self.csv_writer.close()
+                self.alert_log.close()
+                if self.raw_history:
+                    self.raw_history.close()
+            self.report()
+            if self.metrics_server:
+                self.metrics_server.stop()
+            self.bus.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('ports', nargs='+', help="Serial ports to read")
+    ap.add_argument('--bus', default=BUS_NAME, help="Shared-memory name of the sample bus")
+    ap.add_argument('--capacity', type=int, default=BUS_CAPACITY, help="Samples kept on the bus")
+    ap.add_argument('--wire-format', choices=WIRE_FORMATS, default=WIRE_FORMAT,
+                    help="Format the firmware sends; selects its baud rate")
+    ap.add_argument('--baud', type=int, help="Serial baud rate, if not the wire format's default")
+    ap.add_argument('--no-log', action='store_true', help="Only publish on the bus, do not write the CSV log")
+    ap.add_argument('--rules', default=ALERT_RULES_FILE, help="Alert rules (JSON)")
+    ap.add_argument('--backend', choices=STORAGE_BACKENDS, default=STORAGE_BACKEND, help="Log storage to write")
+    ap.add_argument('--aggregate', choices=AGGREGATION_MODES, default=AGGREGATION_MODE,
+                    help="Log every reading, one record per window, or only changed readings")
+    ap.add_argument('--window', type=float, default=AGGREGATION_WINDOW, help="Seconds per window record")
+    ap.add_argument('--deadband', type=float, nargs=2, default=(DEADBAND_TEMP, DEADBAND_HUM), metavar=('TEMP', 'HUM'),
+                    help="Change in °C and %% humidity before a reading is logged in deadband mode")
+    ap.add_argument('--heartbeat', type=float, default=DEADBAND_HEARTBEAT,
+                    help="Seconds after which a steady reading is logged anyway in deadband mode")
+    ap.add_argument('--metrics-port', type=int, default=METRICS_PORT,
+                    help="Port of the local Prometheus metrics endpoint (0 picks a free port)")
+    ap.add_argument('--no-metrics', action='store_true', help="Do not serve metrics over HTTP")
+    args = ap.parse_args()
+    if args.aggregate == AGGREGATE_WINDOW and not args.no_log and args.backend not in WINDOW_BACKENDS:
+        ap.error(f"--aggregate window needs --backend {'/'.join(WINDOW_BACKENDS)}")
+
+    try:
+        rules = load_rules(args.rules)
+    except (OSError, ValueError, TypeError) as e:
+        print(f"❌ Error: could not load alert rules from {args.rules}: {e}")
+        return
+    daemon = SensorDaemon(args.ports, args.bus, args.capacity, log_rows=not args.no_log, alert_rules=rules,
+                          backend=args.backend, metrics_port=None if args.no_metrics else args.metrics_port,
+                          aggregation=args.aggregate, window_seconds=args.window, deadband=args.deadband,
+                          heartbeat_seconds=args.heartbeat, baud_rate=args.baud or BAUD_RATES[args.wire_format])
+    # SIGTERM (service managers) stops the daemon the same way as Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.engine.stop())
+    print(f"✅ Publishing samples from {', '.join(args.ports)} on bus '{args.bus}' ({args.capacity} samples)")
+    if daemon.metrics_server:
+        print(f"📊 Metrics on http://{daemon.metrics_server.host}:{daemon.metrics_server.port}/metrics")
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
+    print("✅ Sensor daemon stopped.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import re
+
+# One precompiled pattern for the line printed by src/main.cpp:
+#   "Temperature: 26.20°C  |  Humidity: 76.00%"
+# It runs on raw bytes, so lines never have to be decoded one by one.
+LINE_PATTERN = re.compile(rb"Temperature:\s*(-?\d+(?:\.\d*)?)[^\n]*?Humidity:\s*(-?\d+(?:\.\d*)?)")
+FAILED_READ_MARKER = b"Failed to read"
+
+
+def parse_line(line):
+    """Parses a single text or bytes line. Returns (temp, humidity) or (None, None)."""
+    if isinstance(line, str):
+        line = line.encode('utf-8', 'ignore')
+    match = LINE_PATTERN.search(line)
+    if match:
+        return float(match.group(1)), float(match.group(2))
+    return None, None
+
+
+class LineParser:
+    """
+    Splits a stream of serial chunks into lines and parses them in bulk.
+
+    `feed()` takes whatever bytes were waiting in the serial buffer and
+    returns a list of (temp, humidity) tuples for every complete line in
+    it. An incomplete trailing line is kept and completed by the next chunk.
+    """
+
+    def __init__(self, max_line_length=4096):
+        self.max_line_length = max_line_length
+        self.carry = b''
+        self.lines_seen = 0
+        self.readings_parsed = 0
+        self.failed_reads = 0   # "Failed to read from DHT sensor!" lines
+        self.unparsed = 0       # Any other line (including blank ones) that is not a reading
+
+    def feed(self, chunk):
+        data = self.carry + chunk if self.carry else chunk
+        end = data.rfind(b'\n')
+        if end < 0:
+            self.carry = data if len(data) <= self.max_line_length else b''
+            return []
+        self.carry = data[end + 1:]
+        if len(self.carry) > self.max_line_length:
+            self.carry = b''
+        complete = data[:end + 1]
+
+        readings = [(float(t), float(h)) for t, h in LINE_PATTERN.findall(complete)]
+        lines = complete.count(b'\n')
+        failed = complete.count(FAILED_READ_MARKER)
+
+        self.lines_seen += lines
+        self.readings_parsed += len(readings)
+        self.failed_reads += failed
+        self.unparsed += max(0, lines - len(readings) - failed)
+        return readings
+
+    def reset(self):
+        self.carry = b''
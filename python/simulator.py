@@ -0,0 +1,246 @@
+"""
+Pseudo-serial sensor device for testing without an Arduino (Linux/macOS).
+
+Creates a pty and writes lines exactly as src/main.cpp prints them,
+including "Failed to read from DHT sensor!" lines, at a fixed rate. Lines
+are either replayed from an existing log or generated as a random walk:
+
+    python simulator.py --rate 20                        # synthetic, like the firmware
+    python simulator.py --replay data/data.csv --rate 2000 --loop
+    python simulator.py --devices 3 --rate 100
+
+With --binary it sends the firmware's binary frames instead (see
+wire_protocol.py); --corrupt-rate and --drop-rate damage or lose some of
+them, and --capture saves every byte sent for offline decoding:
+
+    python simulator.py --binary --corrupt-rate 0.01 --drop-rate 0.01 --capture capture.bin
+
+Point live_monitor.py (`python live_monitor.py /dev/pts/N`) or the
+ingestion engine at the printed port names.
+"""
+import argparse
+import os
+import random
+import select
+import threading
+import time
+
+from partitions import PartitionedLog
+from wire_protocol import FRAME_FAILED_READ, FRAME_READING, encode_frame
+
+FAILED_LINE = b"Failed to read from DHT sensor!\r\n"
+
+
+def format_reading(temp, humidity):
+    """One line as the firmware prints it: Serial.print(float) uses two decimals, println ends in CRLF."""
+    return f"Temperature: {temp:.2f}°C  |  Humidity: {humidity:.2f}%\r\n".encode('utf-8')
+
+
+def synthetic_trace(seed=None, failure_rate=0.02, temp=25.0, humidity=55.0):
+    """Endless random walk of (temp, humidity) readings; None stands for a failed sensor read."""
+    rng = random.Random(seed)
+    while True:
+        if rng.random() < failure_rate:
+            yield None
+            continue
+        temp = min(45.0, max(5.0, temp + rng.gauss(0, 0.05)))
+        humidity = min(95.0, max(10.0, humidity + rng.gauss(0, 0.2)))
+        yield temp, humidity
+
+
+def replay_trace(csv_path, loop=False, failure_rate=0.0, seed=None):
+    """Readings from an existing log (all of its partitions), optionally repeated forever."""
+    rng = random.Random(seed)
+    log = PartitionedLog(csv_path)
+    while True:
+        replayed = 0
+        for row in log.iter_range():
+            if failure_rate and rng.random() < failure_rate:
+                yield None
+            try:
+                yield float(row[1]), float(row[2])
+                replayed += 1
+            except (ValueError, IndexError):
+                yield None
+        if not loop or replayed == 0:
+            return
+        log.refresh()
+
+
+class PtyDevice:
+    """
+    A fake serial device: a pty whose slave end (`port`) can be opened with
+    pyserial, fed from `trace` at `rate` lines per second. `count` limits the
+    number of lines. With `record=True`, the monotonic time at which each
+    reading line was sent is kept in `send_times` for latency measurements.
+
+    With `binary=True` each line is a binary frame from `device_id` instead.
+    A `corrupt_rate` share of frames get one byte flipped, and a `drop_rate`
+    share are skipped although their sequence number is used up, as if lost
+    on the cable. Every byte sent is appended to the `capture` file if given.
+    """
+
+    def __init__(self, trace, rate, count=None, record=False, binary=False, device_id=1,
+                 corrupt_rate=0.0, drop_rate=0.0, capture=None, seed=None):
+        import tty  # POSIX only
+        self.trace = trace
+        self.rate = rate
+        self.count = count
+        self.record = record
+        self.binary = binary
+        self.device_id = device_id
+        self.corrupt_rate = corrupt_rate
+        self.drop_rate = drop_rate
+        self.capture = open(capture, 'wb') if capture else None
+        self.lines_sent = 0
+        self.readings_sent = 0
+        self.failures_sent = 0
+        self.frames_corrupted = 0
+        self.frames_dropped = 0
+        self.send_times = []
+        self._sequence = 0
+        self._rng = random.Random(seed)
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)  # No echo or newline translation
+        os.set_blocking(self._master, False)
+        self.port = os.ttyname(self._slave)
+        self._running = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name=f"PtyDevice {self.port}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join(2.0)
+
+    def close(self):
+        self.stop()
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        if self.capture is not None:
+            self.capture.close()
+
+    @property
+    def finished(self):
+        return self._thread is not None and not self._thread.is_alive()
+
+    def _next_lines(self, n):
+        lines = []
+        for _ in range(n):
+            if self.count is not None and self.lines_sent >= self.count:
+                break
+            reading = next(self.trace, StopIteration)
+            if reading is StopIteration:
+                self.count = self.lines_sent
+                break
+            if self.binary:
+                line = self._frame(reading)
+            else:
+                line = FAILED_LINE if reading is None else format_reading(*reading)
+            if reading is None:
+                self.failures_sent += 1
+            else:
+                self.readings_sent += 1
+                if self.record:
+                    self.send_times.append(time.monotonic())
+            if line:
+                lines.append(line)
+            self.lines_sent += 1
+        if self.capture is not None:
+            self.capture.write(b''.join(lines))
+        return lines
+
+    def _frame(self, reading):
+        if reading is None:
+            frame = encode_frame(self.device_id, self._sequence, frame_type=FRAME_FAILED_READ)
+        else:
+            frame = encode_frame(self.device_id, self._sequence, *reading, frame_type=FRAME_READING)
+        self._sequence += 1
+        if self.drop_rate and self._rng.random() < self.drop_rate:
+            self.frames_dropped += 1
+            return b''
+        if self.corrupt_rate and self._rng.random() < self.corrupt_rate:
+            self.frames_corrupted += 1
+            damaged = bytearray(frame)
+            damaged[self._rng.randrange(len(damaged))] ^= 1 << self._rng.randrange(8)
+            frame = bytes(damaged)
+        return frame
+
+    def _run(self):
+        started = time.monotonic()
+        pending = b''
+        tick = min(0.01, 1.0 / self.rate)
+        while self._running.is_set():
+            due = int((time.monotonic() - started) * self.rate) - self.lines_sent
+            if due > 0:
+                pending += b''.join(self._next_lines(due))
+            if pending:
+                # Whatever the reader has not taken yet stays queued, like a device's TX buffer
+                _, writable, _ = select.select([], [self._master], [], tick)
+                if writable:
+                    try:
+                        written = os.write(self._master, pending)
+                        pending = pending[written:]
+                    except BlockingIOError:
+                        pass
+                    except OSError:
+                        return
+                continue
+            if self.count is not None and self.lines_sent >= self.count:
+                return
+            time.sleep(tick)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--rate', type=float, default=20.0, help="Lines per second per device (firmware: 20)")
+    ap.add_argument('--devices', type=int, default=1)
+    ap.add_argument('--replay', metavar='CSV', help="Replay this log instead of a synthetic trace")
+    ap.add_argument('--loop', action='store_true', help="Start the replay over when it ends")
+    ap.add_argument('--failure-rate', type=float, default=0.02, help="Share of 'Failed to read' lines")
+    ap.add_argument('--count', type=int, help="Stop after this many lines per device")
+    ap.add_argument('--seed', type=int)
+    ap.add_argument('--binary', action='store_true', help="Send binary frames (firmware built with WIRE_FORMAT=1)")
+    ap.add_argument('--corrupt-rate', type=float, default=0.0, help="Share of binary frames with a flipped bit")
+    ap.add_argument('--drop-rate', type=float, default=0.0, help="Share of binary frames lost on the way")
+    ap.add_argument('--capture', metavar='FILE', help="Save the bytes sent (one file per device: FILE, FILE.2, ...)")
+    args = ap.parse_args()
+
+    devices = []
+    for i in range(args.devices):
+        seed = None if args.seed is None else args.seed + i
+        if args.replay:
+            trace = replay_trace(args.replay, args.loop, args.failure_rate, seed)
+        else:
+            trace = synthetic_trace(seed, args.failure_rate)
+        capture = args.capture if not args.capture or i == 0 else f"{args.capture}.{i + 1}"
+        devices.append(PtyDevice(trace, args.rate, args.count, binary=args.binary, device_id=i + 1,
+                                 corrupt_rate=args.corrupt_rate, drop_rate=args.drop_rate,
+                                 capture=capture, seed=seed).start())
+        print(f"✅ Simulated sensor on {devices[-1].port} ({args.rate:g} {'frames' if args.binary else 'lines'}/sec)")
+
+    try:
+        while not all(device.finished for device in devices):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for device in devices:
+            device.close()
+        print(f"✅ Sent {sum(d.lines_sent for d in devices)} {'frames' if args.binary else 'lines'}.")
+        if args.binary:
+            print(f"📈 {sum(d.frames_corrupted for d in devices)} frames corrupted, "
+                  f"{sum(d.frames_dropped for d in devices)} dropped.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,435 @@
+"""
+The sensor log in a single SQLite database (data/data.db) in WAL mode, as
+an alternative to the CSV partitions. Select it with STORAGE_BACKEND in
+main_gui.py / sensor_daemon.py, or --backend for the report tools.
+
+Existing CSV logs (all partitions, compressed or not) are bulk-loaded with:
+
+    python sqlite_log.py [--csv data/data.csv] [--db data/data.db] [--replace]
+"""
+import argparse
+import functools
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from csv_writer import CSV_HEADER, FSYNC_NONE, FSYNC_PER_BATCH, CsvBatchWriter, _Control
+from rollups import LEVELS, RollupStore
+
+CSV_BACKEND = 'csv'
+SQLITE_BACKEND = 'sqlite'
+BINARY_BACKEND = 'binary'  # Fixed-width records in data/samples.bin, see sample_log.py
+STORAGE_BACKENDS = (CSV_BACKEND, SQLITE_BACKEND, BINARY_BACKEND)
+WINDOW_BACKENDS = (CSV_BACKEND,)  # Only the CSV log keeps a window record's min/max/sample columns (aggregation.py)
+SQLITE_DB = 'data/data.db'
+MIGRATE_BATCH_ROWS = 50000
+TRANSACTION_MAX_ROWS = 5000  # Rows already queued behind a batch are inserted in the same transaction, up to this
+
+EPOCH = datetime(1970, 1, 1)
+US = 1000000
+MINUTE_US = 60 * US
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS devices (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)",
+    # id: order of insertion. ts: the row's own second, as microseconds since 1970-01-01 in the log's
+    # local wall-clock time (like the CSV strings); rows are read in (ts, id) order through the index
+    "CREATE TABLE IF NOT EXISTS readings (id INTEGER PRIMARY KEY, ts INTEGER NOT NULL, temp REAL, "
+    "humidity REAL, device_id INTEGER REFERENCES devices(id))",
+    "CREATE INDEX IF NOT EXISTS readings_ts ON readings (ts)",
+    "CREATE TABLE IF NOT EXISTS log_meta (key TEXT PRIMARY KEY, value INTEGER)",
+)
+# Rows come back in the CSV layout, so callers cannot tell the backends apart
+ROW_COLUMNS = ("strftime('%Y-%m-%d %H:%M:%S', r.ts / 1000000, 'unixepoch'), printf('%.2f', r.temp), "
+               "printf('%.2f', r.humidity), COALESCE(d.name, '')")
+ROW_FROM = " FROM readings r LEFT JOIN devices d ON d.id = r.device_id"
+ROW_SQL = "SELECT " + ROW_COLUMNS + ROW_FROM
+
+
+@functools.lru_cache(maxsize=4096)
+def timestamp_key(timestamp):
+    """"2025-07-24 01:15:10" -> integer key of that second (cached: consecutive rows mostly share one)."""
+    if len(timestamp) != 19:
+        raise ValueError(f"Not a log timestamp: {timestamp!r}")
+    return (datetime.fromisoformat(timestamp) - EPOCH) // timedelta(microseconds=1)
+
+
+def key_timestamp(key):
+    return (EPOCH + timedelta(microseconds=key)).isoformat(' ', 'seconds')
+
+
+def _range_clause(start, end):
+    """WHERE clause for start <= timestamp <= end, matching the CSV backend's string comparison."""
+    clauses, params = [], []
+    if start is not None:
+        clauses.append("r.ts >= ?")
+        params.append(timestamp_key(start))
+    if end is not None:
+        clauses.append("r.ts < ?")
+        params.append(timestamp_key(end) + US)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+class SqliteLog:
+    """
+    The sensor log as one SQLite table of rows indexed by their timestamp.
+
+    The database runs in WAL mode, so history and report readers (in this
+    or other processes) never block the writer and always see a consistent
+    snapshot. The rollup tables live in the same database and are updated
+    in the same transaction as the rows they summarise.
+
+    The query methods mirror TimeIndex/PartitionedLog (`bounds`,
+    `estimate_rows`, `read_range`, `iter_range`, `read_rows`, `find_row`,
+    `row_count`, `sync_rollups`), so the history view and the report
+    generator work unchanged; every one of them is an indexed query.
+    """
+
+    def __init__(self, db_path=SQLITE_DB):
+        self.db_path = db_path
+        self.header = CSV_HEADER
+        self.rollups = RollupStore(db_path, db_path=db_path, time_index=self)
+        self._local = threading.local()
+
+    def connect(self):
+        """This thread's connection, creating the database and its tables on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("BEGIN IMMEDIATE")
+            self._upgrade(conn)
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self._local.conn = conn
+            self.rollups._connect()  # Creates the rollup tables
+        return conn
+
+    @staticmethod
+    def _upgrade(conn):
+        """
+        Converts a log from before the id column, whose ts was the primary key
+        (pushed past the previous row's when rows shared a second or were out
+        of order), so every row gets an id and its ts is whole seconds again.
+        """
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(readings)")]
+        if not columns or 'id' in columns:
+            return
+        print(f"Upgrading the SQLite log ({conn.execute('SELECT COUNT(*) FROM readings').fetchone()[0]} rows)...")
+        conn.execute("ALTER TABLE readings RENAME TO readings_old")
+        conn.execute(SCHEMA[1])
+        conn.execute("INSERT INTO readings (ts, temp, humidity, device_id) "
+                     f"SELECT ts / {US} * {US}, temp, humidity, device_id FROM readings_old ORDER BY ts")
+        # The rollups already summarise each row in the second it was stored in, which its new ts keeps
+        covered = conn.execute("SELECT value FROM log_meta WHERE key = 'rollup_ts'").fetchone()
+        if covered is not None:
+            merged = conn.execute("SELECT COUNT(*) FROM readings_old WHERE ts <= ?", covered).fetchone()[0]
+            conn.execute("INSERT OR REPLACE INTO log_meta (key, value) VALUES ('rollup_id', ?)", (merged,))
+            conn.execute("DELETE FROM log_meta WHERE key = 'rollup_ts'")
+        conn.execute("DROP TABLE readings_old")
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+        self.rollups.close()
+
+    def get_meta(self, conn, key, default=0):
+        row = conn.execute("SELECT value FROM log_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, conn, key, value):
+        conn.execute("INSERT OR REPLACE INTO log_meta (key, value) VALUES (?, ?)", (key, value))
+
+    # --- Writing (inside the caller's transaction) ---
+
+    def device_ids(self, conn, names):
+        """Maps device names to ids, adding new ones."""
+        ids = {}
+        for name in names:
+            if not name:
+                ids[name] = None
+                continue
+            conn.execute("INSERT OR IGNORE INTO devices (name) VALUES (?)", (name,))
+            ids[name] = conn.execute("SELECT id FROM devices WHERE name = ?", (name,)).fetchone()[0]
+        return ids
+
+    def insert_rows(self, conn, rows):
+        """
+        Inserts CSV-layout rows and merges them into the rollups. Returns the
+        id given to each row. Every row keeps its own timestamp, so one that
+        is out of order (the clock was set back) is stored, summarised and
+        found in its own second.
+        """
+        last = conn.execute("SELECT MAX(id) FROM readings").fetchone()[0] or 0
+        devices = self.device_ids(conn, {row[3] if len(row) > 3 else '' for row in rows})
+        ids, values, merged = [], [], []
+        for row in rows:
+            try:
+                key = timestamp_key(row[0])
+                temp, humidity = float(row[1]), float(row[2])
+            except (ValueError, IndexError):
+                continue
+            device = row[3] if len(row) > 3 else ''
+            last += 1
+            values.append((last, key, temp, humidity, devices[device]))
+            ids.append(last)
+            merged.append(row)
+        conn.executemany("INSERT INTO readings (id, ts, temp, humidity, device_id) VALUES (?, ?, ?, ?, ?)", values)
+        self.rollups.merge_rows(conn, merged)
+        self.set_meta(conn, 'row_count', self.get_meta(conn, 'row_count') + len(values))
+        if ids:
+            self.set_meta(conn, 'rollup_id', ids[-1])
+        return ids
+
+    # --- Queries (same interface as TimeIndex) ---
+
+    def load(self):
+        return self
+
+    def ensure_loaded(self):
+        return self
+
+    @property
+    def row_count(self):
+        return self.get_meta(self.connect(), 'row_count')
+
+    def sync_rollups(self):
+        """Rollups are committed with the rows, so this normally finds nothing left to merge."""
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        covered = self.get_meta(conn, 'rollup_id')
+        rows = conn.execute(ROW_SQL + " WHERE r.id > ? ORDER BY r.id", (covered,)).fetchall()
+        if rows:
+            self.rollups.merge_rows(conn, rows)
+            self.set_meta(conn, 'rollup_id', conn.execute("SELECT MAX(id) FROM readings").fetchone()[0])
+        conn.commit()
+        return self.rollups
+
+    def bounds(self):
+        """Returns (first, last) timestamp strings, or None if there are no rows."""
+        # Two queries: SQLite only answers MIN/MAX from the ts index when each stands alone
+        conn = self.connect()
+        first = conn.execute("SELECT MIN(ts) FROM readings").fetchone()[0]
+        last = conn.execute("SELECT MAX(ts) FROM readings").fetchone()[0]
+        if first is None:
+            return None
+        return key_timestamp(first), key_timestamp(last)
+
+    def _rows_before(self, conn, key):
+        """
+        Number of rows with a key below `key`. Whole days, hours and minutes
+        are counted from the rollups (committed with the rows, so always in
+        step); only the rows of the last partial minute are counted one by one.
+        """
+        minute = key // MINUTE_US * MINUTE_US
+        prefix = key_timestamp(minute)
+        total, lower = 0, ''
+        for level, length in LEVELS:
+            upper = prefix[:length]
+            total += conn.execute(f"SELECT COALESCE(SUM(temp_count), 0) FROM rollup_{level} "
+                                  "WHERE bucket >= ? AND bucket < ?", (lower, upper)).fetchone()[0]
+            lower = upper
+        return total + conn.execute("SELECT COUNT(*) FROM readings WHERE ts >= ? AND ts < ?",
+                                    (minute, key)).fetchone()[0]
+
+    def _seek(self, conn, first):
+        """(key, row number) of the start of the minute that holds row number `first`, or None past the end."""
+        base, prefix = 0, None
+        for level, length in LEVELS:
+            if prefix is None:
+                buckets = conn.execute(f"SELECT bucket, temp_count FROM rollup_{level} ORDER BY bucket")
+            else:
+                # Buckets inside the coarser one found so far ("2025-07-24" -> "2025-07-24 00" ... "2025-07-24 23")
+                buckets = conn.execute(f"SELECT bucket, temp_count FROM rollup_{level} "
+                                       "WHERE bucket > ? AND bucket < ? ORDER BY bucket", (prefix, prefix + '~'))
+            for bucket, count in buckets:
+                if base + count > first:
+                    prefix = bucket
+                    break
+                base += count
+            else:
+                return None
+        return timestamp_key(prefix + ':00'), base
+
+    def estimate_rows(self, start=None, end=None):
+        """Exact, from the rollup counts and the ts index."""
+        conn = self.connect()
+        upper = self.row_count if end is None else self._rows_before(conn, timestamp_key(end) + US)
+        lower = 0 if start is None else self._rows_before(conn, timestamp_key(start))
+        return max(0, upper - lower)
+
+    def iter_range(self, start=None, end=None):
+        """Streams the rows with start <= timestamp <= end."""
+        where, params = _range_clause(start, end)
+        for row in self.connect().execute(f"{ROW_SQL}{where} ORDER BY r.ts, r.id", params):
+            yield list(row)
+
+    def read_range(self, start=None, end=None):
+        """The rows for [start, end] as CSV bytes with a header line, for pd.read_csv."""
+        lines = [','.join(self.header)]
+        lines.extend(','.join(row) for row in self.iter_range(start, end))
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def read_frame(self, start=None, end=None):
+        """The Timestamp/Temperature_C/Humidity_Percent columns for [start, end] as a DataFrame."""
+        import pandas as pd
+        where, params = _range_clause(start, end)
+        data = pd.read_sql_query(
+            f"SELECT r.ts AS Timestamp, r.temp AS Temperature_C, r.humidity AS Humidity_Percent "
+            f"FROM readings r{where} ORDER BY r.ts, r.id", self.connect(), params=params)
+        data['Timestamp'] = pd.to_datetime(data['Timestamp'], unit='us')
+        return data
+
+    def read_rows(self, first, count):
+        """
+        Returns up to `count` rows starting at row number `first`. The rollup
+        counts locate the minute holding the row, so only that minute's rows
+        are skipped instead of every row before it.
+        """
+        conn = self.connect()
+        found = self._seek(conn, first)
+        if found is None:
+            return []
+        key, base = found
+        rows = conn.execute(f"{ROW_SQL} WHERE r.ts >= ? ORDER BY r.ts, r.id LIMIT ? OFFSET ?",
+                            (key, count, first - base)).fetchall()
+        return [list(row) for row in rows]
+
+    def find_row(self, timestamp):
+        """Returns the number of the first row at or after `timestamp`."""
+        return self._rows_before(self.connect(), timestamp_key(timestamp))
+
+
+class SqliteBatchWriter(CsvBatchWriter):
+    """
+    CsvBatchWriter that inserts each batch into a SqliteLog in one
+    transaction instead of appending it to a file; `write()` takes the same
+    rows. The fsync policy maps onto SQLite's synchronous setting: 'none' ->
+    OFF, 'batch' -> FULL (every commit is durable), 'interval' -> NORMAL
+    (durable at WAL checkpoints, still safe against corruption).
+
+    When rows arrive faster than batches can be committed, whatever is
+    already queued behind a batch (up to TRANSACTION_MAX_ROWS) goes into the
+    same transaction, so the per-commit cost is shared by more rows.
+
+    Listeners are called as `listener(rows, ids, last_id)` with the id given
+    to each row.
+    """
+
+    def __init__(self, log, **kwargs):
+        super().__init__(log.db_path, **kwargs)
+        self.log = log
+        self._conn = None
+        self._held = None  # A flush/stop request taken off the queue by _take_queued
+
+    def _write_batch(self, batch, force_sync=False):
+        if not batch:
+            return
+        rows = list(batch)
+        batch.clear()
+        self._take_queued(rows)
+        try:
+            if self._conn is None:
+                self._conn = self.log.connect()
+                synchronous = {FSYNC_NONE: 'OFF', FSYNC_PER_BATCH: 'FULL'}.get(self.fsync_policy, 'NORMAL')
+                self._conn.execute(f"PRAGMA synchronous={synchronous}")
+            self._conn.execute("BEGIN IMMEDIATE")
+            ids = self.log.insert_rows(self._conn, rows)
+            self._conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error writing to the SQLite log: {e}")
+            if self._conn is not None and self._conn.in_transaction:
+                self._conn.rollback()
+            self.rows_dropped += len(rows)
+            return
+        self.rows_written += len(ids)
+        self.batches_written += 1
+        if ids:
+            self._notify(rows, ids, ids[-1])
+
+    def _take_queued(self, rows):
+        """Moves rows waiting in the queue onto `rows`, stopping at a flush/stop request."""
+        while self._held is None and len(rows) < TRANSACTION_MAX_ROWS:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _Control):
+                self._held = item  # Handled by _run once this transaction is committed
+            else:
+                rows.append(item)
+
+    def _get(self, timeout):
+        if self._held is not None:
+            item, self._held = self._held, None
+            return item
+        return super()._get(timeout)
+
+    def _run(self):
+        try:
+            super()._run()
+        finally:
+            self.log.close()
+            self._conn = None
+
+
+def migrate(csv_path, db_path, replace=False):
+    """Bulk-loads every partition of the CSV log into a new SQLite log. Returns the number of rows loaded."""
+    from partitions import PartitionedLog
+
+    if replace:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    log = SqliteLog(db_path)
+    conn = log.connect()
+    if log.row_count:
+        raise ValueError(f"{db_path} already holds {log.row_count} rows. Use --replace to rebuild it.")
+    conn.execute("PRAGMA synchronous=OFF")  # A failed migration is simply run again with --replace
+
+    loaded, batch = 0, []
+    started = time.perf_counter()
+    for row in PartitionedLog(csv_path).iter_range():
+        if len(row) > len(CSV_HEADER):
+            raise ValueError(f"{csv_path} holds window records, which only the CSV log can store.")
+        batch.append(row)
+        if len(batch) >= MIGRATE_BATCH_ROWS:
+            conn.execute("BEGIN IMMEDIATE")
+            loaded += len(log.insert_rows(conn, batch))
+            conn.commit()
+            batch = []
+            print(f"  {loaded} rows ({loaded / (time.perf_counter() - started):,.0f} rows/s)")
+    conn.execute("BEGIN IMMEDIATE")
+    loaded += len(log.insert_rows(conn, batch))
+    conn.commit()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    log.close()
+    return loaded
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--csv', default='data/data.csv', help="Legacy log path; its partitions are found next to it")
+    ap.add_argument('--db', default=SQLITE_DB)
+    ap.add_argument('--replace', action='store_true', help="Delete an existing database first")
+    args = ap.parse_args()
+
+    print(f"🚀 Migrating {os.path.dirname(args.csv) or '.'}/ into {args.db}...")
+    try:
+        loaded = migrate(args.csv, args.db, args.replace)
+    except ValueError as e:
+        print(f"❌ Error: {e}")
+        return
+    print(f"✅ Migrated {loaded} rows into {args.db}.")
+
+
+if __name__ == '__main__':
+    main()
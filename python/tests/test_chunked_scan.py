@@ -0,0 +1,131 @@
+"""scan_stats and scan_minutes against pandas, on logs with each column layout the tree has written."""
+import csv
+import random
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from chunked_scan import scan_minutes, scan_stats
+from rollups import BucketState
+
+LAYOUTS = {
+    3: 'Timestamp,Temperature_C,Humidity_Percent',  # Legacy data/data.csv
+    4: 'Timestamp,Temperature_C,Humidity_Percent,Device',
+    9: 'Timestamp,Temperature_C,Humidity_Percent,Device,'
+       'Temperature_Min,Temperature_Max,Humidity_Min,Humidity_Max,Samples',  # Window records
+}
+
+
+def write_log(path, columns, rows=3000, seed=7):
+    rng = random.Random(seed)
+    start = datetime(2025, 7, 24, 23, 50)
+    lines = [LAYOUTS[columns]]
+    for i in range(rows):
+        timestamp = (start + timedelta(seconds=i // 3)).strftime('%Y-%m-%d %H:%M:%S')
+        temp, humidity = rng.uniform(15, 35), rng.uniform(20, 90)
+        fields = [timestamp, f"{temp:.2f}", f"{humidity:.2f}"]
+        if columns >= 4:
+            fields.append(f"dev{i % 2}")
+        if columns == 9:
+            fields += [f"{temp - 0.5:.2f}", f"{temp + 1.5:.2f}", f"{humidity - 1:.2f}", f"{humidity + 3:.2f}",
+                       str(rng.randint(1, 20))]
+        lines.append(','.join(fields))
+    lines.append("Failed to read from DHT sensor!")  # Malformed rows are skipped, like the rollups do
+    path.write_text('\n'.join(lines) + '\n')
+    return path
+
+
+def expected(path, start=None, end=None):
+    frame = pd.read_csv(path, index_col=False)
+    frame = frame.loc[pd.to_numeric(frame['Temperature_C'], errors='coerce').notna()]
+    frame = frame.astype({'Temperature_C': float, 'Humidity_Percent': float})
+    if start is not None:
+        frame = frame.loc[frame['Timestamp'] >= start]
+    if end is not None:
+        frame = frame.loc[frame['Timestamp'] <= end]
+    return frame
+
+
+def added_rows(path, start=None, end=None):
+    """The rows summarised one by one, as the rollups do."""
+    state = BucketState()
+    with open(path, newline='') as file:
+        for row in list(csv.reader(file))[1:]:
+            if (start is None or row[0] >= start) and (end is None or row[0] <= end):
+                try:
+                    state.add_row(row)
+                except (ValueError, IndexError):
+                    continue
+    return state
+
+
+def assert_matches(summary, frame):
+    if 'Samples' in frame:
+        assert_window_matches(summary, frame)
+        return
+    assert summary.count == len(frame)
+    assert summary.first == frame['Timestamp'].min() and summary.last == frame['Timestamp'].max()
+    for column, state in (('Temperature_C', summary.temp), ('Humidity_Percent', summary.hum)):
+        described = frame[column].describe()
+        assert state.count == described['count']
+        assert state.mean == pytest.approx(described['mean'])
+        assert state.std == pytest.approx(described['std'])
+        assert state.min == described['min'] and state.max == described['max']
+        assert state.median == pytest.approx(frame[column].median())
+
+
+def assert_window_matches(summary, frame):
+    """Window records count their samples, with the mean weighted by them and min/max from their own columns."""
+    samples = frame['Samples']
+    assert summary.count == samples.sum()
+    assert summary.first == frame['Timestamp'].min() and summary.last == frame['Timestamp'].max()
+    for column, state, low, high in (('Temperature_C', summary.temp, 'Temperature_Min', 'Temperature_Max'),
+                                     ('Humidity_Percent', summary.hum, 'Humidity_Min', 'Humidity_Max')):
+        assert state.count == samples.sum()
+        assert state.mean == pytest.approx((frame[column] * samples).sum() / samples.sum())
+        assert state.min == frame[low].min() and state.max == frame[high].max()
+        assert state.median == pytest.approx(frame[column].repeat(samples).median())
+
+
+@pytest.mark.parametrize('columns', sorted(LAYOUTS))
+def test_scan_stats_matches_pandas(tmp_path, columns):
+    path = write_log(tmp_path / 'data.csv', columns)
+    # Small chunks, so rows are split over many byte ranges
+    assert_matches(scan_stats([str(path)], jobs=1, chunk_bytes=4096), expected(path))
+
+
+@pytest.mark.parametrize('columns', sorted(LAYOUTS))
+def test_scan_stats_range_matches_pandas(tmp_path, columns):
+    path = write_log(tmp_path / 'data.csv', columns)
+    start, end = '2025-07-24 23:55:00', '2025-07-25 00:03:30'
+    assert_matches(scan_stats([str(path)], start, end, jobs=1, chunk_bytes=4096), expected(path, start, end))
+
+
+@pytest.mark.parametrize('columns', sorted(LAYOUTS))
+def test_scan_minutes_matches_pandas(tmp_path, columns):
+    path = write_log(tmp_path / 'data.csv', columns)
+    header_bytes = len(LAYOUTS[columns]) + 1
+    minutes, end = scan_minutes(str(path), header_bytes, jobs=1, chunk_bytes=4096)
+    assert end == path.stat().st_size
+    frame = expected(path)
+    assert sorted(minutes) == sorted(frame['Timestamp'].str.slice(0, 16).unique())
+    for minute, group in frame.groupby(frame['Timestamp'].str.slice(0, 16)):
+        assert_matches(minutes[minute], group)
+    total = BucketState()
+    for state in minutes.values():
+        total.merge(state)
+    assert_matches(total, frame)
+
+
+@pytest.mark.parametrize('columns', sorted(LAYOUTS))
+def test_scan_matches_rollup_rows(tmp_path, columns):
+    path = write_log(tmp_path / 'data.csv', columns)
+    start, end = '2025-07-24 23:55:00', '2025-07-25 00:03:30'
+    for first, last in ((None, None), (start, end)):
+        summary, added = scan_stats([str(path)], first, last, jobs=1, chunk_bytes=4096), added_rows(path, first, last)
+        assert (summary.count, summary.first, summary.last) == (added.count, added.first, added.last)
+        for state, other in ((summary.temp, added.temp), (summary.hum, added.hum)):
+            assert (state.min, state.max, state.hist) == (other.min, other.max, other.hist)
+            assert state.mean == pytest.approx(other.mean)
+            assert state.std == pytest.approx(other.std)
@@ -0,0 +1,57 @@
+"""SampleLog keeps each record's own timestamp and answers queries in time order across clock steps."""
+import random
+from datetime import datetime, timedelta
+
+from sample_log import SampleLog
+
+# The clock steps back an hour after the first row
+ROWS = [
+    ['2025-07-24 02:59:59', '20.00', '50.00', 'dev0'],
+    ['2025-07-24 02:00:00', '21.00', '51.00', 'dev0'],
+    ['2025-07-24 02:00:01', '22.00', '52.00', 'dev1'],
+    ['2025-07-24 02:00:01', '23.00', '53.00', 'dev1'],
+    ['Failed to read from DHT sensor!'],
+]
+
+
+def append(log, rows):
+    with log.open_for_append() as file:
+        records = log.to_records(rows)
+        file.write(records.tobytes())
+    return records
+
+
+def test_records_keep_their_timestamps(tmp_path):
+    log = SampleLog(str(tmp_path / 'samples.bin'))
+    append(log, ROWS)
+    assert log.row_count == 4
+    assert log.bounds() == ('2025-07-24 02:00:00', '2025-07-24 02:59:59')
+    assert log.read_rows(0, 10) == sorted(ROWS[:4], key=lambda row: row[0])
+    assert list(log.iter_range('2025-07-24 02:00:00', '2025-07-24 02:30:00')) == ROWS[1:4]
+    assert log.estimate_rows('2025-07-24 02:00:00', '2025-07-24 02:30:00') == 3
+    assert log.find_row('2025-07-24 02:00:01') == 1
+    summary = log.sync_rollups().stats('2025-07-24 02:00:00', '2025-07-24 02:30:00')
+    assert (summary.count, summary.first, summary.last) == (3, '2025-07-24 02:00:00', '2025-07-24 02:00:01')
+
+
+def test_queries_match_sorted_rows(tmp_path):
+    rng = random.Random(3)
+    moment, rows = datetime(2025, 7, 24), []
+    for i in range(3000):
+        # Mostly forward, with a few steps back of up to ten minutes
+        moment += timedelta(seconds=-rng.randint(1, 600) if rng.random() < 0.003 else rng.randint(0, 2))
+        rows.append([moment.strftime('%Y-%m-%d %H:%M:%S'), f"{rng.uniform(15, 35):.2f}", '50.00', 'dev0'])
+    log = SampleLog(str(tmp_path / 'samples.bin'))
+    for begin in range(0, len(rows), 700):  # Several appends, so runs are found incrementally
+        append(log, rows[begin:begin + 700])
+    assert len(log._runs()) > 1
+    ordered = sorted(rows, key=lambda row: row[0])  # Stable, like the log
+    assert log.bounds() == (ordered[0][0], ordered[-1][0])
+    for first in range(0, len(rows), 97):
+        assert log.read_rows(first, 50) == ordered[first:first + 50]
+    for row in rng.sample(rows, 50):
+        assert log.find_row(row[0]) == sum(other[0] < row[0] for other in rows)
+    start, end = ordered[500][0], ordered[2500][0]
+    expected = [row for row in ordered if start <= row[0] <= end]
+    assert log.estimate_rows(start, end) == len(expected)
+    assert list(log.iter_range(start, end)) == expected
@@ -0,0 +1,44 @@
+"""SqliteLog keeps each row's own timestamp, also when the clock is set back."""
+from sqlite_log import SqliteLog
+
+# The clock steps back an hour after the first row
+ROWS = [
+    ['2025-07-24 02:59:59', '20.00', '50.00', 'dev0'],
+    ['2025-07-24 02:00:00', '21.00', '51.00', 'dev0'],
+    ['2025-07-24 02:00:01', '22.00', '52.00', 'dev1'],
+    ['2025-07-24 02:00:01', '23.00', '53.00', 'dev1'],
+    ['Failed to read from DHT sensor!'],
+]
+
+
+def insert(log, rows):
+    conn = log.connect()
+    conn.execute("BEGIN IMMEDIATE")
+    ids = log.insert_rows(conn, rows)
+    conn.commit()
+    return ids
+
+
+def test_rows_keep_their_timestamps(tmp_path):
+    log = SqliteLog(str(tmp_path / 'data.db'))
+    assert insert(log, ROWS) == [1, 2, 3, 4]
+    assert log.row_count == 4
+    assert log.bounds() == ('2025-07-24 02:00:00', '2025-07-24 02:59:59')
+    assert log.read_rows(0, 10) == sorted(ROWS[:4], key=lambda row: row[0])
+    assert list(log.iter_range('2025-07-24 02:00:00', '2025-07-24 02:30:00')) == ROWS[1:4]
+    assert log.estimate_rows('2025-07-24 02:00:00', '2025-07-24 02:30:00') == 3
+    assert log.find_row('2025-07-24 02:00:01') == 1
+    assert log.read_frame()['Timestamp'].astype(str).tolist() == [
+        '2025-07-24 02:00:00', '2025-07-24 02:00:01', '2025-07-24 02:00:01', '2025-07-24 02:59:59']
+    log.close()
+
+
+def test_rollups_summarise_rows_in_their_own_second(tmp_path):
+    log = SqliteLog(str(tmp_path / 'data.db'))
+    insert(log, ROWS)
+    summary = log.sync_rollups().stats('2025-07-24 02:00:00', '2025-07-24 02:30:00')
+    assert (summary.count, summary.first, summary.last) == (3, '2025-07-24 02:00:00', '2025-07-24 02:00:01')
+    assert (summary.temp.min, summary.temp.max) == (21.0, 23.0)
+    assert insert(log, [['2025-07-24 02:00:02', '24.00', '54.00', 'dev0']]) == [5]
+    assert log.sync_rollups().stats().count == 5
+    log.close()
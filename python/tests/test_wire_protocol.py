@@ -0,0 +1,159 @@
+"""
+StreamDecoder against byte streams as received from the firmware.
+
+The frames below are kept as literal bytes in the firmware's layout, so a
+change to encode_frame() cannot hide a decoder bug.
+"""
+import pytest
+
+from wire_protocol import FRAME_SIZE, StreamDecoder, crc16, encode_frame
+
+# Device 1, sequence 0..3, 5: 23.50 °C / 45.25 %, 23.51 / 45.00, 23.52 / 45.00, 23.50 / 45.00, 23.60 / 44.90
+FRAME_0 = bytes.fromhex('aa 55 01 01 00 00 2e 09 ad 11 3b ac')
+FRAME_1 = bytes.fromhex('aa 55 01 01 01 00 2f 09 94 11 22 20')
+FRAME_2 = bytes.fromhex('aa 55 01 01 02 00 30 09 94 11 8b 21')
+FRAME_3 = bytes.fromhex('aa 55 01 01 03 00 2e 09 94 11 d6 dd')
+FRAME_5 = bytes.fromhex('aa 55 01 01 05 00 38 09 8a 11 75 4c')
+# Device 1, sequence 65535 and its successor after the wrap, both 23.50 / 45.00
+FRAME_65535 = bytes.fromhex('aa 55 01 01 ff ff 2e 09 94 11 26 1d')
+FRAME_0_AFTER_WRAP = bytes.fromhex('aa 55 01 01 00 00 2e 09 94 11 36 13')
+# Device 2, sequence 7: failed sensor read
+FAILED_7 = bytes.fromhex('aa 55 02 02 07 00 00 00 00 00 3a 16')
+# Device 1, sequence 0x55AA: the sequence field itself reads as a sync word
+FALSE_SYNC = bytes.fromhex('aa 55 01 01 aa 55 2e 09 94 11 79 42')
+FALSE_SYNC_NEXT = bytes.fromhex('aa 55 01 01 ab 55 2e 09 94 11 d9 07')
+TEXT_LINE = "Temperature: 26.20°C  |  Humidity: 76.00%\r\n".encode('utf-8')
+TEXT_FAILED = b"Failed to read from DHT sensor!\r\n"
+
+
+def feed_all(decoder, data, chunk=None):
+    readings = []
+    step = chunk or len(data)
+    for i in range(0, len(data), step):
+        readings.extend(decoder.feed(data[i:i + step]))
+    return readings
+
+
+def test_crc_matches_ccitt_false_check_value():
+    assert crc16(b'123456789') == 0x29B1
+
+
+def test_fixtures_match_the_encoder():
+    assert encode_frame(1, 0, 23.5, 45.25) == FRAME_0
+    assert encode_frame(2, 7, frame_type=2) == FAILED_7
+    assert all(len(frame) == FRAME_SIZE for frame in (FRAME_0, FRAME_65535, FAILED_7, FALSE_SYNC))
+
+
+def test_decodes_consecutive_frames():
+    decoder = StreamDecoder()
+    assert feed_all(decoder, FRAME_0 + FRAME_1 + FRAME_2) == [(23.5, 45.25), (23.51, 45.0), (23.52, 45.0)]
+    assert (decoder.frames, decoder.crc_errors, decoder.gaps, decoder.restarts) == (3, 0, 0, 0)
+
+
+def test_corrupted_crc_is_skipped_and_the_next_frame_decoded():
+    corrupted = bytearray(FRAME_1)
+    corrupted[-1] ^= 0xFF
+    decoder = StreamDecoder()
+    assert feed_all(decoder, FRAME_0 + bytes(corrupted) + FRAME_2) == [(23.5, 45.25), (23.52, 45.0)]
+    assert decoder.crc_errors == 1
+    assert decoder.gaps == 1 and decoder.missing_frames == 1
+
+
+def test_corrupted_payload_is_rejected():
+    corrupted = bytearray(FRAME_1)
+    corrupted[6] ^= 0x01  # One bit of the temperature
+    decoder = StreamDecoder()
+    assert feed_all(decoder, bytes(corrupted)) == []
+    assert decoder.crc_errors == 1 and decoder.frames == 0
+
+
+@pytest.mark.parametrize('split', range(1, FRAME_SIZE))
+def test_frame_split_across_chunks(split):
+    decoder = StreamDecoder()
+    data = FRAME_0 + FRAME_1
+    cut = FRAME_SIZE + split
+    assert decoder.feed(data[:cut]) == [(23.5, 45.25)]
+    assert decoder.feed(data[cut:]) == [(23.51, 45.0)]
+
+
+def test_sync_word_split_across_chunks():
+    decoder = StreamDecoder()
+    assert decoder.feed(TEXT_LINE + FRAME_0[:1]) == [(26.2, 76.0)]
+    assert decoder.feed(FRAME_0[1:]) == [(23.5, 45.25)]
+    assert decoder.crc_errors == 0
+
+
+@pytest.mark.parametrize('chunk', [1, 2, 3, 5, 7, 11, 64])
+def test_any_chunking_gives_the_same_readings(chunk):
+    data = TEXT_LINE + FRAME_0 + FALSE_SYNC + TEXT_FAILED + FRAME_1 + FAILED_7 + TEXT_LINE + FRAME_2
+    whole = StreamDecoder()
+    expected = feed_all(whole, data)
+    chunked = StreamDecoder()
+    assert feed_all(chunked, data, chunk) == expected
+    assert (chunked.frames, chunked.lines_seen, chunked.crc_errors, chunked.failed_reads) == \
+        (whole.frames, whole.lines_seen, whole.crc_errors, whole.failed_reads)
+
+
+def test_sync_word_inside_a_payload_is_not_a_frame_start():
+    decoder = StreamDecoder()
+    assert feed_all(decoder, FALSE_SYNC + FALSE_SYNC_NEXT) == [(23.5, 45.0), (23.5, 45.0)]
+    assert decoder.crc_errors == 0 and decoder.gaps == 0
+
+
+def test_resynchronises_after_joining_mid_frame_at_a_false_sync():
+    decoder = StreamDecoder()
+    # Attached to the port in the middle of FALSE_SYNC: the first sync seen is in its payload
+    assert feed_all(decoder, FALSE_SYNC[4:] + FALSE_SYNC_NEXT) == [(23.5, 45.0)]
+    assert decoder.crc_errors == 1 and decoder.frames == 1
+
+
+def test_sequence_gap_is_reported():
+    gaps = []
+    decoder = StreamDecoder(on_gap=lambda *gap: gaps.append(gap))
+    feed_all(decoder, FRAME_2 + FRAME_3 + FRAME_5)
+    assert gaps == [(1, 4, 5, 1)]
+    assert decoder.gaps == 1 and decoder.missing_frames == 1 and decoder.restarts == 0
+
+
+def test_sequence_wrap_is_not_a_gap():
+    decoder = StreamDecoder()
+    assert len(feed_all(decoder, FRAME_65535 + FRAME_0_AFTER_WRAP + FRAME_1)) == 3
+    assert decoder.gaps == 0 and decoder.restarts == 0
+
+
+def test_device_restart_is_counted_not_reported_as_a_gap():
+    gaps = []
+    decoder = StreamDecoder(on_gap=lambda *gap: gaps.append(gap))
+    feed_all(decoder, FRAME_2 + FRAME_3 + FRAME_0 + FRAME_1)
+    assert decoder.restarts == 1 and decoder.gaps == 0 and gaps == []
+
+
+def test_sequences_are_tracked_per_device():
+    decoder = StreamDecoder()
+    feed_all(decoder, FRAME_0 + FAILED_7 + FRAME_1)
+    assert decoder.gaps == 0
+    assert decoder.last_sequence == {1: 1, 2: 7}
+
+
+def test_reset_forgets_partial_frames_and_sequences():
+    decoder = StreamDecoder()
+    decoder.feed(FRAME_2 + FRAME_3[:5])
+    decoder.reset()
+    assert decoder.feed(FRAME_0) == [(23.5, 45.25)]
+    assert decoder.restarts == 0 and decoder.crc_errors == 0
+
+
+def test_text_and_binary_mixed():
+    decoder = StreamDecoder()
+    data = TEXT_LINE + FRAME_0 + TEXT_FAILED + FAILED_7 + TEXT_LINE + FRAME_1
+    assert feed_all(decoder, data) == [(26.2, 76.0), (23.5, 45.25), (26.2, 76.0), (23.51, 45.0)]
+    assert decoder.frames == 3
+    assert decoder.lines_seen == 6
+    assert decoder.failed_reads == 2
+    assert decoder.readings_parsed == 4 and decoder.unparsed == 0
+
+
+def test_partial_text_line_before_a_frame_is_dropped():
+    decoder = StreamDecoder()
+    assert feed_all(decoder, b"Temperature: 26.2" + FRAME_0 + TEXT_LINE) == [(23.5, 45.25), (26.2, 76.0)]
+    assert decoder.lines_seen == 2
@@ -0,0 +1,275 @@
+import bisect
+import csv
+import os
+import threading
+
+INDEX_SUFFIX = '.idx'
+INDEX_STRIDE = 500      # One index entry every this many data rows
+TAIL_READ_SIZE = 4096   # Bytes read from the end of the log to find the last row
+
+
+class TimeIndex:
+    """
+    Sparse timestamp -> byte offset index kept next to a CSV log.
+
+    The sidecar file (`data/data.csv.idx`) holds one `row,timestamp,offset`
+    line for every `stride`-th data row. Timestamps are stored exactly as
+    they appear in the log ("%Y-%m-%d %H:%M:%S"), which sorts correctly as
+    text, so range lookups are a bisect over the entries and never parse a
+    date. Rows are assumed to be appended in time order.
+
+    The index is updated by `CsvBatchWriter` through `on_rows_written`. If
+    rows were appended by something else (e.g. live_monitor.py), `load()`
+    scans only the unindexed tail of the log and catches up.
+    """
+
+    def __init__(self, csv_path, stride=INDEX_STRIDE):
+        self.csv_path = csv_path
+        self.index_path = csv_path + INDEX_SUFFIX
+        self.stride = stride
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._reset()
+
+    def _reset(self):
+        self.header = None
+        self.data_offset = 0  # Byte offset of the first data row
+        self.rows = []        # Row number of each entry
+        self.timestamps = []  # Timestamp string of each entry
+        self.offsets = []     # Byte offset of each entry in the CSV
+        self.row_count = 0    # Data rows covered by the index
+        self.end_offset = 0   # Byte offset just past the last covered row
+
+    # --- Building and maintenance ---
+
+    def load(self):
+        """Loads the sidecar file and indexes any rows appended since it was written."""
+        with self._lock:
+            self._reset()
+            self._loaded = True
+            if not os.path.isfile(self.csv_path):
+                return self
+            self._read_header()
+            self.end_offset = self.data_offset
+            if os.path.isfile(self.index_path):
+                self._read_index_file()
+            self._catch_up()
+        return self
+
+    def ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+        return self
+
+    def rebuild(self):
+        """Discards the sidecar file and indexes the whole log again."""
+        if os.path.isfile(self.index_path):
+            os.remove(self.index_path)
+        return self.load()
+
+    def on_rows_written(self, rows, offsets, end_offset):
+        """CsvBatchWriter listener: indexes rows as they are appended."""
+        if not self._loaded:
+            self.load()  # Scans the file, which already holds these rows
+            return
+        with self._lock:
+            if not rows:
+                return
+            if self.header is None:
+                self._read_header()
+                self.end_offset = self.data_offset
+            if offsets[0] != self.end_offset:
+                # Something else appended to the log; index the gap from the file
+                self._catch_up(limit=offsets[0])
+            entries = []
+            for row, offset in zip(rows, offsets):
+                if self.row_count % self.stride == 0:
+                    entries.append((self.row_count, row[0], offset))
+                self.row_count += 1
+            self.end_offset = end_offset
+            self._add_entries(entries)
+
+    def _read_header(self):
+        with open(self.csv_path, 'rb') as file:
+            line = file.readline()
+        self.header = next(csv.reader([line.decode('utf-8')]), []) if line.endswith(b'\n') else None
+        self.data_offset = len(line) if self.header else 0
+
+    def _read_index_file(self):
+        with open(self.index_path, 'r') as file:
+            for line in file:
+                parts = line.rstrip('\n').split(',')
+                if len(parts) != 3 or not line.endswith('\n'):
+                    break  # Torn write at the end of the file
+                row, timestamp, offset = int(parts[0]), parts[1], int(parts[2])
+                if self.rows and row <= self.rows[-1]:
+                    continue  # Duplicate left by two processes catching up at the same time
+                self.rows.append(row)
+                self.timestamps.append(timestamp)
+                self.offsets.append(offset)
+        if self.offsets:
+            # Resume scanning at the last entry; the rows after it are not recorded
+            self.row_count = self.rows[-1]
+            self.end_offset = self.offsets[-1]
+        if self.end_offset > os.path.getsize(self.csv_path) or \
+                (self.offsets and self.offsets[0] != self.data_offset):
+            # The log was replaced or truncated; start over
+            self._reset()
+            self._read_header()
+            self.end_offset = self.data_offset
+            os.remove(self.index_path)
+
+    def _catch_up(self, limit=None):
+        """Indexes complete rows between `end_offset` and `limit` (or the end of the log)."""
+        entries = []
+        with open(self.csv_path, 'rb') as file:
+            file.seek(self.end_offset)
+            for line in file:
+                if not line.endswith(b'\n') or (limit is not None and self.end_offset >= limit):
+                    break
+                if self.row_count % self.stride == 0 and (not self.rows or self.rows[-1] < self.row_count):
+                    timestamp = line.split(b',', 1)[0].decode('utf-8')
+                    entries.append((self.row_count, timestamp, self.end_offset))
+                self.row_count += 1
+                self.end_offset += len(line)
+        self._add_entries(entries)
+
+    def _add_entries(self, entries):
+        if not entries:
+            return
+        with open(self.index_path, 'a') as file:
+            for row, timestamp, offset in entries:
+                self.rows.append(row)
+                self.timestamps.append(timestamp)
+                self.offsets.append(offset)
+                file.write(f"{row},{timestamp},{offset}\n")
+
+    # --- Queries ---
+
+    def bounds(self):
+        """Returns (first, last) timestamp strings of the log, or None if it has no rows."""
+        self.ensure_loaded()
+        with self._lock:
+            if not self.timestamps:
+                return None
+            first = self.timestamps[0]
+        last = self._last_timestamp()
+        return first, last or first
+
+    def _last_timestamp(self):
+        size = os.path.getsize(self.csv_path)
+        start = max(self.data_offset, size - TAIL_READ_SIZE)
+        with open(self.csv_path, 'rb') as file:
+            file.seek(start)
+            tail = file.read(size - start)
+        lines = [line for line in tail.split(b'\n')[:-1] if line.strip()]
+        if not lines:
+            return None
+        return lines[-1].split(b',', 1)[0].decode('utf-8')
+
+    def range_offsets(self, start=None, end=None):
+        """
+        Returns (start_offset, stop_offset) of a byte window holding every row
+        with start <= timestamp <= end. The window can include up to one stride
+        of extra rows at each edge; stop_offset is None for "end of file".
+        """
+        self.ensure_loaded()
+        with self._lock:
+            if not self.offsets:
+                return self.data_offset, None
+            start_offset = self.offsets[0]
+            if start is not None:
+                i = bisect.bisect_left(self.timestamps, start) - 1
+                start_offset = self.offsets[max(i, 0)]
+            stop_offset = None
+            if end is not None:
+                j = bisect.bisect_right(self.timestamps, end)
+                if j < len(self.offsets):
+                    stop_offset = self.offsets[j]
+        return start_offset, stop_offset
+
+    def read_rows(self, first, count):
+        """Returns up to `count` rows (lists of strings) starting at data row number `first`."""
+        self.ensure_loaded()
+        with self._lock:
+            if count <= 0 or first >= self.row_count or not self.rows:
+                return []
+            first = max(0, first)
+            i = bisect.bisect_right(self.rows, first) - 1
+            offset, skip = self.offsets[i], first - self.rows[i]
+        rows = []
+        with open(self.csv_path, 'rb') as file:
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break
+                if skip:
+                    skip -= 1
+                    continue
+                rows.append(next(csv.reader([line.decode('utf-8')]), []))
+                if len(rows) >= count:
+                    break
+        return rows
+
+    def find_row(self, timestamp):
+        """Returns the number of the first data row at or after `timestamp`."""
+        self.ensure_loaded()
+        with self._lock:
+            if not self.rows:
+                return 0
+            i = max(bisect.bisect_left(self.timestamps, timestamp) - 1, 0)
+            row, offset, limit = self.rows[i], self.offsets[i], self.row_count
+        with open(self.csv_path, 'rb') as file:
+            file.seek(offset)
+            for line in file:
+                if row >= limit or line.split(b',', 1)[0].decode('utf-8') >= timestamp:
+                    break
+                row += 1
+        return row
+
+    def estimate_rows(self, start=None, end=None):
+        """Upper bound on the number of rows in [start, end], accurate to one stride."""
+        self.ensure_loaded()
+        with self._lock:
+            if not self.rows:
+                return 0
+            i = bisect.bisect_left(self.timestamps, start) - 1 if start is not None else 0
+            j = bisect.bisect_right(self.timestamps, end) if end is not None else len(self.rows)
+            first = self.rows[max(i, 0)]
+            last = self.rows[j] if j < len(self.rows) else self.row_count
+        return max(0, last - first)
+
+    def read_range(self, start=None, end=None):
+        """
+        Reads the byte window for [start, end] and returns it as CSV bytes with
+        the header line in front, ready for `pd.read_csv(io.BytesIO(...))`.
+        Callers still filter the edge rows by timestamp.
+        """
+        start_offset, stop_offset = self.range_offsets(start, end)
+        with open(self.csv_path, 'rb') as file:
+            file.seek(start_offset)
+            body = file.read() if stop_offset is None else file.read(stop_offset - start_offset)
+            file.seek(0)
+            header = file.read(self.data_offset)
+        body = body[:body.rfind(b'\n') + 1]
+        return header + body
+
+    def iter_range(self, start=None, end=None):
+        """Streams the rows with start <= timestamp <= end as lists of strings."""
+        start_offset, stop_offset = self.range_offsets(start, end)
+        with open(self.csv_path, 'rb') as file:
+            file.seek(start_offset)
+            position = start_offset
+            for line in file:
+                if not line.endswith(b'\n') or (stop_offset is not None and position >= stop_offset):
+                    break
+                position += len(line)
+                row = next(csv.reader([line.decode('utf-8')]), None)
+                if not row:
+                    continue
+                timestamp = row[0]
+                if start is not None and timestamp < start:
+                    continue
+                if end is not None and timestamp > end:
+                    break
+                yield row
@@ -0,0 +1,86 @@
+import queue
+import threading
+
+from metrics import Histogram
+
+
+class UiDispatcher:
+    """
+    Hands updates from worker threads to the Tk main loop.
+
+    Worker threads never call `root.after` themselves. They `post()` items
+    to a bounded queue (an item that does not fit is dropped and counted,
+    so a burst can never build an unbounded backlog of callbacks) or
+    `set_latest()` a value for which only the newest one matters, such as
+    the status text. A single `root.after` timer drains both every
+    `tick_ms` and passes them to `handler(items, latest)` in one call.
+    """
+
+    def __init__(self, root, handler, max_items=1000, tick_ms=50):
+        self.root = root
+        self.handler = handler
+        self.max_items = max_items
+        self.tick_ms = tick_ms
+
+        self.posted = 0
+        self.dropped = 0
+        self.ticks = 0
+        self.peak_depth = 0
+        self.last_batch = 0
+        self.tick_seconds = Histogram()  # Time spent in `handler` per tick that had updates
+
+        self._queue = queue.Queue(maxsize=max_items)
+        self._latest = {}
+        self._latest_lock = threading.Lock()
+        self._after_id = None
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+    def post(self, item):
+        """Queues an item for the next tick. Never blocks; returns False if the item was dropped."""
+        try:
+            self._queue.put_nowait(item)
+            self.posted += 1
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def set_latest(self, key, value):
+        """Sets a value that replaces any earlier one with the same key not yet delivered."""
+        with self._latest_lock:
+            self._latest[key] = value
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.root.after(self.tick_ms, self._tick)
+        return self
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _tick(self):
+        self.peak_depth = max(self.peak_depth, self._queue.qsize())
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        with self._latest_lock:
+            latest, self._latest = self._latest, {}
+
+        self.ticks += 1
+        self.last_batch = len(items)
+        try:
+            if items or latest:
+                with self.tick_seconds.time():
+                    self.handler(items, latest)
+        except Exception as e:
+            print(f"Error applying UI updates: {e}")
+        finally:
+            self._after_id = self.root.after(self.tick_ms, self._tick)
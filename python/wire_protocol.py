@@ -0,0 +1,181 @@
+"""
+Binary wire format of the firmware (built with -DWIRE_FORMAT=1, see
+src/main.cpp) and a streaming decoder for both it and the text format.
+
+Each reading is one 12-byte little-endian frame instead of a ~45-byte line:
+
+    offset  size  field
+         0     2  sync, 0xAA 0x55
+         2     1  frame type: 1 = reading, 2 = failed sensor read
+         3     1  device ID
+         4     2  sequence number (uint16, wraps; failed reads use one too)
+         6     2  temperature in 0.01 °C (int16)
+         8     2  humidity in 0.01 % (uint16)
+        10     2  CRC-16/CCITT-FALSE of bytes 2..9
+
+The decoder accepts either format, so only the serial speed depends on
+which firmware the board runs (WIRE_FORMAT / --wire-format in the tools).
+
+Decode a recorded byte stream (e.g. from `simulator.py --binary --capture`):
+
+    python wire_protocol.py capture.bin
+"""
+import argparse
+import binascii
+import struct
+
+from sensor_parser import LineParser
+
+SYNC = b'\xaa\x55'
+FRAME_READING = 1
+FRAME_FAILED_READ = 2
+FRAME_FIELDS = struct.Struct('<BBHhH')  # type, device ID, sequence, temperature, humidity
+FRAME_CRC = struct.Struct('<H')
+FRAME_SIZE = len(SYNC) + FRAME_FIELDS.size + FRAME_CRC.size
+SCALE = 100
+SEQUENCE_MODULO = 1 << 16
+
+# --- Wire formats and the baud rate each firmware build uses (monitor_speed in platformio.ini) ---
+WIRE_TEXT = 'text'      # env:uno
+WIRE_BINARY = 'binary'  # env:uno_binary
+BAUD_RATES = {WIRE_TEXT: 9600, WIRE_BINARY: 115200}
+WIRE_FORMATS = tuple(BAUD_RATES)
+
+
+def crc16(data):
+    """CRC-16/CCITT-FALSE (polynomial 0x1021, initial value 0xFFFF), as computed by the firmware."""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def encode_frame(device_id, sequence, temp=0.0, humidity=0.0, frame_type=FRAME_READING):
+    """One frame exactly as the firmware sends it."""
+    body = FRAME_FIELDS.pack(frame_type, device_id, sequence % SEQUENCE_MODULO,
+                             round(temp * SCALE), round(humidity * SCALE))
+    return SYNC + body + FRAME_CRC.pack(crc16(body))
+
+
+class StreamDecoder(LineParser):
+    """
+    Splits a stream of serial chunks into readings, whether the firmware
+    sends text lines or binary frames (or switches between them).
+
+    `feed()` returns (temp, humidity) tuples like LineParser. Frames are
+    found by their sync bytes; one whose CRC does not match is counted in
+    `crc_errors` and the search resumes one byte later, so the decoder
+    resynchronises on the next intact frame. Bytes outside valid frames are
+    parsed as text lines. Sequence numbers are tracked per device ID: a jump
+    forward is a gap (`gaps`, `missing_frames`, and `on_gap(device_id,
+    expected, received, missing)` if given), a jump backward a device
+    restart (`restarts`).
+
+    `lines_seen` counts text lines and valid frames alike.
+    """
+
+    def __init__(self, max_line_length=4096, on_gap=None):
+        super().__init__(max_line_length)
+        self.on_gap = on_gap
+        self.pending = b''      # Start of a frame that has not fully arrived
+        self.frames = 0
+        self.crc_errors = 0
+        self.gaps = 0
+        self.missing_frames = 0
+        self.restarts = 0
+        self.last_sequence = {}  # Device ID -> sequence number of its last frame
+
+    def feed(self, chunk):
+        data = self.pending + chunk if self.pending else chunk
+        self.pending = b''
+        readings = []
+        pos = 0
+        while True:
+            start = data.find(SYNC, pos)
+            if start < 0:
+                # A sync split across chunks: keep its first byte for the next one
+                end = len(data) - 1 if data.endswith(SYNC[:1]) else len(data)
+                readings.extend(super().feed(data[pos:end]))
+                self.pending = data[end:]
+                return readings
+            if start > pos:
+                readings.extend(super().feed(data[pos:start]))
+            if len(data) - start < FRAME_SIZE:
+                self.pending = data[start:]
+                return readings
+
+            body = data[start + len(SYNC):start + FRAME_SIZE - FRAME_CRC.size]
+            (crc,) = FRAME_CRC.unpack_from(data, start + FRAME_SIZE - FRAME_CRC.size)
+            if crc != crc16(body):
+                self.crc_errors += 1
+                pos = start + 1
+                continue
+            pos = start + FRAME_SIZE
+            self.carry = b''  # Any partial text line before a frame is noise
+            reading = self._decode_frame(body)
+            if reading is not None:
+                readings.append(reading)
+
+    def _decode_frame(self, body):
+        frame_type, device_id, sequence, temp, humidity = FRAME_FIELDS.unpack(body)
+        self.frames += 1
+        self.lines_seen += 1
+        self._check_sequence(device_id, sequence)
+        if frame_type == FRAME_READING:
+            self.readings_parsed += 1
+            return temp / SCALE, humidity / SCALE
+        if frame_type == FRAME_FAILED_READ:
+            self.failed_reads += 1
+        else:
+            self.unparsed += 1
+        return None
+
+    def _check_sequence(self, device_id, sequence):
+        last = self.last_sequence.get(device_id)
+        self.last_sequence[device_id] = sequence
+        if last is None:
+            return
+        expected = (last + 1) % SEQUENCE_MODULO
+        missing = (sequence - expected) % SEQUENCE_MODULO
+        if missing == 0:
+            return
+        if missing >= SEQUENCE_MODULO // 2:
+            # Went backwards: the board was reset (or a frame was repeated)
+            self.restarts += 1
+            return
+        self.gaps += 1
+        self.missing_frames += missing
+        if self.on_gap is not None:
+            self.on_gap(device_id, expected, sequence, missing)
+
+    def reset(self):
+        """Forgets partial data after a reconnect; the board restarts its sequence when it resets."""
+        super().reset()
+        self.pending = b''
+        self.last_sequence.clear()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('capture', help="File with the raw bytes received from a board")
+    ap.add_argument('--chunk', type=int, default=64, help="Bytes fed to the decoder at a time, like serial reads")
+    ap.add_argument('--gaps', action='store_true', help="List every sequence gap")
+    args = ap.parse_args()
+
+    def report_gap(device_id, expected, received, missing):
+        print(f"⚠️ Device {device_id}: {missing} frame(s) missing, expected #{expected}, got #{received}")
+
+    decoder = StreamDecoder(on_gap=report_gap if args.gaps else None)
+    readings = 0
+    with open(args.capture, 'rb') as file:
+        while True:
+            chunk = file.read(args.chunk)
+            if not chunk:
+                break
+            readings += len(decoder.feed(chunk))
+
+    print(f"✅ {readings} readings from {decoder.frames} frames and {decoder.lines_seen - decoder.frames} text lines")
+    print(f"📈 {decoder.failed_reads} failed sensor reads, {decoder.crc_errors} CRC errors, "
+          f"{decoder.gaps} gaps ({decoder.missing_frames} frames missing), {decoder.restarts} restarts, "
+          f"{decoder.unparsed} unparsed lines")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,11 +5,69 @@
 #define DHTPIN 2       // Digital pin connected to the DHT sensor
 #define DHTTYPE DHT11  // Change to DHT22 if you're using that sensor
 
+// Wire format: human-readable text lines (the default), or compact binary frames with a
+// sequence number and CRC so the host can detect lost and corrupted readings.
+// Build with -DWIRE_FORMAT=1 (see env:uno_binary in platformio.ini); the frame layout is
+// documented in python/wire_protocol.py.
+#define WIRE_FORMAT_TEXT 0
+#define WIRE_FORMAT_BINARY 1
+#ifndef WIRE_FORMAT
+#define WIRE_FORMAT WIRE_FORMAT_TEXT
+#endif
+
+#define TEXT_BAUD_RATE 9600
+#define BINARY_BAUD_RATE 115200  // 12-byte frames leave plenty of headroom at 20 readings/s
+#ifndef DEVICE_ID
+#define DEVICE_ID 1              // Tells boards apart when several share one host
+#endif
+
+// Binary frame: sync (2), type, device ID, sequence (2), temperature (2), humidity (2), CRC (2)
+#define FRAME_SYNC_1 0xAA
+#define FRAME_SYNC_2 0x55
+#define FRAME_READING 1
+#define FRAME_FAILED_READ 2
+#define FRAME_SIZE 12
+
 // Initialize DHT sensor
 DHT dht(DHTPIN, DHTTYPE);
 
+uint16_t sequence = 0;  // Counts every frame, so the host can tell how many were lost
+
+// CRC-16/CCITT-FALSE: polynomial 0x1021, initial value 0xFFFF
+uint16_t crc16(const uint8_t *data, uint8_t length) {
+  uint16_t crc = 0xFFFF;
+  while (length--) {
+    crc ^= (uint16_t)(*data++) << 8;
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+void sendFrame(uint8_t type, float temperature, float humidity) {
+  // Fixed point, hundredths of a degree / percent, little-endian like the AVR itself
+  int16_t temp = (int16_t)lround(temperature * 100.0);
+  uint16_t hum = (uint16_t)lround(humidity * 100.0);
+  uint8_t frame[FRAME_SIZE] = {
+    FRAME_SYNC_1, FRAME_SYNC_2, type, DEVICE_ID,
+    (uint8_t)(sequence & 0xFF), (uint8_t)(sequence >> 8),
+    (uint8_t)((uint16_t)temp & 0xFF), (uint8_t)((uint16_t)temp >> 8),
+    (uint8_t)(hum & 0xFF), (uint8_t)(hum >> 8),
+  };
+  uint16_t crc = crc16(frame + 2, FRAME_SIZE - 4);
+  frame[FRAME_SIZE - 2] = crc & 0xFF;
+  frame[FRAME_SIZE - 1] = crc >> 8;
+  Serial.write(frame, FRAME_SIZE);
+  sequence++;
+}
+
 void setup() {
-  Serial.begin(9600);
+#if WIRE_FORMAT == WIRE_FORMAT_BINARY
+  Serial.begin(BINARY_BAUD_RATE);
+#else
+  Serial.begin(TEXT_BAUD_RATE);
+#endif
   dht.begin();
 }
 
@@ -23,14 +81,22 @@ void loop() {
 
   // Check if any reads failed
   if (isnan(humidity) || isnan(temperature)) {
+#if WIRE_FORMAT == WIRE_FORMAT_BINARY
+    sendFrame(FRAME_FAILED_READ, 0, 0);
+#else
     Serial.println("Failed to read from DHT sensor!");
+#endif
     return;
   }
 
+#if WIRE_FORMAT == WIRE_FORMAT_BINARY
+  sendFrame(FRAME_READING, temperature, humidity);
+#else
   // Print values to Serial Monitor
   Serial.print("Temperature: ");
   Serial.print(temperature);
   Serial.print("°C  |  Humidity: ");
   Serial.print(humidity);
   Serial.println("%");
+#endif
 }